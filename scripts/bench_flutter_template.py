@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Flutter template cache benchmark
+
+Times how each build gets its project: ``flutter create`` in the
+workspace (no cache), the first build with an empty template cache
+(cold: create the template, then clone it) and the builds after it
+(warm: clone only). Without --flutter a stand-in SDK writes a project
+the size of a real ``flutter create`` (all platforms) and sleeps
+--create-seconds for the tool start and ``pub get``:
+
+    python3 scripts/bench_flutter_template.py
+    python3 scripts/bench_flutter_template.py --flutter /usr/local/bin/flutter --builds 5
+"""
+
+import argparse
+import logging
+import shutil
+import stat
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.tasks.build_cache import FlutterTemplateCache
+from src.utils.shell import ShellRunner
+
+ORG = 'com.autobuilder'
+PROJECT_NAME = 'weather_app'
+
+# Stand-in flutter: the file layout of a real flutter create, in bulk
+FAKE_FLUTTER = """#!/usr/bin/env python3
+import sys, time
+from pathlib import Path
+if sys.argv[1] != 'create':
+    sys.exit(0)
+time.sleep({create_seconds})
+app = Path(sys.argv[-1])
+for platform in ('android', 'ios', 'linux', 'macos', 'web', 'windows'):
+    for i in range({text_files}):
+        path = app / platform / f'dir{{i % 7}}' / f'file{{i}}.txt'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('# generated\\n' * 40)
+    for i in range({icons}):
+        path = app / platform / 'icons' / f'icon{{i}}.png'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(bytes(range(256)) * 40)
+for i in range({dart_tool_files}):
+    path = app / '.dart_tool' / 'pkg' / f'file{{i}}.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text('{{}}' * 200)
+(app / 'lib').mkdir(parents=True, exist_ok=True)
+(app / 'lib' / 'main.dart').write_text('void main() {{}}\\n')
+(app / 'pubspec.yaml').write_text('name: weather_app\\n')
+"""
+
+
+def make_fake_sdk(base: Path, create_seconds: float) -> Path:
+    sdk = base / 'sdk'
+    (sdk / 'bin').mkdir(parents=True)
+    flutter = sdk / 'bin' / 'flutter'
+    flutter.write_text(FAKE_FLUTTER.format(
+        create_seconds=create_seconds,
+        text_files=20,
+        icons=8,
+        dart_tool_files=30,
+    ))
+    flutter.chmod(flutter.stat().st_mode | stat.S_IXUSR)
+    (sdk / 'version').write_text("stand-in\n")
+    return flutter
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--flutter', help="Real flutter executable (default: stand-in SDK)")
+    parser.add_argument('--builds', type=int, default=5, help="Builds per mode")
+    parser.add_argument('--create-seconds', type=float, default=8.0, help="Stand-in flutter create time")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base = Path(tmp_dir)
+        flutter = args.flutter or str(make_fake_sdk(base, args.create_seconds))
+        shell = ShellRunner(timeout=600)
+        cache = FlutterTemplateCache({'build': {'flutter_path': flutter, 'cache_dir': str(base / 'cache')}}, shell)
+        
+        def workspace(mode: str, i: int) -> Path:
+            return base / 'workspaces' / f'{mode}-{i}' / 'app'
+        
+        def flutter_create(app_dir: Path):
+            app_dir.parent.mkdir(parents=True, exist_ok=True)
+            success, output = shell.run_safe(
+                f"{flutter} create --org {ORG} --project-name {PROJECT_NAME} {app_dir}",
+                timeout=600,
+            )
+            if not success:
+                raise SystemExit(f"flutter create failed: {output}")
+        
+        no_cache = [timed(lambda: flutter_create(workspace('create', i))) for i in range(args.builds)]
+        cold = timed(lambda: cache.create_project(workspace('cold', 0), ORG, PROJECT_NAME))
+        counts = {}
+        warm = []
+        for i in range(args.builds):
+            warm.append(timed(lambda: counts.update(cache.create_project(workspace('warm', i), ORG, PROJECT_NAME))))
+        
+        files = sum(1 for path in workspace('warm', 0).rglob('*') if path.is_file())
+        size = sum(path.stat().st_size for path in workspace('warm', 0).rglob('*') if path.is_file())
+        print(f"SDK: {'stand-in, create ' + str(args.create_seconds) + 's' if not args.flutter else flutter}")
+        print(f"Project: {files} files, {size / 1024 / 1024:.1f} MB; "
+              f"clone: {', '.join(f'{n} {method}' for method, n in counts.items() if n)}")
+        print(f"{'mode':<28}{'mean':>10}{'max':>10}")
+        print(f"{'flutter create per build':<28}{statistics.mean(no_cache):>9.3f}s{max(no_cache):>9.3f}s")
+        print(f"{'cache cold (first build)':<28}{cold:>9.3f}s{cold:>9.3f}s")
+        print(f"{'cache warm':<28}{statistics.mean(warm):>9.3f}s{max(warm):>9.3f}s")
+        shutil.rmtree(base / 'workspaces', ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Job log memory benchmark
+
+Prints build-like output of the given size through per-job capture, once
+into an in-memory buffer that is redacted and written at the end (how
+job logs used to be written) and once through the streaming JobLogWriter.
+Each mode runs in its own process and reports its peak RSS:
+
+    python3 scripts/bench_job_log.py
+    python3 scripts/bench_job_log.py --mb 500 --max-log-mb 10 --compress
+"""
+
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.jobs.job_log import JobLogWriter
+from src.jobs.job_output import capture_job_output
+from src.utils.redact import Redactor
+
+LINE = "[  +{i} ms] Running Gradle task 'assembleRelease'... TOKEN=abc{i} (lib/main.dart:{i})\n"
+
+
+def emit_output(megabytes: int):
+    """Print about this many MB, like a chatty flutter build"""
+    target = megabytes * 1024 * 1024
+    written = i = 0
+    while written < target:
+        line = LINE.format(i=i)
+        print(line, end='')
+        written += len(line)
+        i += 1
+
+
+def run_mode(args):
+    redactor = Redactor()
+    logs_path = Path(args.dir) / 'logs.txt'
+    start = time.perf_counter()
+    if args.mode == 'buffer':
+        with capture_job_output('bench') as log_buffer:
+            emit_output(args.mb)
+        with open(logs_path, 'w', encoding='utf-8') as f:
+            f.write(redactor.redact(log_buffer.getvalue()))
+        final_path = logs_path
+    else:
+        log_file = JobLogWriter(
+            logs_path,
+            redactor,
+            max_bytes=args.max_log_mb * 1024 * 1024,
+            compress=args.compress,
+        )
+        with log_file, capture_job_output('bench', log_file):
+            emit_output(args.mb)
+        final_path = log_file.path
+    elapsed = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    size_mb = final_path.stat().st_size / 1024 / 1024
+    print(f"{args.mode:<7} {elapsed:7.2f}s  peak RSS {peak_mb:8.1f} MB  log {size_mb:7.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare job log memory use")
+    parser.add_argument('--mb', type=int, default=200, help="Output printed by the job")
+    parser.add_argument('--max-log-mb', type=int, default=10)
+    parser.add_argument('--compress', action='store_true')
+    parser.add_argument('--mode', choices=['buffer', 'stream'], help=argparse.SUPPRESS)
+    parser.add_argument('--dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.mode:
+        run_mode(args)
+        return
+    
+    print(f"{args.mb} MB of job output")
+    for mode in ('buffer', 'stream'):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            command = [
+                sys.executable, __file__,
+                '--mode', mode,
+                '--dir', tmp_dir,
+                '--mb', str(args.mb),
+                '--max-log-mb', str(args.max_log_mb),
+            ]
+            if args.compress:
+                command.append('--compress')
+            subprocess.run(command, check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Job queue benchmark
+
+Runs a mixed workload through JobDispatcher against a throwaway SQLite
+database: a few long "build" jobs are queued first, then a stream of
+short "status" jobs arrives while they run. Prints throughput and the
+queue wait of each job type, which shows whether short jobs get ahead of
+builds (priority, worker pools) and whether builds still get to run
+(fairness):
+
+    # one worker pool per task class (1 status + 1 build thread)
+    python3 scripts/bench_job_queue.py
+    # both classes sharing 2 threads, with and without priorities
+    python3 scripts/bench_job_queue.py --shared 2
+    python3 scripts/bench_job_queue.py --shared 2 --fifo
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.dispatcher import JobDispatcher
+from src.jobs.job_manager import JobManager
+from src.tasks.registry import TaskSpec
+
+
+class SleepTask:
+    """Stand-in task that takes a fixed time"""
+    
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+    
+    def execute(self, job_id, workspace_dir, logs_path, report_path):
+        time.sleep(self.seconds)
+        return {}
+
+
+async def run_workload(args, tmp_dir: str):
+    config = {
+        'database': {'sqlite_path': str(Path(tmp_dir) / 'jobs.db')},
+        'paths': {'workspaces_dir': str(Path(tmp_dir) / 'workspaces')},
+        'queue': {
+            'max_wait_seconds': args.max_wait,
+            'poll_interval': 0.5,
+        },
+        'workers': {
+            'status': args.status_workers,
+            'build': args.build_workers,
+            'shared': args.shared,
+        },
+    }
+    tasks = {
+        'status': TaskSpec(
+            lambda c, p: SleepTask(args.status_ms / 1000),
+            priority=0 if args.fifo else 100,
+            pool='shared' if args.shared else 'status',
+        ),
+        'build': TaskSpec(
+            lambda c, p: SleepTask(args.build_ms / 1000),
+            priority=0,
+            pool='shared' if args.shared else 'build',
+        ),
+    }
+    
+    manager = JobManager(config)
+    job_store = AsyncJobStore(manager)
+    dispatcher = JobDispatcher(job_store, config, tasks)
+    await dispatcher.start()
+    
+    since = datetime.now(timezone.utc) - timedelta(seconds=1)
+    start = time.perf_counter()
+    
+    job_ids = [await dispatcher.submit("build") for _ in range(args.builds)]
+    for _ in range(args.status_jobs):
+        job_ids.append(await dispatcher.submit("status"))
+        await asyncio.sleep(args.arrival_ms / 1000)
+    
+    await asyncio.gather(*(dispatcher.wait(job_id) for job_id in job_ids))
+    elapsed = time.perf_counter() - start
+    
+    stats = await job_store.latency_stats(since)
+    await dispatcher.stop()
+    job_store.shutdown()
+    manager.shutdown()
+    return elapsed, len(job_ids), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the job queue with a mixed workload")
+    parser.add_argument('--status-workers', type=int, default=1)
+    parser.add_argument('--build-workers', type=int, default=1)
+    parser.add_argument('--shared', type=int, default=0, help="Run both classes in one pool of this size")
+    parser.add_argument('--builds', type=int, default=4, help="Long jobs queued first")
+    parser.add_argument('--build-ms', type=int, default=1000)
+    parser.add_argument('--status-jobs', type=int, default=150, help="Short jobs arriving afterwards")
+    parser.add_argument('--status-ms', type=int, default=10)
+    parser.add_argument('--arrival-ms', type=int, default=15, help="Interval between short jobs")
+    parser.add_argument('--max-wait', type=float, default=600, help="Starvation limit in seconds")
+    parser.add_argument('--fifo', action='store_true', help="Give all jobs the same priority")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        elapsed, job_count, stats = asyncio.run(run_workload(args, tmp_dir))
+    
+    if args.shared:
+        workers = f"{args.shared} shared workers"
+    else:
+        workers = f"{args.status_workers} status + {args.build_workers} build workers"
+    print(f"{job_count} jobs in {elapsed:.2f}s ({job_count / elapsed:.1f} jobs/s), {workers}")
+    print(f"{'type':<8} {'kind':<6} {'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for command, by_kind in stats.items():
+        for kind, summary in by_kind.items():
+            print(
+                f"{command:<8} {kind:<6} {summary['count']:>6} "
+                f"{summary['p50']:>6}ms {summary['p95']:>6}ms {summary['p99']:>6}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
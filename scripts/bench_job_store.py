@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Job store benchmark
+
+Measures JobManager against a throwaway SQLite database. Run from the
+project root:
+
+    # create/update/get throughput
+    python3 scripts/bench_job_store.py --jobs 2000 --threads 8
+
+    # commits per job and job store latency with 100 concurrent jobs
+    python3 scripts/bench_job_store.py --scenario lifecycle --jobs 100 --synchronous FULL
+    python3 scripts/bench_job_store.py --scenario lifecycle --jobs 100 --synchronous FULL --write-behind-ms 0
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.jobs.job_manager import JobManager, JobStatus
+
+
+def _timed(label: str, total_ops: int, func):
+    """Run func and print ops/s"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {total_ops:>7} ops  {elapsed:8.3f}s  {total_ops / elapsed:10.0f} ops/s")
+    return elapsed
+
+
+def _make_config(tmp_dir: str, synchronous: str, write_behind_ms: int) -> dict:
+    return {
+        'database': {
+            'type': 'sqlite',
+            'sqlite_path': str(Path(tmp_dir) / 'jobs.db'),
+            'sqlite_synchronous': synchronous,
+            'write_behind_ms': write_behind_ms,
+        }
+    }
+
+
+def _percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_lifecycle(job_count: int, synchronous: str, write_behind_ms: int):
+    """Run job_count concurrent job lifecycles and print commits per job and latency"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = JobManager(_make_config(tmp_dir, synchronous, write_behind_ms))
+        pool = manager.store.pool
+        latencies = []
+        
+        def lifecycle(n):
+            job_id = manager.create_job(f"lifecycle {n}")
+            for fields in (
+                {'status': JobStatus.RUNNING},
+                {'status': JobStatus.COMPLETED, 'logs_path': f"/tmp/{n}/logs.txt"},
+                {'report_path': f"/tmp/{n}/report.md"},
+            ):
+                start = time.perf_counter()
+                manager.update_job(job_id, **fields)
+                latencies.append(time.perf_counter() - start)
+            return job_id
+        
+        commits_before = pool.commit_count
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=job_count) as executor:
+            job_ids = list(executor.map(lifecycle, range(job_count)))
+        manager.flush()
+        elapsed = time.perf_counter() - start
+        commits = pool.commit_count - commits_before
+        
+        assert all(manager.get_job(job_id)['report_path'] for job_id in job_ids)
+        
+        print(f"jobs={job_count} synchronous={synchronous} write_behind_ms={write_behind_ms}")
+        print(f"commits/job   {commits / job_count:8.2f}  (create + updates)")
+        print(f"update p50    {_percentile(latencies, 50) * 1000:8.2f} ms")
+        print(f"update p95    {_percentile(latencies, 95) * 1000:8.2f} ms")
+        print(f"update p99    {_percentile(latencies, 99) * 1000:8.2f} ms")
+        print(f"wall time     {elapsed:8.3f} s")
+        
+        manager.shutdown()
+
+
+def run_benchmark(job_count: int, threads: int, synchronous: str, write_behind_ms: int):
+    """Run create/update/get phases and print throughput"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager = JobManager(_make_config(tmp_dir, synchronous, write_behind_ms))
+        job_ids = []
+        
+        def create_batch(count):
+            return [manager.create_job("bench", {'n': i}) for i in range(count)]
+        
+        def run_parallel(func, items):
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                return list(pool.map(func, items))
+        
+        per_thread = job_count // threads
+        
+        def create_all():
+            for batch in run_parallel(create_batch, [per_thread] * threads):
+                job_ids.extend(batch)
+        
+        def update_all():
+            run_parallel(lambda job_id: manager.update_job(job_id, status=JobStatus.RUNNING), job_ids)
+            manager.flush()
+        
+        def get_all():
+            run_parallel(manager.get_job, job_ids)
+        
+        print(
+            f"jobs={per_thread * threads} threads={threads} synchronous={synchronous} "
+            f"write_behind_ms={write_behind_ms}"
+        )
+        _timed("create", per_thread * threads, create_all)
+        _timed("update", len(job_ids), update_all)
+        _timed("get", len(job_ids), get_all)
+        
+        manager.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the job store")
+    parser.add_argument('--jobs', type=int, default=2000, help="Number of jobs to create")
+    parser.add_argument('--threads', type=int, default=8, help="Concurrent client threads")
+    parser.add_argument('--synchronous', default='NORMAL', help="SQLite synchronous pragma")
+    parser.add_argument('--write-behind-ms', type=int, default=20, help="Group commit window (0 disables)")
+    parser.add_argument('--scenario', choices=['throughput', 'lifecycle'], default='throughput')
+    args = parser.parse_args()
+    
+    if args.scenario == 'lifecycle':
+        run_lifecycle(args.jobs, args.synchronous, args.write_behind_ms)
+    else:
+        run_benchmark(args.jobs, args.threads, args.synchronous, args.write_behind_ms)
+
+
+if __name__ == "__main__":
+    main()
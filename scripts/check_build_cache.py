@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Build cache checks
+
+Runs FlutterTemplateCache with a stand-in Flutter SDK (a shell script
+that counts its runs and a version file) and checks that parallel builds
+create the template once, that a clone is independent of the template,
+that an SDK upgrade replaces the template and that a failed
+``flutter create`` leaves nothing behind. Then checks SharedBuildCaches:
+the daemon settings, that pub is locked exclusively and Gradle shared,
+and that eviction removes the least recently used entries, but not
+while a build holds the cache, which a Gradle build does with both
+caches for as long as it runs. Last, ArtifactStore: a stored APK comes
+back by its key, identical APKs share one blob and eviction keeps the
+most recently used:
+
+    python3 scripts/check_build_cache.py
+"""
+
+import os
+import stat
+import time
+import sys
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import run_checks
+from src.tasks.build_android_apk import BuildWeatherApkTask
+from src.tasks.build_cache import (
+    CLONE_COPY,
+    CLONE_HARDLINK,
+    CLONE_REFLINK,
+    GRADLE_CACHE,
+    PUB_CACHE,
+    ArtifactStore,
+    FlutterTemplateCache,
+    SharedBuildCaches,
+    clone_tree,
+)
+
+MB = 1024 * 1024
+
+# Stand-in for flutter create: a small project with an icon and a symlink
+FAKE_FLUTTER = """#!/bin/sh
+echo "$1" >> {sdk}/calls.txt
+[ -e {sdk}/fail ] && {{ echo "create failed" >&2; exit 1; }}
+for last; do :; done
+sleep 0.5
+mkdir -p "$last/lib" "$last/android/app/src/main/res/mipmap-hdpi"
+echo "void main() {{}}" > "$last/lib/main.dart"
+echo "name: weather_app" > "$last/pubspec.yaml"
+printf 'PNG' > "$last/android/app/src/main/res/mipmap-hdpi/ic_launcher.png"
+ln -s pubspec.yaml "$last/pubspec.link"
+"""
+
+
+def make_sdk(tmp_dir: str, name: str) -> Path:
+    sdk = Path(tmp_dir) / name
+    (sdk / 'bin').mkdir(parents=True)
+    flutter = sdk / 'bin' / 'flutter'
+    flutter.write_text(FAKE_FLUTTER.format(sdk=sdk))
+    flutter.chmod(flutter.stat().st_mode | stat.S_IXUSR)
+    (sdk / 'version').write_text("3.24.0\n")
+    return sdk
+
+
+def make_cache(tmp_dir: str, sdk: Path) -> FlutterTemplateCache:
+    return FlutterTemplateCache({
+        'build': {'flutter_path': str(sdk / 'bin' / 'flutter'), 'cache_dir': str(Path(tmp_dir) / f'{sdk.name}-cache')},
+    })
+
+
+def creates(sdk: Path) -> int:
+    calls = sdk / 'calls.txt'
+    return calls.read_text().split().count('create') if calls.exists() else 0
+
+
+def check_parallel_builds_create_once(tmp_dir: str):
+    sdk = make_sdk(tmp_dir, 'parallel')
+    cache = make_cache(tmp_dir, sdk)
+    errors = []
+    
+    def build(i: int):
+        try:
+            cache.create_project(Path(tmp_dir) / f'parallel-ws{i}' / 'app', 'com.autobuilder', 'weather_app')
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=build, args=(i,)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors
+    assert creates(sdk) == 1, creates(sdk)
+    for i in range(6):
+        assert (Path(tmp_dir) / f'parallel-ws{i}' / 'app' / 'lib' / 'main.dart').exists()
+
+
+def check_clone_is_independent(tmp_dir: str):
+    sdk = make_sdk(tmp_dir, 'clone')
+    cache = make_cache(tmp_dir, sdk)
+    app_dir = Path(tmp_dir) / 'clone-ws' / 'app'
+    counts = cache.create_project(app_dir, 'com.autobuilder', 'weather_app')
+    # Reflinks, or the icon hardlinked and the text files copied
+    assert counts[CLONE_REFLINK] == 3 or (counts[CLONE_HARDLINK] == 1 and counts[CLONE_COPY] == 2), counts
+    
+    (app_dir / 'lib' / 'main.dart').write_text("changed")
+    with open(app_dir / 'pubspec.yaml', 'a') as f:
+        f.write("version: 2\n")
+    template = cache.template('com.autobuilder', 'weather_app')
+    assert (template / 'lib' / 'main.dart').read_text() == "void main() {}\n"
+    assert (template / 'pubspec.yaml').read_text() == "name: weather_app\n"
+    assert os.readlink(app_dir / 'pubspec.link') == 'pubspec.yaml'
+    
+    # A rerun of the job replaces what its last run left
+    cache.create_project(app_dir, 'com.autobuilder', 'weather_app')
+    assert (app_dir / 'lib' / 'main.dart').read_text() == "void main() {}\n"
+    assert creates(sdk) == 1, creates(sdk)
+    
+    # clone_tree on its own
+    copy = Path(tmp_dir) / 'clone-copy'
+    counts = clone_tree(template, copy)
+    assert sum(counts.values()) == 3, counts
+
+
+def check_sdk_upgrade(tmp_dir: str):
+    sdk = make_sdk(tmp_dir, 'upgrade')
+    cache = make_cache(tmp_dir, sdk)
+    old = cache.template('com.autobuilder', 'weather_app')
+    other = cache.template('com.autobuilder', 'other_app')
+    (sdk / 'version').write_text("3.27.1\n")
+    new = cache.template('com.autobuilder', 'weather_app')
+    assert new != old and new.is_dir() and not old.exists(), (old, new)
+    # Other projects keep theirs until they are built
+    assert other.is_dir()
+    assert creates(sdk) == 3, creates(sdk)
+
+
+def check_failed_create(tmp_dir: str):
+    sdk = make_sdk(tmp_dir, 'failing')
+    cache = make_cache(tmp_dir, sdk)
+    (sdk / 'fail').touch()
+    try:
+        cache.template('com.autobuilder', 'weather_app')
+        raise AssertionError("failed create was not raised")
+    except Exception as e:
+        assert "create failed" in str(e), e
+    leftovers = [p.name for p in cache.templates_dir.iterdir() if not p.name.endswith('lock')]
+    assert not leftovers, leftovers
+    
+    (sdk / 'fail').unlink()
+    assert (cache.template('com.autobuilder', 'weather_app') / 'pubspec.yaml').exists()
+
+
+def make_caches(tmp_dir: str, name: str, **build) -> SharedBuildCaches:
+    config = {'build': {'cache_dir': str(Path(tmp_dir) / f'{name}-caches'), **build}}
+    if build.pop('isolated', False):
+        config['security'] = {'job_isolation': 'process'}
+    return SharedBuildCaches(config)
+
+
+def check_daemon_settings(tmp_dir: str):
+    caches = make_caches(tmp_dir, 'warm', gradle_daemon_idle_minutes=30)
+    env = caches.env()
+    assert env['PUB_CACHE'].endswith('pub') and env['GRADLE_USER_HOME'].endswith('gradle'), env
+    assert env['PATH'] == os.environ['PATH']
+    properties = (caches.dirs[GRADLE_CACHE] / 'gradle.properties').read_text()
+    assert "org.gradle.daemon=true" in properties and "idletimeout=1800000" in properties, properties
+    
+    for name, build in (('off', {'gradle_daemon': 'off'}), ('isolated', {'isolated': True})):
+        caches = make_caches(tmp_dir, name, **build)
+        caches.env()
+        properties = (caches.dirs[GRADLE_CACHE] / 'gradle.properties').read_text()
+        assert "org.gradle.daemon=false" in properties, (name, properties)
+
+
+def check_locks(tmp_dir: str):
+    caches = make_caches(tmp_dir, 'locks')
+    caches.env()
+    spans = {PUB_CACHE: [], GRADLE_CACHE: []}
+    
+    def use(name: str, exclusive: bool):
+        with caches.lock(name, exclusive):
+            start = time.monotonic()
+            time.sleep(0.3)
+            spans[name].append((start, time.monotonic()))
+    
+    threads = [threading.Thread(target=use, args=(PUB_CACHE, True)) for _ in range(3)]
+    threads += [threading.Thread(target=use, args=(GRADLE_CACHE, False)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pub = sorted(spans[PUB_CACHE])
+    assert all(a[1] <= b[0] for a, b in zip(pub, pub[1:])), "pub get runs overlapped"
+    gradle = sorted(spans[GRADLE_CACHE])
+    assert gradle[-1][0] < gradle[0][1], "Gradle builds did not share the cache"
+
+
+def check_eviction(tmp_dir: str):
+    caches = make_caches(tmp_dir, 'evict', pub_cache_max_bytes=5 * MB)
+    caches.env()
+    before = caches.snapshot()
+    hosted = caches.dirs[PUB_CACHE] / 'hosted' / 'pub.dev'
+    now = time.time()
+    for i in range(8):
+        package = hosted / f'pkg{i}-1.0.0'
+        package.mkdir(parents=True)
+        (package / 'lib.dart').write_bytes(b'\0' * MB)
+        # pkg0 was used longest ago
+        os.utime(package, (now - 3600 + i * 60, now - 3600 + i * 60))
+    assert caches.usage(before)[PUB_CACHE]['added'] == 8
+    
+    # A build holds the cache: nothing is evicted
+    with caches.lock(PUB_CACHE):
+        assert PUB_CACHE not in caches.evict()
+    assert len(caches.entries(PUB_CACHE)) == 8
+    
+    # A build used pkg1 just now
+    lock_path = Path(tmp_dir) / 'evict-pubspec.lock'
+    lock_path.write_text('packages:\n  pkg1:\n    source: hosted\n    version: "1.0.0"\n')
+    assert caches.mark_used(lock_path) == {'hosted/pub.dev/pkg1-1.0.0'}
+    
+    freed = caches.evict()
+    left = sorted(path.name for path in hosted.iterdir())
+    # Down to 80% of 5 MB: the four least recently used go
+    assert left == ['pkg1-1.0.0', 'pkg5-1.0.0', 'pkg6-1.0.0', 'pkg7-1.0.0'], left
+    assert freed[PUB_CACHE] == 4 * MB and freed[GRADLE_CACHE] == 0, freed
+
+
+def check_build_holds_caches(tmp_dir: str):
+    cache_dir = str(Path(tmp_dir) / 'held-caches')
+    build = {'cache_dir': cache_dir, 'template_cache': False, 'artifact_cache': False, 'pub_cache_max_bytes': 1}
+    task = BuildWeatherApkTask({'build': build})
+    package = task.build_caches.dirs[PUB_CACHE] / 'hosted' / 'pub.dev' / 'http-1.2.0'
+    package.mkdir(parents=True)
+    (package / 'lib.dart').write_bytes(b'\0' * MB)
+    # Another job finishes and evicts while this one's Gradle build runs
+    other = SharedBuildCaches({'build': build})
+    freed = []
+    
+    def gradle(command, on_line, **kwargs):
+        freed.append(other.evict())
+        return True, ''
+    
+    task.shell.stream_safe = gradle
+    task._run_build(Path(tmp_dir))
+    assert freed and not freed[0], freed
+    assert package.exists()
+    assert PUB_CACHE in other.evict() and not package.exists()
+
+
+def check_artifact_store(tmp_dir: str):
+    cache_dir = str(Path(tmp_dir) / 'artifact-cache')
+    store = ArtifactStore({'build': {'cache_dir': cache_dir, 'artifact_cache_max_bytes': 5 * MB}})
+    apks = Path(tmp_dir) / 'apks'
+    apks.mkdir()
+    assert store.get('k0') is None and store.fetch('k0', apks / 'out.apk') is None
+    
+    now = time.time()
+    for i in range(4):
+        apk = apks / f'app{i}.apk'
+        apk.write_bytes(bytes([i]) * MB)
+        entry = store.put(f'k{i}', apk, f'job{i}')
+        assert entry['size'] == MB and entry['job_id'] == f'job{i}', entry
+        # k0 was used longest ago
+        os.utime(store.keys_dir / f'k{i}.json', (now - 3600 + i * 60, now - 3600 + i * 60))
+    # Same APK, second key: no second blob
+    store.put('k0-again', apks / 'app0.apk', 'job4')
+    assert len(list(store.blobs_dir.iterdir())) == 4
+    
+    target = apks / 'workspace' / 'app-release.apk'
+    entry = store.fetch('k2', target)
+    assert entry['job_id'] == 'job2' and target.read_bytes() == bytes([2]) * MB, entry
+    # The copy in a workspace is not the stored blob
+    target.unlink()
+    assert store.get('k2')
+    
+    # 6 MB over 5 MB: down to 4 MB, k1 and k3 least recently used
+    for i in range(4, 6):
+        apk = apks / f'app{i}.apk'
+        apk.write_bytes(bytes([i]) * MB)
+        store.put(f'k{i}', apk, f'job{i}')
+    keys = sorted(path.stem for path in store.keys_dir.glob('*.json'))
+    assert keys == ['k0-again', 'k2', 'k4', 'k5'], keys
+    assert len(list(store.blobs_dir.iterdir())) == 4
+    assert store.fetch('k0-again', target)['job_id'] == 'job4'
+
+
+def main():
+    checks = [
+        ('parallel builds create the template once', check_parallel_builds_create_once),
+        ('clone is independent of the template', check_clone_is_independent),
+        ('SDK upgrade replaces the template', check_sdk_upgrade),
+        ('failed flutter create leaves nothing', check_failed_create),
+        ('Gradle daemon settings', check_daemon_settings),
+        ('pub locked exclusively, Gradle shared', check_locks),
+        ('LRU eviction, not while in use', check_eviction),
+        ('Gradle build holds the pub cache too', check_build_holds_caches),
+        ('artifact store by input key, LRU eviction', check_artifact_store),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
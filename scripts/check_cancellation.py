@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Job cancellation and timeout checks
+
+Starts long-running commands (with children, some ignoring SIGTERM) and
+checks that cancelling or timing them out kills the whole process group,
+that the job gets the right status and that its worker slot is free
+right away, also when the task ignores the cancel and keeps its thread:
+
+    python3 scripts/check_cancellation.py
+"""
+
+import asyncio
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import JobHarness, make_config, run_checks
+from src.jobs.job_manager import JobStatus
+from src.tasks.registry import TaskSpec
+from src.utils.cancel import REASON_TIMEOUT, CancelToken, JobCancelled, cancel_scope
+from src.utils.shell import KILL_GRACE_SECONDS, ShellRunner, run_process
+
+# Leader writes its PID (= process group ID), starts two sleeping children
+# and ignores SIGTERM itself, so only SIGKILL stops it
+STUBBORN = "echo $$ > {pid_file}; trap '' TERM; sleep 300 & sleep 300 & wait"
+
+
+def group_alive(pgid: int) -> bool:
+    """Whether any non-zombie process is left in the group"""
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            stat = Path(f'/proc/{entry}/stat').read_text()
+        except OSError:
+            continue
+        # Fields after the command name: state ppid pgrp ...
+        fields = stat.rsplit(')', 1)[1].split()
+        if int(fields[2]) == pgid and fields[0] != 'Z':
+            return True
+    return False
+
+
+def wait_for_pid(pid_file: Path) -> int:
+    for _ in range(100):
+        if pid_file.exists() and pid_file.read_text().strip():
+            return int(pid_file.read_text())
+        time.sleep(0.05)
+    raise AssertionError("command did not start")
+
+
+def check_cancel_kills_group(tmp_dir: str):
+    pid_file = Path(tmp_dir) / 'cancel.pid'
+    token = CancelToken()
+    threading.Timer(0.5, token.cancel).start()
+    start = time.monotonic()
+    try:
+        with cancel_scope(token):
+            run_process(['sh', '-c', STUBBORN.format(pid_file=pid_file)])
+        raise AssertionError("run_process returned after cancel")
+    except JobCancelled:
+        pass
+    elapsed = time.monotonic() - start
+    assert elapsed < KILL_GRACE_SECONDS + 2, f"cancel took {elapsed:.1f}s"
+    assert not group_alive(wait_for_pid(pid_file)), "processes left after cancel"
+
+
+def check_timeout_kills_group(tmp_dir: str):
+    pid_file = Path(tmp_dir) / 'timeout.pid'
+    try:
+        run_process(['sh', '-c', f"echo $$ > {pid_file}; sleep 300 & sleep 300 & wait"], timeout=0.5)
+        raise AssertionError("run_process returned after timeout")
+    except subprocess.TimeoutExpired:
+        pass
+    assert not group_alive(wait_for_pid(pid_file)), "processes left after timeout"
+
+
+def check_cancelled_before_start():
+    token = CancelToken()
+    token.cancel()
+    try:
+        with cancel_scope(token):
+            ShellRunner().run("sleep 300")
+        raise AssertionError("command started after cancel")
+    except JobCancelled:
+        pass
+
+
+class ShellTask:
+    """Runs one command through ShellRunner, like the build task"""
+    
+    def __init__(self, command: str):
+        self.command = command
+    
+    def execute(self, job_id, workspace_dir, logs_path, report_path):
+        returncode, _, _ = ShellRunner(timeout=600).run(self.command)
+        return {'returncode': returncode}
+
+
+def cancel_config(tmp_dir: str, name: str, **security) -> dict:
+    return make_config(
+        tmp_dir,
+        name,
+        workers={'default': 1, 'slow': 1},
+        queue={'poll_interval': 0.2, 'lease_seconds': 3},
+        security=security,
+    )
+
+
+async def check_executor_cancel(tmp_dir: str):
+    config = cancel_config(tmp_dir, 'executor')
+    async with JobHarness(config) as h:
+        pid_file = Path(tmp_dir) / 'executor.pid'
+        job_id = await h.job_store.create_job("slow")
+        asyncio.get_running_loop().call_later(0.5, lambda: asyncio.ensure_future(h.job_store.cancel_job(job_id)))
+        asyncio.get_running_loop().call_later(0.6, h.executor.cancel, job_id)
+        
+        start = time.monotonic()
+        try:
+            command = shlex.join(['sh', '-c', STUBBORN.format(pid_file=pid_file)])
+            await h.executor.execute_job(job_id, ShellTask(command).execute)
+            raise AssertionError("execute_job returned after cancel")
+        except JobCancelled:
+            pass
+        elapsed = time.monotonic() - start
+        assert elapsed < 1.5, f"worker slot held for {elapsed:.1f}s after cancel"
+        job = await h.job_store.get_job(job_id)
+        assert job['status'] == JobStatus.CANCELLED.value, job['status']
+        
+        # The pool's only thread is abandoned, so a new pool runs this at once
+        quick_id = await h.job_store.create_job("quick")
+        result = await asyncio.wait_for(h.executor.execute_job(quick_id, ShellTask("true").execute), 2)
+        assert result == {'returncode': 0}
+        # The stubborn group is killed once the SIGTERM grace is over
+        pgid = wait_for_pid(pid_file)
+        deadline = time.monotonic() + KILL_GRACE_SECONDS + 2
+        while group_alive(pgid) and time.monotonic() < deadline:
+            await asyncio.sleep(0.2)
+        assert not group_alive(pgid), "processes left after cancel"
+
+
+async def check_executor_timeout(tmp_dir: str):
+    config = cancel_config(tmp_dir, 'timeout', max_job_timeout=1)
+    async with JobHarness(config) as h:
+        pid_file = Path(tmp_dir) / 'job-timeout.pid'
+        job_id = await h.job_store.create_job("slow")
+        
+        start = time.monotonic()
+        try:
+            await h.executor.execute_job(job_id, ShellTask(f"sh -c 'echo $$ > {pid_file}; sleep 300'").execute)
+            raise AssertionError("execute_job returned after the timeout")
+        except JobCancelled as e:
+            assert e.reason == REASON_TIMEOUT
+        elapsed = time.monotonic() - start
+        assert elapsed < 2, f"timeout took {elapsed:.1f}s"
+        job = await h.job_store.get_job(job_id)
+        assert job['status'] == JobStatus.FAILED.value, job['status']
+        assert "timed out" in job['error_message']
+        await asyncio.sleep(1)
+        assert not group_alive(wait_for_pid(pid_file)), "processes left after timeout"
+
+
+async def check_abandoned_thread_replaced(tmp_dir: str):
+    def deaf_task(job_id, workspace_dir, logs_path, report_path):
+        # Runs no command, so nothing kills it: holds its thread for 3s
+        time.sleep(3)
+        return {}
+    
+    config = cancel_config(tmp_dir, 'abandoned')
+    async with JobHarness(config) as h:
+        job_id = await h.job_store.create_job("deaf")
+        asyncio.get_running_loop().call_later(0.3, h.executor.cancel, job_id)
+        try:
+            await h.executor.execute_job(job_id, deaf_task)
+            raise AssertionError("execute_job returned after cancel")
+        except JobCancelled:
+            pass
+        
+        # The only thread of the pool is still in deaf_task; a new pool runs this
+        start = time.monotonic()
+        quick_id = await h.job_store.create_job("quick")
+        assert await h.executor.execute_job(quick_id, ShellTask("true").execute) == {'returncode': 0}
+        assert time.monotonic() - start < 1.5, f"next job waited {time.monotonic() - start:.1f}s for the thread"
+
+
+async def check_dispatcher_cancel(tmp_dir: str):
+    config = cancel_config(tmp_dir, 'dispatcher')
+    tasks = {
+        'slow': TaskSpec(lambda c, p: ShellTask("sleep 300"), pool='slow'),
+        'quick': TaskSpec(lambda c, p: ShellTask("true"), pool='slow'),
+    }
+    async with JobHarness(config, tasks) as h:
+        slow_id = await h.dispatcher.submit("slow")
+        for _ in range(50):
+            if (await h.job_store.get_job(slow_id))['status'] == JobStatus.RUNNING.value:
+                break
+            await asyncio.sleep(0.05)
+        quick_id = await h.dispatcher.submit("quick")
+        assert await h.dispatcher.cancel(slow_id)
+        assert not await h.dispatcher.cancel(slow_id), "cancelled twice"
+        
+        # The only worker of the pool runs the next job
+        assert await asyncio.wait_for(h.dispatcher.wait(quick_id), 3) == {'returncode': 0}
+        assert (await h.job_store.get_job(slow_id))['status'] == JobStatus.CANCELLED.value
+
+
+def main():
+    checks = [
+        ('cancel kills the process group', check_cancel_kills_group),
+        ('timeout kills the process group', check_timeout_kills_group),
+        ('no command starts after cancel', lambda tmp_dir: check_cancelled_before_start()),
+        ('executor cancel frees the worker', check_executor_cancel),
+        ('executor enforces the job timeout', check_executor_timeout),
+        ('abandoned task thread is replaced', check_abandoned_thread_replaced),
+        ('dispatcher cancel of a running job', check_dispatcher_cancel),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
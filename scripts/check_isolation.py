@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Process isolation checks
+
+Runs jobs with ``job_isolation = "process"`` that break each resource
+limit (memory, CPU time, file size, workspace quota), crash or get
+cancelled, and checks that they fail with the reason while the parent
+keeps serving; a normal job must still return its result and log:
+
+    python3 scripts/check_isolation.py
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import JobHarness, make_config, run_checks
+from src.jobs.job_manager import JobStatus
+from src.utils.cancel import JobCancelled
+from src.utils.shell import ShellRunner
+
+MB = 1024 * 1024
+
+
+def echo_task(job_id, workspace_dir, logs_path, report_path):
+    print("hello from", job_id)
+    logging.getLogger("echo").info("TOKEN=abc123 logged")
+    return {'pid': os.getpid()}
+
+
+def memory_hog(job_id, workspace_dir, logs_path, report_path):
+    blocks = []
+    while True:
+        blocks.append(bytearray(64 * MB))
+
+
+def cpu_spin(job_id, workspace_dir, logs_path, report_path):
+    while True:
+        pass
+
+
+def big_file(job_id, workspace_dir, logs_path, report_path):
+    with open(Path(workspace_dir) / 'big.bin', 'wb') as f:
+        for _ in range(100):
+            f.write(b'\0' * MB)
+    return {}
+
+
+def many_files(job_id, workspace_dir, logs_path, report_path):
+    for i in range(1000):
+        (Path(workspace_dir) / f'part-{i}.bin').write_bytes(b'\0' * 512 * 1024)
+        time.sleep(0.01)
+    return {}
+
+
+def crash(job_id, workspace_dir, logs_path, report_path):
+    os.kill(os.getpid(), signal.SIGSEGV)
+
+
+def bad_input(job_id, workspace_dir, logs_path, report_path):
+    raise ValueError("not allowed")
+
+
+def long_command(job_id, workspace_dir, logs_path, report_path):
+    ShellRunner(timeout=600).run(f"sh -c 'echo $$ > {workspace_dir}/sleep.pid; sleep 300'")
+    return {}
+
+
+async def run_job(tmp_dir: str, name: str, task, cancel_after=None, **security):
+    """Run one job, return (job row, result or exception, log text, seconds)"""
+    config = make_config(tmp_dir, name, security={'job_isolation': 'process', **security})
+    async with JobHarness(config) as h:
+        job_id = await h.job_store.create_job(name)
+        if cancel_after:
+            asyncio.get_running_loop().call_later(cancel_after, h.executor.cancel, job_id)
+        
+        # The event loop must keep running while the job breaks its limits
+        ticks = 0
+        
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.05)
+                ticks += 1
+        
+        beat = asyncio.create_task(heartbeat())
+        start = time.monotonic()
+        try:
+            outcome = await h.executor.execute_job(job_id, task)
+        except (Exception, JobCancelled) as e:
+            outcome = e
+        elapsed = time.monotonic() - start
+        beat.cancel()
+        assert ticks >= elapsed / 0.05 * 0.5, f"event loop stalled ({ticks} ticks in {elapsed:.1f}s)"
+        
+        job = await h.job_store.get_job(job_id)
+        logs_path = h.workspace(job_id) / 'logs.txt'
+        logs = logs_path.read_text() if logs_path.exists() else ''
+    return job, outcome, logs, elapsed
+
+
+def assert_failed(job: dict, reason: str):
+    assert job['status'] == JobStatus.FAILED.value, job['status']
+    assert reason in job['error_message'], job['error_message']
+
+
+async def check_result_and_logs(tmp_dir: str):
+    job, outcome, logs, _ = await run_job(tmp_dir, 'echo', echo_task)
+    assert job['status'] == JobStatus.COMPLETED.value, job['status']
+    assert outcome['pid'] != os.getpid(), "task ran in the bot process"
+    assert "hello from" in logs, logs
+    assert "logged" in logs and "abc123" not in logs, logs
+
+
+async def check_memory(tmp_dir: str):
+    job, *_ = await run_job(tmp_dir, 'memory', memory_hog, max_memory_per_job=512 * MB)
+    assert_failed(job, "Memory limit exceeded")
+
+
+async def check_cpu(tmp_dir: str):
+    job, *_ = await run_job(tmp_dir, 'cpu', cpu_spin, max_cpu_per_job=1)
+    assert_failed(job, "CPU time limit exceeded")
+
+
+async def check_file_size(tmp_dir: str):
+    job, *_ = await run_job(tmp_dir, 'fsize', big_file, max_disk_per_job=10 * MB)
+    assert_failed(job, "File size limit exceeded")
+
+
+async def check_disk_quota(tmp_dir: str):
+    job, *_ = await run_job(tmp_dir, 'quota', many_files, max_disk_per_job=20 * MB, disk_check_interval=0.2)
+    assert_failed(job, "Disk quota exceeded")
+
+
+async def check_crash(tmp_dir: str):
+    job, *_ = await run_job(tmp_dir, 'crash', crash)
+    assert_failed(job, "SIGSEGV")
+
+
+async def check_exception_type(tmp_dir: str):
+    job, outcome, *_ = await run_job(tmp_dir, 'error', bad_input)
+    assert isinstance(outcome, ValueError), repr(outcome)
+    assert_failed(job, "not allowed")
+
+
+async def check_cancel(tmp_dir: str):
+    job, outcome, _, elapsed = await run_job(tmp_dir, 'cancel', long_command, cancel_after=2)
+    assert isinstance(outcome, JobCancelled), repr(outcome)
+    assert job['status'] == JobStatus.CANCELLED.value, job['status']
+    assert elapsed < 3, f"cancel took {elapsed:.1f}s"
+    # The command's own process group goes too
+    pid_file = next(Path(tmp_dir, 'cancel-workspaces').glob('*/sleep.pid'))
+    time.sleep(1)
+    try:
+        os.kill(int(pid_file.read_text()), 0)
+        raise AssertionError("command left running after cancel")
+    except ProcessLookupError:
+        pass
+
+
+def main():
+    checks = [
+        ('result and log come back', check_result_and_logs),
+        ('memory limit', check_memory),
+        ('CPU time limit', check_cpu),
+        ('file size limit', check_file_size),
+        ('workspace disk quota', check_disk_quota),
+        ('crashing task', check_crash),
+        ('task exception type', check_exception_type),
+        ('cancel kills the job process', check_cancel),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
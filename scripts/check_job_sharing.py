@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Job sharing checks
+
+Sends identical and different /status and /audit_site commands through
+the real handlers, JobDispatcher and ResultDelivery (fake bot, stand-in
+tasks that count their runs) and checks that identical requests share a
+queued or running job, that a recent report is reused within its TTL but
+not with -f or after it, and that every chat gets its result once:
+
+    python3 scripts/check_job_sharing.py
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import JobHarness, make_config, run_checks
+from src.jobs.dispatcher import SHARED_CACHED
+from src.tasks.registry import TASKS, TaskSpec
+from src.telegram.delivery import ResultDelivery
+from src.telegram.handlers import handle_audit_site, handle_status
+
+# Runs per target, counted by the stand-in tasks
+RUNS: Counter = Counter()
+RUNS_LOCK = threading.Lock()
+
+
+class CountingTask:
+    """Stand-in task: counts its run, sleeps, writes a report"""
+    
+    def __init__(self, target: str, seconds: float):
+        self.target = target
+        self.seconds = seconds
+    
+    def execute(self, job_id, workspace_dir, logs_path, report_path):
+        with RUNS_LOCK:
+            RUNS[self.target] += 1
+        time.sleep(self.seconds)
+        if self.target.endswith(' fail'):
+            raise RuntimeError("simulated failure")
+        Path(report_path).write_text(f"# {self.target}\n")
+        return {'details': {'exposed_paths': [{'title': '/.env'}]}}
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = defaultdict(list)
+    
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent[chat_id].append(('message', text))
+    
+    async def send_document(self, chat_id, document, filename=None, caption=None, **kwargs):
+        document.read()
+        self.sent[chat_id].append(('document', filename))
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+    
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class Harness(JobHarness):
+    def __init__(self, tmp_dir: str, name: str):
+        config = make_config(
+            tmp_dir,
+            name,
+            queue={'poll_interval': 0.2},
+            workers={'status': 4, 'audit': 4, 'load_test': 2},
+            reuse_ttl={'status': 1, 'audit_site': 60},
+        )
+        tasks = {
+            'status': TaskSpec(
+                lambda c, p: CountingTask(f"status {p.get('host')}", 0.5),
+                pool='status',
+                share_key=TASKS['status'].share_key,
+            ),
+            'audit_site': TaskSpec(
+                lambda c, p: CountingTask(f"audit {p.get('domain')}", 0.5),
+                pool='audit',
+                share_key=TASKS['audit_site'].share_key,
+            ),
+            'ddos': TaskSpec(lambda c, p: CountingTask(f"ddos {p.get('url')}", 0.5), pool='load_test'),
+        }
+        super().__init__(config, tasks)
+        self.bot = FakeBot()
+        self.chat_ids = iter(range(1, 10 ** 6))
+    
+    def before_start(self):
+        self.dispatcher.add_listener(ResultDelivery(self.bot, self.dispatcher).deliver)
+    
+    async def command(self, handler, *args):
+        """Run a command handler in a new chat, return (chat_id, reply)"""
+        chat_id = next(self.chat_ids)
+        message = FakeMessage()
+        update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=chat_id))
+        await handler(update, SimpleNamespace(args=list(args)), self.dispatcher)
+        return chat_id, message.replies[0]
+    
+    async def delivered(self, chat_ids, count: int = 1, timeout: float = 10):
+        """Wait until every chat got count items, return what they got"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if all(len(self.bot.sent[chat_id]) >= count for chat_id in chat_ids):
+                break
+            await asyncio.sleep(0.05)
+        # Late duplicates would show up here
+        await asyncio.sleep(0.3)
+        return {chat_id: self.bot.sent[chat_id] for chat_id in chat_ids}
+
+
+async def check_identical_requests_share_a_job(tmp_dir: str):
+    async with Harness(tmp_dir, 'share') as h:
+        commands = await asyncio.gather(*(h.command(handle_status, 'Example.com') for _ in range(20)))
+        commands += [await h.command(handle_status, 'example.com/')]
+        replies = [reply for _, reply in commands]
+        assert sum("allaqachon bajarilmoqda" in reply for reply in replies) == 20, replies
+        
+        sent = await h.delivered([chat_id for chat_id, _ in commands])
+        assert RUNS['status Example.com'] == 1, RUNS
+        for chat_id, items in sent.items():
+            assert items == [('document', 'status_report.md')], (chat_id, items)
+
+
+async def check_different_requests_do_not_share(tmp_dir: str):
+    async with Harness(tmp_dir, 'separate') as h:
+        commands = await asyncio.gather(
+            h.command(handle_status, 'a.example.com'),
+            h.command(handle_status, 'b.example.com'),
+            h.command(handle_status),
+        )
+        await h.delivered([chat_id for chat_id, _ in commands])
+        assert RUNS['status a.example.com'] == RUNS['status b.example.com'] == RUNS['status None'] == 1, RUNS
+        
+        # Load tests are never shared
+        submissions = await asyncio.gather(*(
+            h.dispatcher.request("ddos x.example.com -10", {'url': 'x.example.com', 'count': 10})
+            for _ in range(2)
+        ))
+        assert len({s.job_id for s in submissions}) == 2 and not any(s.shared for s in submissions)
+
+
+async def check_recent_report_is_reused(tmp_dir: str):
+    async with Harness(tmp_dir, 'reuse') as h:
+        first, _ = await h.command(handle_status, 'reuse.example.com')
+        await h.delivered([first])
+        
+        submission = await h.dispatcher.request(
+            "status reuse.example.com",
+            {'host': 'reuse.example.com'},
+            {'chat_id': 7},
+        )
+        assert submission.shared == SHARED_CACHED, submission
+        second, reply = await h.command(handle_status, 'reuse.example.com')
+        assert "oldingi natija" in reply, reply
+        sent = await h.delivered([second])
+        assert sent[second] == [('document', 'status_report.md')], sent
+        assert RUNS['status reuse.example.com'] == 1, RUNS
+        
+        # -f runs it again
+        forced, reply = await h.command(handle_status, '-f', 'reuse.example.com')
+        assert "oldingi natija" not in reply, reply
+        await h.delivered([forced])
+        assert RUNS['status reuse.example.com'] == 2, RUNS
+        
+        # After the TTL (1 s here) it runs again too
+        await asyncio.sleep(1.2)
+        late, reply = await h.command(handle_status, 'reuse.example.com')
+        assert "oldingi natija" not in reply, reply
+        await h.delivered([late])
+        assert RUNS['status reuse.example.com'] == 3, RUNS
+
+
+async def check_flags_are_per_request(tmp_dir: str):
+    async with Harness(tmp_dir, 'flags') as h:
+        plain, _ = await h.command(handle_audit_site, 'flags.example.com')
+        detailed, reply = await h.command(handle_audit_site, '-d', 'flags.example.com')
+        assert "allaqachon bajarilmoqda" in reply, reply
+        sent = await h.delivered([plain, detailed], count=1)
+        assert RUNS['audit flags.example.com'] == 1, RUNS
+        assert sent[plain] == [('document', 'audit_report.md')], sent[plain]
+        assert sent[detailed][0] == ('document', 'audit_report.md'), sent[detailed]
+        assert len(sent[detailed]) == 2 and "/.env" in sent[detailed][1][1], sent[detailed]
+        
+        # A reused report also honours -d
+        reused, reply = await h.command(handle_audit_site, '-d', 'flags.example.com')
+        assert "oldingi natija" in reply, reply
+        sent = await h.delivered([reused], count=2)
+        assert len(sent[reused]) == 2 and "/.env" in sent[reused][1][1], sent[reused]
+
+
+async def check_failures_and_cancels_reach_everyone(tmp_dir: str):
+    async with Harness(tmp_dir, 'fail') as h:
+        commands = await asyncio.gather(*(h.command(handle_status, 'fail') for _ in range(3)))
+        sent = await h.delivered([chat_id for chat_id, _ in commands])
+        assert RUNS['status fail'] == 1, RUNS
+        for items in sent.values():
+            assert len(items) == 1 and "simulated failure" in items[0][1], items
+        
+        # Failures are not reused
+        retry, reply = await h.command(handle_status, 'fail')
+        assert "oldingi natija" not in reply, reply
+        await h.delivered([retry])
+        assert RUNS['status fail'] == 2, RUNS
+        
+        first, _ = await h.command(handle_status, 'cancel.example.com')
+        second, _ = await h.command(handle_status, 'cancel.example.com')
+        submission = await h.dispatcher.request("status cancel.example.com", {'host': 'cancel.example.com'})
+        await asyncio.sleep(0.2)
+        assert await h.dispatcher.cancel(submission.job_id)
+        sent = await h.delivered([first, second])
+        for items in sent.values():
+            assert len(items) == 1 and "bekor qilindi" in items[0][1], items
+        
+        # A cancelled job is not joined
+        third, reply = await h.command(handle_status, 'cancel.example.com')
+        assert "allaqachon bajarilmoqda" not in reply, reply
+        await h.delivered([third])
+
+
+def main():
+    checks = [
+        ('identical requests share a job', check_identical_requests_share_a_job),
+        ('different requests run their own jobs', check_different_requests_do_not_share),
+        ('recent report reused, -f and TTL', check_recent_report_is_reused),
+        ('flags are per request', check_flags_are_per_request),
+        ('failures and cancels reach everyone', check_failures_and_cancels_reach_everyone),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Matrix build checks
+
+Runs matrix weather builds through JobExecutor with a stand-in flutter
+(creates lib/, "downloads" a package on pub get, sleeps on build and
+writes lib/main.dart as the APK) and checks that the project is created
+and its dependencies fetched once, that no more than matrix_parallel
+variants build at a time, that every variant gets its own language, that
+a second identical matrix comes from the artifact cache, and that a
+failed variant does not stop the others:
+
+    python3 scripts/check_matrix_build.py
+"""
+
+import json
+import logging
+import stat
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import JobHarness, make_config, run_checks
+from src.tasks.build_android_apk import BuildWeatherApkTask, weather_matrix
+from src.tasks.registry import TASKS
+
+# Every call is appended to calls.txt; builds also log start and end
+# times to timeline.txt. A city named Failtown fails to build
+FAKE_FLUTTER = """#!/bin/sh
+echo "$1" >> {base}/calls.txt
+case "$1" in
+  create) for last; do :; done; mkdir -p "$last/lib" ;;
+  pub)
+    mkdir -p "$PUB_CACHE/hosted/pub.dev/http-1.2.0"
+    printf 'packages:\\n  http:\\n    source: hosted\\n    version: "1.2.0"\\n' > pubspec.lock ;;
+  build)
+    echo "start $(date +%s.%N)" >> {base}/timeline.txt
+    sleep 1
+    echo "end $(date +%s.%N)" >> {base}/timeline.txt
+    grep -q Failtown lib/main.dart && {{ echo "gradle failed" >&2; exit 1; }}
+    mkdir -p build/app/outputs/flutter-apk
+    case "$*" in
+      *--split-per-abi*)
+        for abi in armeabi-v7a arm64-v8a x86_64; do
+          cp lib/main.dart "build/app/outputs/flutter-apk/app-$abi-release.apk"
+        done ;;
+      *) cp lib/main.dart build/app/outputs/flutter-apk/app-release.apk ;;
+    esac ;;
+esac
+"""
+
+
+class Harness(JobHarness):
+    """Job store and executor with a stand-in flutter in a temporary directory"""
+    
+    def __init__(self, tmp_dir: str, name: str):
+        self.base = Path(tmp_dir) / name
+        self.base.mkdir()
+        flutter = self.base / 'flutter'
+        flutter.write_text(FAKE_FLUTTER.format(base=self.base))
+        flutter.chmod(flutter.stat().st_mode | stat.S_IXUSR)
+        build = {'flutter_path': str(flutter), 'cache_dir': str(self.base / 'cache'), 'matrix_parallel': 2}
+        super().__init__(make_config(tmp_dir, name, build=build))
+    
+    async def build(self, **params):
+        job_id = await self.job_store.create_job('build_weather_apk', {'params': params})
+        task = TASKS['build_weather_apk'].factory(self.config, params)
+        result = await self.executor.execute_job(job_id, task.execute, pool='build')
+        return job_id, result
+    
+    def calls(self, name: str) -> int:
+        return (self.base / 'calls.txt').read_text().split().count(name)
+    
+    def max_parallel_builds(self) -> int:
+        events = sorted(
+            (float(value), 1 if kind == 'start' else -1)
+            for kind, value in (line.split() for line in (self.base / 'timeline.txt').read_text().splitlines())
+        )
+        running = peak = 0
+        for _, change in events:
+            running += change
+            peak = max(peak, running)
+        return peak
+
+
+async def check_matrix(tmp_dir: str):
+    async with Harness(tmp_dir, 'matrix') as h:
+        cities = ['Tashkent', 'Samarkand', 'New York']
+        start = time.monotonic()
+        job_id, result = await h.build(cities=cities, languages=['en', 'uz'])
+        elapsed = time.monotonic() - start
+        assert result['success'] and len(result['variants']) == 6, result
+        assert h.calls('create') == 1 and h.calls('pub') == 1 and h.calls('build') == 6, h.base
+        assert h.max_parallel_builds() == 2, h.max_parallel_builds()
+        # 6 one-second builds two at a time
+        assert 3 <= elapsed < 6, elapsed
+        
+        variants = h.workspace(job_id) / 'variants'
+        assert sorted(path.name for path in variants.iterdir()) == [
+            'new_york-en', 'new_york-uz', 'samarkand-en', 'samarkand-uz', 'tashkent-en', 'tashkent-uz',
+        ]
+        apk = (variants / 'new_york-uz' / 'build/app/outputs/flutter-apk/app-release.apk').read_text()
+        assert "Namlik" in apk and "New York" in apk, apk
+        assert "Humidity" in (variants / 'tashkent-en' / 'lib' / 'main.dart').read_text()
+        
+        report = (h.workspace(job_id) / 'report.md').read_text()
+        assert "6 of 6 built" in report and "New York (uz): built in" in report, report
+        assert "Pub: 0 packages from cache, 1 downloaded" in report, report
+        assert result['job_metadata'] == {'variants': '6/6', 'artifact_cache': '0 hit, 6 miss'}, result
+
+
+async def check_matrix_from_cache(tmp_dir: str):
+    async with Harness(tmp_dir, 'cached') as h:
+        await h.build(cities=['Tashkent', 'Bukhara'], languages=['en', 'ru'])
+        builds = h.calls('build')
+        start = time.monotonic()
+        # Same matrix, other order
+        job_id, result = await h.build(cities=['Bukhara', 'Tashkent'], languages=['ru', 'en'])
+        assert time.monotonic() - start < 2, time.monotonic() - start
+        assert h.calls('build') == builds, "a cached variant was built again"
+        assert result['job_metadata']['artifact_cache'] == '4 hit, 0 miss', result
+        apk = h.workspace(job_id) / 'variants' / 'bukhara-ru' / 'build/app/outputs/flutter-apk/app-release.apk'
+        assert "Погода" in apk.read_text()
+        assert "Bukhara (ru): from artifact cache" in (h.workspace(job_id) / 'report.md').read_text()
+        
+        # The single-variant build of one of them is a hit too
+        job_id, result = await h.build(cities=['Tashkent'], languages=['en'])
+        assert result['job_metadata']['artifact_cache'] == 'hit' and h.calls('build') == builds, result
+
+
+async def check_split_and_failure(tmp_dir: str):
+    async with Harness(tmp_dir, 'split') as h:
+        job_id, result = await h.build(cities=['Tashkent', 'Failtown'], split_per_abi=True)
+        assert not result['success'], result
+        tashkent, failtown = result['variants']
+        assert len(tashkent['apks']) == 3 and all(Path(apk).exists() for apk in tashkent['apks']), tashkent
+        assert "gradle failed" in failtown['error'], failtown
+        report = (h.workspace(job_id) / 'report.md').read_text()
+        assert "Some variants failed" in report and "Failtown (en): ❌ failed" in report, report
+        assert "Split per ABI:** yes" in report, report
+        
+        # Split APKs are cached one by one
+        builds = h.calls('build')
+        job_id, result = await h.build(cities=['Tashkent'], split_per_abi=True)
+        assert result['success'] and h.calls('build') == builds, result
+        
+        try:
+            await h.build(cities=['Failtown'], languages=['en', 'uz'])
+            raise AssertionError("a matrix with no built variant did not fail")
+        except Exception as e:
+            assert "All 2 variant builds failed" in str(e), e
+        assert json.loads((await h.job_store.get_job(job_id))['metadata'])['params']['split_per_abi']
+
+
+async def check_parameters(tmp_dir: str):
+    assert weather_matrix(None, None) == (['Tashkent'], ['en'])
+    assert weather_matrix(['Tashkent', 'Tashkent', 'Nukus'], ['UZ']) == (['Tashkent', 'Nukus'], ['uz'])
+    too_many = [f'City{i}' for i in range(13)]
+    for cities, languages in ((["Bad'City"], None), (['Tashkent'], ['de']), (too_many, ['en', 'uz'])):
+        try:
+            weather_matrix(cities, languages)
+            raise AssertionError(f"accepted {cities} {languages}")
+        except ValueError:
+            pass
+    
+    share_key = TASKS['build_weather_apk'].share_key
+    assert share_key({'cities': ['Nukus', 'Tashkent'], 'languages': ['uz', 'en']}) == share_key(
+        {'cities': ['Tashkent', 'Nukus'], 'languages': ['en', 'UZ']}
+    )
+    # The city is baked into the APK as written
+    assert share_key({'cities': ['tashkent']}) != share_key({'cities': ['Tashkent']})
+    assert share_key({}) == share_key({'cities': ['Tashkent'], 'languages': ['en']})
+    assert share_key({}) != share_key({'split_per_abi': True})
+    # A plain /build_weather_apk is still a single build
+    task = BuildWeatherApkTask({})
+    assert (task.cities, task.languages, task.split_per_abi) == (['Tashkent'], ['en'], False)
+
+
+def main():
+    logging.basicConfig(level=logging.CRITICAL)
+    checks = [
+        ('matrix builds every variant, bounded parallelism', check_matrix),
+        ('identical matrix from the artifact cache', check_matrix_from_cache),
+        ('split per ABI, failed variant does not stop others', check_split_and_failure),
+        ('matrix parameters and share key', check_parameters),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Pipeline checks
+
+Runs Pipeline with stand-in steps (parallel timing, failure, resume,
+cancel, invalid graphs), then the weather app build through JobExecutor
+with a fake flutter and a local bare git repository: the push must run
+next to the APK build and push exactly the generated sources while the
+build writes into the project, a build that failed once must resume without
+creating or pushing the project again, and a second build with the same
+inputs must get its APK from the artifact cache without running flutter:
+
+    python3 scripts/check_pipeline.py
+"""
+
+import json
+import logging
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import JobHarness, make_config, run_checks
+from src.jobs.dispatcher import JobDispatcher
+from src.jobs.job_manager import JobStatus
+from src.tasks.build_android_apk import BuildWeatherApkTask
+from src.tasks.pipeline import STEP_DONE, STEP_FAILED, STEP_SKIPPED, Pipeline, Step
+from src.tasks.registry import TASKS
+from src.utils.cancel import CancelToken, JobCancelled, cancel_scope
+from src.utils.shell import ShellRunner
+
+# Stand-in for flutter: create makes lib/, pub get "downloads" a package into
+# PUB_CACHE, build sleeps and writes the APK unless the fail flag file
+# exists; every call is appended to calls.txt
+FAKE_FLUTTER = """#!/bin/sh
+echo "$1" >> {calls}
+case "$1" in
+  create) for last; do :; done; mkdir -p "$last/lib" ;;
+  pub)
+    mkdir -p "$PUB_CACHE/hosted/pub.dev/http-1.2.0"
+    printf 'packages:\\n  http:\\n    source: hosted\\n    version: "1.2.0"\\n' > pubspec.lock ;;
+  build)
+    # What pub and Gradle write into the project while it builds
+    mkdir -p .dart_tool android/.gradle android/app/build
+    touch .flutter-plugins .flutter-plugins-dependencies android/local.properties android/app/build/R.jar
+    touch {held}
+    # Held open until the push has finished
+    i=0
+    until git --git-dir={remote} rev-parse -q --verify refs/heads/builds >/dev/null || [ $i -ge 100 ]; do
+      sleep 0.1; i=$((i + 1))
+    done
+    sleep 0.5
+    [ -e {fail_flag} ] && {{ echo "gradle failed" >&2; exit 1; }}
+    mkdir -p build/app/outputs/flutter-apk && echo apk > build/app/outputs/flutter-apk/app-release.apk ;;
+esac
+"""
+
+
+class Recorder:
+    """Stand-in steps: count runs, sleep, optionally fail"""
+    
+    def __init__(self):
+        self.runs = Counter()
+        self.lock = threading.Lock()
+    
+    def step(self, name: str, seconds: float = 0.0, fail: bool = False, output=None):
+        def run(outputs):
+            with self.lock:
+                self.runs[name] += 1
+            time.sleep(seconds)
+            if fail:
+                raise RuntimeError(f"{name} broke")
+            return output if output is not None else {'from': name, 'saw': sorted(outputs)}
+        return run
+
+
+def diamond(recorder: Recorder, fail_c: bool = False, seconds: float = 1.0):
+    return [
+        Step('a', "A", recorder.step('a')),
+        Step('b', "B", recorder.step('b', seconds), depends=('a',)),
+        Step('c', "C", recorder.step('c', seconds, fail=fail_c), depends=('a',)),
+        Step('d', "D", recorder.step('d'), depends=('b', 'c')),
+    ]
+
+
+async def check_parallel_steps(tmp_dir: str):
+    recorder = Recorder()
+    pipeline = Pipeline(diamond(recorder), str(Path(tmp_dir) / 'parallel.json'))
+    start = time.monotonic()
+    outputs = pipeline.run()
+    elapsed = time.monotonic() - start
+    assert elapsed < 1.7, f"b and c did not run in parallel ({elapsed:.1f}s)"
+    assert outputs['d'] == {'from': 'd', 'saw': ['a', 'b', 'c']}, outputs
+    stored = json.loads((Path(tmp_dir) / 'parallel.json').read_text())
+    for name in 'abcd':
+        assert stored[name]['status'] == STEP_DONE, stored
+        assert stored[name]['started_at'] <= stored[name]['finished_at'], stored
+    assert stored['b']['duration'] >= 1.0, stored
+
+
+async def check_failure(tmp_dir: str):
+    recorder = Recorder()
+    state_path = str(Path(tmp_dir) / 'failure.json')
+    try:
+        Pipeline(diamond(recorder, fail_c=True, seconds=0.3), state_path).run()
+        raise AssertionError("pipeline did not raise")
+    except RuntimeError as e:
+        assert "c broke" in str(e), e
+    stored = json.loads(Path(state_path).read_text())
+    assert stored['b']['status'] == STEP_DONE and stored['c']['status'] == STEP_FAILED, stored
+    assert stored['d']['status'] == STEP_SKIPPED and recorder.runs['d'] == 0, stored
+    assert "c broke" in stored['c']['error'], stored
+    
+    # Run again: only the failed step and what depends on it
+    outputs = Pipeline(diamond(recorder, seconds=0.3), state_path).run()
+    assert recorder.runs == Counter({'a': 1, 'b': 1, 'c': 2, 'd': 1}), recorder.runs
+    assert outputs['d']['saw'] == ['a', 'b', 'c'], outputs
+    pipeline = Pipeline(diamond(recorder), state_path)
+    pipeline.run()
+    assert all("(previous run)" in line for line in pipeline.summary()), pipeline.summary()
+
+
+async def check_cancel(tmp_dir: str):
+    token = CancelToken()
+    recorder = Recorder()
+    steps = [
+        Step('sleep', "Sleep", lambda outputs: ShellRunner().run("sleep 30")),
+        Step('after', "After", recorder.step('after'), depends=('sleep',)),
+    ]
+    threading.Timer(0.5, token.cancel).start()
+    start = time.monotonic()
+    try:
+        with cancel_scope(token):
+            Pipeline(steps, str(Path(tmp_dir) / 'cancel.json')).run()
+        raise AssertionError("pipeline was not cancelled")
+    except JobCancelled:
+        pass
+    assert time.monotonic() - start < 2, "cancel did not stop the step's command"
+    assert recorder.runs['after'] == 0
+
+
+async def check_invalid_graphs(tmp_dir: str):
+    noop = lambda outputs: None
+    for steps in (
+        [Step('a', "A", noop, depends=('b',)), Step('b', "B", noop, depends=('a',))],
+        [Step('a', "A", noop, depends=('missing',))],
+        [Step('a', "A", noop), Step('a', "A", noop)],
+    ):
+        try:
+            Pipeline(steps, str(Path(tmp_dir) / 'invalid.json'))
+            raise AssertionError(f"accepted {steps}")
+        except ValueError:
+            pass
+
+
+def git(*args, cwd=None) -> str:
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+
+def push_while_building(config: dict, held: Path) -> BuildWeatherApkTask:
+    """The task, with its push started only once the build has written into the project"""
+    task = BuildWeatherApkTask(config)
+    push_changes = task.github_pusher.push_changes
+    
+    def push(*args, **kwargs):
+        deadline = time.monotonic() + 10
+        while not held.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return push_changes(*args, **kwargs)
+    
+    task.github_pusher.push_changes = push
+    return task
+
+
+async def check_weather_build(tmp_dir: str):
+    base = Path(tmp_dir) / 'build'
+    base.mkdir()
+    calls = base / 'calls.txt'
+    fail_flag = base / 'fail'
+    flutter = base / 'flutter'
+    held = base / 'held'
+    bare = base / 'remote.git'
+    flutter.write_text(FAKE_FLUTTER.format(calls=calls, fail_flag=fail_flag, held=held, remote=bare))
+    flutter.chmod(flutter.stat().st_mode | stat.S_IXUSR)
+    git('init', '-q', '--bare', str(bare))
+    
+    config = make_config(
+        str(base),
+        'jobs',
+        build={'flutter_path': str(flutter), 'cache_dir': str(base / 'cache')},
+        github={'repo_url': str(bare), 'repo_path': str(base / 'repo'), 'branch': 'builds'},
+    )
+    os.environ.setdefault('GIT_AUTHOR_NAME', 'check')
+    async with JobHarness(config) as h:
+        job_store, executor = h.job_store, h.executor
+        job_id = await job_store.create_job('build_weather_apk')
+        workspace = h.workspace(job_id)
+        fail_flag.touch()
+        try:
+            await executor.execute_job(job_id, push_while_building(config, held).execute, pool='build')
+            raise AssertionError("build did not fail")
+        except Exception as e:
+            assert "gradle failed" in str(e), e
+        # Exactly the generated sources were pushed, none of the build's files
+        pushed = git('ls-tree', '-r', '--name-only', 'builds', cwd=bare).split()
+        assert pushed == ['lib/main.dart'], pushed
+        stored = json.loads((workspace / 'pipeline.json').read_text())
+        assert stored['build']['status'] == STEP_FAILED and stored['push']['status'] == STEP_DONE, stored
+        # The push did not wait for the build
+        assert stored['push']['finished_at'] < stored['build']['finished_at'], stored
+        assert "Step push started" in (workspace / 'logs.txt').read_text()
+        
+        # Re-queued: resumes at the build step
+        fail_flag.unlink()
+        await job_store.update_job(job_id, status=JobStatus.PENDING)
+        result = await executor.execute_job(job_id, BuildWeatherApkTask(config).execute, pool='build')
+        assert result['success'] and result['github_pushed'], result
+        assert result['job_metadata']['artifact_cache'] == 'miss', result
+        assert calls.read_text().split().count('create') == 1, calls.read_text()
+        assert len(git('log', '--oneline', 'builds', cwd=bare).splitlines()) == 1
+        report = (workspace / 'report.md').read_text()
+        assert "Create Flutter project: done (previous run)" in report, report
+        assert "Build Android APK: done in" in report, report
+        # The first attempt's pub get filled the shared cache
+        assert "Pub: 1 packages from cache, 0 downloaded" in report, report
+        
+        # Same inputs, through the dispatcher: served from the artifact cache
+        # The stand-in has no version file, so --version runs for the key
+        builds = [call for call in calls.read_text().split() if call != '--version']
+        dispatcher = JobDispatcher(job_store, {**config, 'queue': {'poll_interval': 0.2}}, TASKS)
+        await dispatcher.start()
+        try:
+            second = await dispatcher.submit('build_weather_apk')
+            start = time.monotonic()
+            result = await dispatcher.wait(second)
+            elapsed = time.monotonic() - start
+        finally:
+            await dispatcher.stop()
+        assert result['success'] and elapsed < 1.5, (result, elapsed)
+        assert [call for call in calls.read_text().split() if call != '--version'] == builds, calls.read_text()
+        apk = Path(result['apk_path'])
+        assert apk.is_relative_to(workspace.parent / second) and apk.read_text() == "apk\n", apk
+        metadata = json.loads((await job_store.get_job(second))['metadata'])
+        assert metadata['result']['artifact_cache'] == 'hit' and metadata['result']['built_by'] == job_id, metadata
+        assert "APK from artifact cache" in (workspace.parent / second / 'report.md').read_text()
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    # Step progress goes to the job log
+    logging.getLogger('src.tasks.pipeline').setLevel(logging.INFO)
+    checks = [
+        ('independent steps run in parallel', check_parallel_steps),
+        ('failure skips dependents, rerun resumes', check_failure),
+        ('cancel stops running steps', check_cancel),
+        ('invalid step graphs rejected', check_invalid_graphs),
+        ('weather build pushes its sources in parallel, resumes, hits the artifact cache', check_weather_build),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
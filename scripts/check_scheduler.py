@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Scheduler checks
+
+Parses cron expressions and [[schedules]] entries, then runs JobScheduler
+on the real JobDispatcher (stand-in tasks that count their runs) and
+checks that runs come at their interval with jitter, that a run is
+skipped while the previous one is still going, that next run times
+survive a restart, and that two schedulers never queue the same run:
+
+    python3 scripts/check_scheduler.py
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import JobHarness, make_config, run_checks
+from src.jobs.scheduler import CronExpression, JobScheduler, load_schedules, parse_duration
+from src.tasks.registry import TaskSpec
+from src.utils.timestamps import to_db_timestamp
+
+# Runs per target and the most runs of one target at once
+RUNS: Counter = Counter()
+RUNNING: Counter = Counter()
+MAX_RUNNING: Counter = Counter()
+RUNS_LOCK = threading.Lock()
+
+
+class CountingTask:
+    """Stand-in task: counts its run and how many run at once, sleeps"""
+    
+    def __init__(self, target: str, seconds: float):
+        self.target = target
+        self.seconds = seconds
+    
+    def execute(self, job_id, workspace_dir, logs_path, report_path):
+        with RUNS_LOCK:
+            RUNS[self.target] += 1
+            RUNNING[self.target] += 1
+            MAX_RUNNING[self.target] = max(MAX_RUNNING[self.target], RUNNING[self.target])
+        time.sleep(self.seconds)
+        with RUNS_LOCK:
+            RUNNING[self.target] -= 1
+        return {}
+
+
+TASKS = {
+    'status': TaskSpec(
+        lambda c, p: CountingTask(p.get('host'), p.get('seconds', 0.1)),
+        pool='status',
+    ),
+}
+
+
+class Harness(JobHarness):
+    def __init__(self, tmp_dir: str, name: str, schedules: list):
+        config = make_config(
+            tmp_dir,
+            name,
+            queue={'poll_interval': 0.2},
+            workers={'status': 4},
+            scheduler={'poll_interval': 0.5},
+            schedules=schedules,
+        )
+        super().__init__(config, TASKS)
+    
+    def scheduler(self, schedules=None) -> JobScheduler:
+        if schedules is not None:
+            self.config['schedules'] = schedules
+        return JobScheduler(self.dispatcher, self.config)
+    
+    async def run_scheduler(self, seconds: float, schedules=None):
+        task = asyncio.create_task(self.scheduler(schedules).run_forever())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    
+    async def set_next_run(self, name: str, when: datetime):
+        """Move a schedule's next run, as if time had passed"""
+        rows = await self.job_store.list_schedules()
+        await self.job_store.save_schedule(
+            {'name': name, 'next_run_at': to_db_timestamp(when)},
+            rows[name]['next_run_at'],
+        )
+
+
+def schedule(name: str, seconds: float = 0.1, **timing) -> dict:
+    return {
+        'name': name,
+        'command': f"status {name}",
+        'params': {'host': name, 'seconds': seconds},
+        **timing,
+    }
+
+
+async def check_cron_and_config(tmp_dir: str):
+    after = datetime(2026, 10, 17, 10, 7, 30)  # a Saturday
+    cases = [
+        ('*/15 * * * *', datetime(2026, 10, 17, 10, 15)),
+        ('0 3 * * *', datetime(2026, 10, 18, 3, 0)),
+        ('30 9 * * 1-5', datetime(2026, 10, 19, 9, 30)),
+        ('0 0 1 * *', datetime(2026, 11, 1, 0, 0)),
+        ('0 0 29 2 *', datetime(2028, 2, 29, 0, 0)),
+        ('5 4 * * 7', datetime(2026, 10, 18, 4, 5)),
+        ('0 12 13 * 5', datetime(2026, 10, 23, 12, 0)),
+        ('0,30 8-10/2 * * *', datetime(2026, 10, 17, 10, 30)),
+        ('@weekly', datetime(2026, 10, 18, 0, 0)),
+    ]
+    for expression, expected in cases:
+        got = CronExpression(expression).next_after(after)
+        assert got == expected, (expression, got, expected)
+    
+    for expression in ('* * * *', '60 * * * *', '* * 0 * *', '5-1 * * * *', 'x * * * *', '0 0 30 2 *'):
+        try:
+            CronExpression(expression).next_after(after)
+            raise AssertionError(f"accepted {expression}")
+        except ValueError:
+            pass
+    
+    assert parse_duration('90s') == 90 and parse_duration('15m') == 900 and parse_duration(2) == 2
+    (loaded,) = load_schedules({'schedules': [schedule('j', every='1h', jitter='1m')]}, TASKS)
+    for _ in range(200):
+        delay = (loaded.next_run(after) - after).total_seconds()
+        assert 3600 <= delay <= 3660, delay
+    
+    for bad in (
+        [schedule('a', every='1h'), schedule('a', every='2h')],
+        [{**schedule('b', every='1h'), 'command': 'build_everything'}],
+        [schedule('c', every='1h', cron='* * * * *')],
+        [schedule('d')],
+    ):
+        try:
+            load_schedules({'schedules': bad}, TASKS)
+            raise AssertionError(f"accepted {bad}")
+        except ValueError:
+            pass
+
+
+async def check_runs_with_jitter(tmp_dir: str):
+    async with Harness(tmp_dir, 'interval', [schedule('interval', every='1s', jitter=0.5)]) as h:
+        await h.run_scheduler(5)
+        # First run 1-1.5 s after start, then every 1-1.5 s
+        assert 3 <= RUNS['interval'] <= 4, RUNS
+        jobs = await h.job_store.list_jobs(limit=20)
+        assert all('"schedule": "interval"' in job['metadata'] for job in jobs), jobs
+
+
+async def check_overlap_is_skipped(tmp_dir: str):
+    async with Harness(tmp_dir, 'overlap', [schedule('overlap', seconds=2.5, every='1s')]) as h:
+        await h.run_scheduler(7)
+        assert MAX_RUNNING['overlap'] == 1, MAX_RUNNING
+        # Due about 6 times, each run blocks the next two
+        assert 2 <= RUNS['overlap'] <= 3, RUNS
+
+
+async def check_restart(tmp_dir: str):
+    entries = [schedule('restart', every='1h')]
+    async with Harness(tmp_dir, 'restart', entries) as h:
+        await h.scheduler().run_due()
+        first = (await h.job_store.list_schedules())['restart']
+        
+        # A restarted scheduler keeps the stored next run
+        await h.scheduler().run_due()
+        assert (await h.job_store.list_schedules())['restart'] == first
+        assert RUNS['restart'] == 0, RUNS
+        
+        # Runs missed while the bot was down are made up once
+        await h.set_next_run('restart', datetime.now() - timedelta(hours=5))
+        for _ in range(3):
+            await h.scheduler().run_due()
+        await asyncio.sleep(1)
+        assert RUNS['restart'] == 1, RUNS
+        after_run = (await h.job_store.list_schedules())['restart']
+        assert after_run['last_job_id'] and after_run['next_run_at'] > first['next_run_at'], after_run
+        
+        # A changed definition restarts the timing
+        await h.scheduler([schedule('restart', every='30m')]).run_due()
+        changed = (await h.job_store.list_schedules())['restart']
+        assert changed['definition'] != first['definition'], changed
+        assert changed['next_run_at'] < after_run['next_run_at'], changed
+
+
+async def check_two_schedulers(tmp_dir: str):
+    entries = [schedule('pair', every='1h')]
+    async with Harness(tmp_dir, 'pair', entries) as h:
+        schedulers = [h.scheduler(), h.scheduler()]
+        await schedulers[0].run_due()
+        for _ in range(5):
+            await h.set_next_run('pair', datetime.now() - timedelta(minutes=1))
+            await asyncio.gather(*(s.run_due() for s in schedulers for _ in range(3)))
+            # Let the run finish, or the next one is skipped as overlapping
+            await asyncio.sleep(0.6)
+        assert RUNS['pair'] == 5, RUNS
+
+
+def main():
+    checks = [
+        ('cron expressions and config', check_cron_and_config),
+        ('interval runs with jitter', check_runs_with_jitter),
+        ('overlapping run skipped', check_overlap_is_skipped),
+        ('next run survives restart', check_restart),
+        ('two schedulers queue a run once', check_two_schedulers),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Streaming shell checks
+
+Checks that ShellRunner.stream() and stream_process() hand over output
+lines while the command still runs, that only a tail is kept with Python
+memory staying flat (run_process() for comparison), that the stdout and
+stderr callbacks are never called at the same time, that failures report
+a bounded tail of stderr, that timeouts and cancellation still kill the
+command, and that lines printed by a callback end up in the job log:
+
+    python3 scripts/check_shell_stream.py
+"""
+
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from checklib import JobHarness, make_config, run_checks
+from src.utils.cancel import CancelToken, JobCancelled, cancel_scope
+from src.utils.shell import DEFAULT_TAIL_LINES, ShellRunner, run_process, stream_process
+
+MB = 1024 * 1024
+# 100-byte lines: 99 characters and the newline
+NOISY = "import sys\nfor i in range({lines}):\n    sys.stdout.write(f'{{i:09d}}' + 'x' * 90 + '\\n')"
+FAILING = "import sys\nfor i in range(5000): print('error', i, file=sys.stderr)\nsys.exit(3)"
+BOTH = "import sys\nfor i in range(20000): print('out', i); print('err', i, file=sys.stderr)"
+
+
+def noisy(lines: int):
+    return [sys.executable, '-c', NOISY.format(lines=lines)]
+
+
+async def check_lines_arrive_live(tmp_dir: str):
+    start = time.monotonic()
+    seen = []
+    result = stream_process(
+        ['sh', '-c', 'echo one; sleep 1; echo two >&2; sleep 0.3; echo three'],
+        on_stdout=lambda line: seen.append(('out', line, time.monotonic() - start)),
+        on_stderr=lambda line: seen.append(('err', line, time.monotonic() - start)),
+    )
+    with result.stdout, result.stderr:
+        assert result.returncode == 0
+        order = [(stream, line) for stream, line, _ in seen]
+        assert order == [('out', 'one'), ('err', 'two'), ('out', 'three')], seen
+        # 'one' came before the sleep was over
+        assert seen[0][2] < 0.6, seen
+        assert result.stdout.tail() == "one\nthree\n" and result.stderr.tail() == "two\n"
+
+
+async def check_memory_stays_flat(tmp_dir: str):
+    lines = 200_000  # 20 MB
+    tracemalloc.start()
+    result = stream_process(noisy(lines))
+    _, stream_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with result.stdout, result.stderr:
+        assert result.returncode == 0
+        assert result.stdout.size == lines * 100 and result.stdout.lines == lines
+        assert result.stdout.tail(1) == f"{lines - 1:09d}" + 'x' * 90 + '\n'
+        assert len(result.stdout.tail().splitlines()) == DEFAULT_TAIL_LINES
+    
+    tracemalloc.start()
+    run_process(noisy(lines))
+    _, run_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"        peak Python memory for 20 MB of output: run_process {run_peak / MB:.1f} MB, "
+          f"stream_process {stream_peak / MB:.1f} MB")
+    assert stream_peak < 2 * MB and run_peak > 10 * MB, (stream_peak, run_peak)
+
+
+async def check_callbacks_serialized(tmp_dir: str):
+    active = []
+    overlaps = []
+    seen = []
+    
+    def on_line(line: str):
+        # Not a lock: two readers inside at once would both be in active
+        active.append(line)
+        if len(active) > 1:
+            overlaps.append(list(active))
+        seen.append(line)
+        time.sleep(0)
+        active.remove(line)
+    
+    result = stream_process([sys.executable, '-c', BOTH], on_stdout=on_line, on_stderr=on_line)
+    result.close()
+    assert result.returncode == 0 and len(seen) == 40000, len(seen)
+    assert not overlaps, f"callbacks ran at the same time: {overlaps[:3]}"
+
+
+async def check_failure_tail(tmp_dir: str):
+    shell = ShellRunner()
+    lines = []
+    success, output = shell.stream_safe(f'{sys.executable} -c "{FAILING}"', lines.append)
+    assert not success and len(lines) == 5000, len(lines)
+    tail = output.splitlines()
+    assert len(tail) == DEFAULT_TAIL_LINES and tail[-1] == "error 4999", tail[-3:]
+    
+    # Errors on stdout only
+    success, output = shell.stream_safe("sh -c 'echo gradle failed; exit 1'")
+    assert not success and output == "gradle failed\n", output
+    success, output = shell.stream_safe("sh -c 'echo built'")
+    assert success and output == "built\n", output
+    
+    # A failing callback does not stop the command or the other lines
+    def flaky(line: str):
+        if line == '2':
+            raise RuntimeError("callback broke")
+        lines.append(line)
+    lines.clear()
+    assert shell.stream_safe("sh -c 'echo 1; echo 2; echo 3'", flaky)[0]
+    assert lines == ['1', '3'], lines
+
+
+async def check_timeout_and_cancel(tmp_dir: str):
+    shell = ShellRunner()
+    start = time.monotonic()
+    returncode, _, stderr = shell.stream("sh -c 'echo started; sleep 30'", timeout=1)
+    assert returncode == -1 and "timed out" in stderr and time.monotonic() - start < 3, (returncode, stderr)
+    
+    token = CancelToken()
+    threading.Timer(0.5, token.cancel).start()
+    start = time.monotonic()
+    try:
+        with cancel_scope(token):
+            stream_process(['sh', '-c', 'sleep 30 & sleep 30; wait'])
+        raise AssertionError("command was not cancelled")
+    except JobCancelled:
+        pass
+    assert time.monotonic() - start < 2, "cancel did not stop the command"
+
+
+async def check_job_log(tmp_dir: str):
+    def task(job_id, workspace_dir, logs_path, report_path):
+        success, output = ShellRunner().stream_safe("sh -c 'echo progress 50%; echo progress 100%'", print)
+        return {'success': success}
+    
+    async with JobHarness(make_config(tmp_dir, 'jobs')) as h:
+        job_id = await h.job_store.create_job('stream')
+        assert (await h.executor.execute_job(job_id, task))['success']
+        log = (h.workspace(job_id) / 'logs.txt').read_text()
+        assert "progress 50%" in log and "progress 100%" in log, log
+
+
+def main():
+    # The expected callback failure and timeout are logged
+    logging.basicConfig(level=logging.CRITICAL)
+    checks = [
+        ('lines arrive while the command runs', check_lines_arrive_live),
+        ('only a tail is kept, memory stays flat', check_memory_stays_flat),
+        ('stdout and stderr callbacks never overlap', check_callbacks_serialized),
+        ('failures report a bounded tail', check_failure_tail),
+        ('timeout and cancel kill the command', check_timeout_and_cancel),
+        ('callback output goes to the job log', check_job_log),
+    ]
+    run_checks(checks)
+
+
+if __name__ == "__main__":
+    main()
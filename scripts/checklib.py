@@ -0,0 +1,95 @@
+"""
+Shared setup of the check scripts
+
+make_config() gives a check its own job database and workspaces in the
+temporary directory, JobHarness runs the job store with an executor or a
+dispatcher on such a config, and run_checks() runs the checks of a script
+and prints ok/FAIL for each. The scripts put the project root on sys.path
+before importing this module.
+"""
+
+import asyncio
+import inspect
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.dispatcher import JobDispatcher
+from src.jobs.job_executor import JobExecutor
+from src.jobs.job_manager import JobManager
+
+
+def make_config(tmp_dir: str, name: str, **sections) -> dict:
+    """Config with the job database and workspaces of ``name`` in tmp_dir, plus sections"""
+    return {
+        'database': {'sqlite_path': str(Path(tmp_dir) / f'{name}.db')},
+        'paths': {'workspaces_dir': str(Path(tmp_dir) / f'{name}-workspaces')},
+        **sections,
+    }
+
+
+class JobHarness:
+    """
+    Job manager, async job store and executor on a config
+    
+    With ``tasks`` a started JobDispatcher runs them instead, and
+    ``executor`` is the dispatcher's. Used as ``async with``; everything is
+    shut down in reverse order on exit.
+    """
+    
+    def __init__(self, config: dict, tasks: Optional[Dict[str, Any]] = None):
+        self.config = config
+        self.tasks = tasks
+        self.dispatcher: Optional[JobDispatcher] = None
+    
+    async def __aenter__(self):
+        self.manager = JobManager(self.config)
+        self.job_store = AsyncJobStore(self.manager)
+        if self.tasks is None:
+            self.executor = JobExecutor(self.job_store, self.config)
+            return self
+        
+        self.dispatcher = JobDispatcher(self.job_store, self.config, self.tasks)
+        self.executor = self.dispatcher.executor
+        self.before_start()
+        await self.dispatcher.start()
+        return self
+    
+    async def __aexit__(self, *exc):
+        if self.dispatcher:
+            await self.dispatcher.stop()
+        else:
+            self.executor.shutdown()
+        self.job_store.shutdown()
+        self.manager.shutdown()
+    
+    def before_start(self):
+        """Called before the dispatcher starts, e.g. to add listeners"""
+    
+    def workspace(self, job_id: str) -> Path:
+        return Path(self.config['paths']['workspaces_dir']) / job_id
+
+
+def run_checks(checks: List[Tuple[str, Callable]]):
+    """
+    Run (name, check) pairs with one temporary directory and exit
+    
+    A check takes the directory and may be a coroutine function. The exit
+    code is 1 if any check failed.
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, check in checks:
+            try:
+                result = check(tmp_dir)
+                if inspect.iscoroutine(result):
+                    asyncio.run(result)
+                print(f"  ok    {name}")
+            except Exception:
+                failures += 1
+                print(f"  FAIL  {name}\n{traceback.format_exc()}")
+    print(f"{failures} failure(s)")
+    sys.exit(1 if failures else 0)
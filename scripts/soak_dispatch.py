@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Command dispatch soak test
+
+Sends many simultaneous /status commands through the real handler,
+JobDispatcher and ResultDelivery against a throwaway SQLite database,
+with a fake bot instead of Telegram and sleeping stand-in tasks (some of
+which fail). Checks that every handler replied with a job ID without
+waiting for the job, and that every job's result or error reached its
+chat exactly once:
+
+    python3 scripts/soak_dispatch.py
+    python3 scripts/soak_dispatch.py --commands 1000 --task-ms 50 --workers 8
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.dispatcher import JobDispatcher
+from src.jobs.job_manager import JobManager
+from src.tasks.registry import TaskSpec
+from src.telegram.delivery import ResultDelivery
+from src.telegram.handlers import handle_status
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[max(1, math.ceil(len(sorted_values) * pct / 100)) - 1]
+
+
+class SleepTask:
+    """Stand-in task that takes a fixed time and writes a report"""
+    
+    def __init__(self, seconds: float, fail: bool):
+        self.seconds = seconds
+        self.fail = fail
+    
+    def execute(self, job_id, workspace_dir, logs_path, report_path):
+        time.sleep(self.seconds)
+        if self.fail:
+            raise RuntimeError("simulated failure")
+        Path(report_path).write_text(f"# {job_id}\n")
+        return {}
+
+
+class FakeBot:
+    """Records what would be sent to each chat"""
+    
+    def __init__(self):
+        self.sent = defaultdict(list)
+    
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent[chat_id].append(('message', text, time.perf_counter()))
+    
+    async def send_document(self, chat_id, document, filename=None, caption=None, **kwargs):
+        document.read()
+        self.sent[chat_id].append(('document', filename, time.perf_counter()))
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+    
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+async def run_soak(args, tmp_dir: str):
+    config = {
+        'database': {'sqlite_path': str(Path(tmp_dir) / 'jobs.db')},
+        'paths': {'workspaces_dir': str(Path(tmp_dir) / 'workspaces')},
+        'queue': {'poll_interval': 0.5},
+        'workers': {'status': args.workers},
+    }
+    tasks = {
+        'status': TaskSpec(
+            lambda c, p: SleepTask(args.task_ms / 1000, p.get('host') == 'fail'),
+            pool='status',
+        ),
+    }
+    
+    manager = JobManager(config)
+    job_store = AsyncJobStore(manager)
+    dispatcher = JobDispatcher(job_store, config, tasks)
+    bot = FakeBot()
+    dispatcher.add_listener(ResultDelivery(bot, dispatcher).deliver)
+    await dispatcher.start()
+    
+    async def command(chat_id: int):
+        # Every failure_every-th command fails in the task
+        fail = args.failure_every and chat_id % args.failure_every == 0
+        message = FakeMessage()
+        update = SimpleNamespace(message=message, effective_chat=SimpleNamespace(id=chat_id))
+        context = SimpleNamespace(args=['fail'] if fail else [])
+        start = time.perf_counter()
+        await handle_status(update, context, dispatcher)
+        return chat_id, start, time.perf_counter(), message.replies, fail
+    
+    start = time.perf_counter()
+    # As with concurrent_updates, all commands are handled at once
+    commands = await asyncio.gather(*(command(chat_id) for chat_id in range(1, args.commands + 1)))
+    
+    deadline = time.perf_counter() + args.timeout
+    while sum(map(len, bot.sent.values())) < args.commands and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    # Late duplicates would show up here
+    await asyncio.sleep(1)
+    
+    await dispatcher.stop()
+    job_store.shutdown()
+    manager.shutdown()
+    
+    problems = []
+    reply_ms = []
+    delivery_ms = []
+    for chat_id, sent_at, returned_at, replies, fail in commands:
+        reply_ms.append((returned_at - sent_at) * 1000)
+        if len(replies) != 1 or "Job:" not in replies[0]:
+            problems.append(f"chat {chat_id}: unexpected replies {replies}")
+        sent = bot.sent.get(chat_id, [])
+        if len(sent) != 1:
+            problems.append(f"chat {chat_id}: {len(sent)} deliveries")
+            continue
+        kind, content, delivered_at = sent[0]
+        expected = ('message', "❌") if fail else ('document', "status_report.md")
+        if kind != expected[0] or not content.startswith(expected[1]):
+            problems.append(f"chat {chat_id}: unexpected delivery {kind} {content}")
+        delivery_ms.append((delivered_at - sent_at) * 1000)
+    return elapsed, sorted(reply_ms), sorted(delivery_ms), problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test fire-and-forget command dispatch")
+    parser.add_argument('--commands', type=int, default=500, help="Simultaneous commands")
+    parser.add_argument('--task-ms', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--failure-every', type=int, default=10, help="Every n-th command fails, 0 for none")
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+    
+    # The simulated failures are logged as errors
+    logging.basicConfig(level=logging.CRITICAL)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        elapsed, reply_ms, delivery_ms, problems = asyncio.run(run_soak(args, tmp_dir))
+    
+    print(f"{args.commands} commands, {args.workers} workers, all delivered in {elapsed:.2f}s")
+    for label, values in (('reply', reply_ms), ('deliver', delivery_ms)):
+        if values:
+            print(
+                f"{label:<8} p50 {_percentile(values, 50):8.1f}ms "
+                f"p99 {_percentile(values, 99):8.1f}ms max {values[-1]:8.1f}ms"
+            )
+    for problem in problems[:20]:
+        print(f"FAIL {problem}")
+    if problems:
+        print(f"{len(problems)} problems")
+        sys.exit(1)
+    print("OK: every command answered at once and delivered exactly once")
+
+
+if __name__ == "__main__":
+    main()
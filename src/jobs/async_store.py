@@ -0,0 +1,143 @@
+"""Awaitable job store API for async code"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.jobs.job_manager import JobManager, JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncJobStore:
+    """
+    Non-blocking facade over JobManager
+    
+    Every call runs on a small dedicated pool of database threads, so disk
+    I/O, fsyncs and lock waits never block the event loop. The threads are
+    long-lived, which keeps their pooled connections warm.
+    """
+    
+    def __init__(self, job_manager: JobManager, max_workers: int = 4):
+        self.manager = job_manager
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="jobstore",
+        )
+    
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking JobManager call on a database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+    
+    async def create_job(self, command: str, metadata: Optional[Dict[str, Any]] = None, priority: int = 0) -> str:
+        """Create a new job and return job ID"""
+        return await self._run(self.manager.create_job, command, metadata, priority)
+    
+    async def update_job(
+        self,
+        job_id: str,
+        status: Optional[JobStatus] = None,
+        logs_path: Optional[str] = None,
+        report_path: Optional[str] = None,
+        error_message: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        """Update job status and information"""
+        await self._run(
+            self.manager.update_job,
+            job_id,
+            status=status,
+            logs_path=logs_path,
+            report_path=report_path,
+            error_message=error_message,
+            metadata=metadata,
+        )
+    
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get job by ID"""
+        return await self._run(self.manager.get_job, job_id)
+    
+    async def resolve_job(self, job_ref: str) -> Optional[Dict[str, Any]]:
+        """Get a job by its full ID or by a unique ID prefix"""
+        return await self._run(self.manager.resolve_job, job_ref)
+    
+    async def list_jobs(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """List recent jobs"""
+        return await self._run(self.manager.list_jobs, limit)
+    
+    async def list_jobs_page(
+        self,
+        limit: int = 10,
+        status: Optional[JobStatus] = None,
+        command_prefix: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List one page of jobs, returns (jobs, next_cursor)"""
+        return await self._run(
+            self.manager.list_jobs_page,
+            limit=limit,
+            status=status,
+            command_prefix=command_prefix,
+            since=since,
+            until=until,
+            cursor=cursor,
+        )
+    
+    async def claim_job(
+        self,
+        owner: str,
+        lease_seconds: float,
+        max_wait: Optional[float] = None,
+        command_types: Optional[List[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Lease the next pending job to a worker and mark it running"""
+        return await self._run(self.manager.claim_job, owner, lease_seconds, max_wait, command_types)
+    
+    async def count_pending(self) -> Dict[str, int]:
+        """Number of queued jobs per command type"""
+        return await self._run(self.manager.count_pending)
+    
+    async def renew_leases(self, owner: str, job_ids: List[str], lease_seconds: float) -> int:
+        """Extend the leases of jobs a worker is still running"""
+        return await self._run(self.manager.renew_leases, owner, job_ids, lease_seconds)
+    
+    async def recover_expired_leases(self, max_attempts: int = 2, retryable=None) -> Tuple[int, int]:
+        """Re-queue or fail running jobs whose lease expired"""
+        return await self._run(self.manager.recover_expired_leases, max_attempts, retryable)
+    
+    async def latency_stats(self, since: datetime) -> Dict[str, Dict[str, Any]]:
+        """Queue and run latency percentiles per command type since a time"""
+        return await self._run(self.manager.latency_stats, since)
+    
+    async def cancel_job(self, job_id: str) -> bool:
+        """Cancel a job (best effort)"""
+        return await self._run(self.manager.cancel_job, job_id)
+    
+    async def list_schedules(self) -> Dict[str, Dict[str, Any]]:
+        """Stored state of the recurring schedules by name"""
+        return await self._run(self.manager.list_schedules)
+    
+    async def save_schedule(self, schedule: Dict[str, Any], expected_next_run: Optional[str] = None) -> bool:
+        """Insert a schedule, or advance it if its next run is still expected_next_run"""
+        return await self._run(self.manager.save_schedule, schedule, expected_next_run)
+    
+    async def flush(self):
+        """Commit queued updates"""
+        await self._run(self.manager.flush)
+    
+    async def cleanup_old_jobs(self, days: int = 30, batch_size: int = 500) -> int:
+        """Delete jobs older than days in chunks, returns the number deleted"""
+        return await self._run(self.manager.cleanup_old_jobs, days, batch_size)
+    
+    def shutdown(self):
+        """Wait for pending calls and stop the database threads"""
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,419 @@
+"""Durable job queue workers"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.job_executor import JobExecutor
+from src.jobs.job_manager import RESULT_METADATA_KEY, TERMINAL_STATUSES, JobStatus
+from src.utils.cancel import JobCancelled
+
+logger = logging.getLogger(__name__)
+
+# Called with (job_id, result, error, requests) when a job run by this
+# process ends; requests is None for everyone who asked for the job (see
+# request()), or the requests that reuse the result of a finished job
+JobListener = Callable[
+    [str, Optional[Dict[str, Any]], Optional[BaseException], Optional[List[Dict[str, Any]]]],
+    Awaitable[None],
+]
+
+# How request() answered
+SHARED_IN_FLIGHT = 'in_flight'
+SHARED_CACHED = 'cached'
+
+
+class Submission(NamedTuple):
+    """Job that answers a request, and whether it was shared"""
+    job_id: str
+    # None for a new job, SHARED_IN_FLIGHT or SHARED_CACHED
+    shared: Optional[str] = None
+    # Seconds since a reused job finished
+    age: float = 0.0
+
+
+class JobDispatcher:
+    """
+    Runs queued jobs from the job store
+    
+    Handlers submit jobs and return at once; listeners (result delivery)
+    are told when a job ends. The jobs table is the queue: workers claim
+    the highest-priority pending job under a lease, renew the lease while
+    the job runs, and any instance takes back jobs whose lease expired
+    (the bot was killed or crashed) - retryable ones are re-queued, the
+    rest are marked failed. Nothing is lost on a restart, and several bot
+    instances sharing MariaDB share the queue.
+    
+    Every task class (``TaskSpec.pool``) gets as many workers as its
+    thread pool has threads, and they only claim jobs of that class, so
+    jobs beyond a class's limit wait in the queue instead of taking
+    threads from other classes.
+    
+    request() lets identical requests (same ``TaskSpec.share_key``) share
+    work: they join the job that is queued or running in this process,
+    and get the report of one that finished here less than its reuse TTL
+    ago.
+    """
+    
+    def __init__(self, job_store: AsyncJobStore, config: dict, tasks: Dict[str, Any]):
+        self.job_store = job_store
+        self.config = config
+        self.tasks = tasks
+        self.executor = JobExecutor(job_store, config)
+        
+        queue_config = config.get('queue', {})
+        self.lease_seconds = queue_config.get('lease_seconds', 60)
+        self.max_wait = queue_config.get('max_wait_seconds', 600)
+        self.max_attempts = queue_config.get('max_attempts', 2)
+        self.poll_interval = queue_config.get('poll_interval', 5.0)
+        self.reuse_ttls = config.get('reuse_ttl', {})
+        
+        # Unique per process, so a restarted bot never renews old leases
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._active: Set[str] = set()
+        self._busy: Dict[str, int] = {}
+        self._loops: List[asyncio.Task] = []
+        self._listeners: List[JobListener] = []
+        self._notifications: Set[asyncio.Task] = set()
+        # Share key -> queued or running job, and -> (job, result, finished)
+        self._in_flight: Dict[Tuple[str, str], str] = {}
+        self._finished: Dict[Tuple[str, str], Tuple[str, Dict[str, Any], float]] = {}
+        self._share_lock = asyncio.Lock()
+        self._stopping = False
+    
+    def add_listener(self, listener: JobListener):
+        """Call listener(job_id, result, error, requests) whenever a job run here ends"""
+        self._listeners.append(listener)
+    
+    def reuse_ttl(self, command_type: str) -> float:
+        """Seconds the report of a finished job of this type is reused"""
+        spec = self.tasks.get(command_type)
+        if spec is None or spec.share_key is None:
+            return 0
+        return self.reuse_ttls.get(command_type, spec.reuse_ttl)
+    
+    def _share_key(self, command_type: str, params: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        spec = self.tasks.get(command_type)
+        if spec is None or spec.share_key is None:
+            return None
+        return command_type, json.dumps(spec.share_key(params), sort_keys=True)
+    
+    def _pool_command_types(self) -> Dict[str, List[str]]:
+        """Command types run by each worker pool"""
+        pools: Dict[str, List[str]] = {}
+        for command_name, spec in self.tasks.items():
+            pools.setdefault(spec.pool, []).append(command_name)
+        return pools
+    
+    async def start(self):
+        """Recover interrupted jobs and start the workers"""
+        pools = self._pool_command_types()
+        self._wakeups = {pool: asyncio.Event() for pool in pools}
+        self._stopping = False
+        await self._recover()
+        
+        sizes = []
+        for pool, command_types in pools.items():
+            size = self.executor.pool_sizes.get(pool, self.executor.pool_sizes['default'])
+            self._busy[pool] = 0
+            self._loops.extend(
+                asyncio.create_task(self._worker(pool, command_types)) for _ in range(size)
+            )
+            sizes.append(f"{pool}={size}")
+        self._loops.append(asyncio.create_task(self._maintain()))
+        logger.info(f"Job dispatcher {self.owner} started, workers: {', '.join(sizes)}")
+    
+    async def stop(self):
+        """Stop the workers; jobs still running are recovered on the next start"""
+        # asyncio.wait_for() of Python 3.11 can swallow the cancellation when
+        # a wakeup arrives at the same time, so the loops also check the flag
+        self._stopping = True
+        for loop_task in self._loops:
+            loop_task.cancel()
+        await asyncio.gather(*self._loops, return_exceptions=True)
+        self._loops = []
+        if self._notifications:
+            # Give result deliveries in flight a chance to finish
+            await asyncio.wait(self._notifications, timeout=10)
+        self.executor.shutdown()
+    
+    async def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Size, busy workers and queued jobs of every worker pool"""
+        pending = await self.job_store.count_pending()
+        stats = {}
+        for pool, command_types in self._pool_command_types().items():
+            stats[pool] = {
+                'size': self.executor.pool_sizes.get(pool, self.executor.pool_sizes['default']),
+                'busy': self._busy.get(pool, 0),
+                'queued': sum(pending.get(command_name, 0) for command_name in command_types),
+            }
+        return stats
+    
+    async def submit(
+        self,
+        command: str,
+        params: Optional[Dict[str, Any]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Queue a job and return its ID
+        
+        ``params`` are what the task factory of the command type needs to
+        build the task; they are stored in the job metadata.
+        """
+        command_name = command.split(' ', 1)[0]
+        spec = self.tasks.get(command_name)
+        if spec is None:
+            raise ValueError(f"Unknown task: {command_name}")
+        
+        job_id = await self.job_store.create_job(
+            command,
+            {**(metadata or {}), 'params': params or {}},
+            priority=spec.priority,
+        )
+        self._wakeups[spec.pool].set()
+        return job_id
+    
+    async def request(
+        self,
+        command: str,
+        params: Optional[Dict[str, Any]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        force: bool = False,
+    ) -> Submission:
+        """
+        Queue a job for a request unless an identical one can answer it
+        
+        A request joins the queued or running job of an identical request
+        (it is added to the job's ``subscribers`` metadata, so listeners
+        deliver to it too), or, unless ``force`` is set, is answered at
+        once by listeners with the result of one that finished less than
+        ``reuse_ttl()`` seconds ago and still has its report.
+        """
+        command_name = command.split(' ', 1)[0]
+        key = self._share_key(command_name, params or {})
+        if key is None:
+            return Submission(await self.submit(command, params, metadata))
+        
+        request = {**(metadata or {}), 'params': params or {}}
+        async with self._share_lock:
+            finished = self._finished.get(key)
+            if finished and not force:
+                job_id, result, finished_at = finished
+                age = time.monotonic() - finished_at
+                job = await self.job_store.get_job(job_id)
+                # The report must still be there to be sent again
+                report_path = job and job.get('report_path')
+                if age <= self.reuse_ttl(command_name) and report_path and Path(report_path).exists():
+                    self._notify_listeners(job_id, result, None, [request])
+                    return Submission(job_id, SHARED_CACHED, age)
+            
+            job_id = self._in_flight.get(key)
+            if job_id:
+                job = await self.job_store.get_job(job_id)
+                if job and job['status'] not in TERMINAL_STATUSES:
+                    job_metadata = json.loads(job['metadata'] or '{}')
+                    job_metadata.setdefault('subscribers', []).append(request)
+                    await self.job_store.update_job(job_id, metadata=job_metadata)
+                    return Submission(job_id, SHARED_IN_FLIGHT)
+            
+            job_id = await self.submit(command, params, metadata)
+            self._in_flight[key] = job_id
+            return Submission(job_id)
+    
+    async def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job; False if it already ended
+        
+        A job running here is stopped at once. One running in another
+        instance is stopped by that instance's next lease maintenance.
+        """
+        if not await self.job_store.cancel_job(job_id):
+            return False
+        self.executor.cancel(job_id)
+        return True
+    
+    async def wait(self, job_id: str) -> Dict[str, Any]:
+        """
+        Wait for a job and return the task result
+        
+        Raises the task's exception if it failed, and RuntimeError if the
+        job was cancelled while queued or failed elsewhere. The result of a
+        job that already ended, or ran in another instance, is not kept, so
+        a completed one returns {}.
+        """
+        future = self._waiters.setdefault(job_id, asyncio.get_running_loop().create_future())
+        try:
+            while True:
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                
+                if job_id in self._active:
+                    continue
+                job = await self.job_store.get_job(job_id)
+                if future.done() or not job or job['status'] not in TERMINAL_STATUSES:
+                    continue
+                if job['status'] == JobStatus.COMPLETED.value:
+                    return {}
+                raise RuntimeError(job.get('error_message') or f"Job {job['status']}")
+        finally:
+            self._waiters.pop(job_id, None)
+    
+    async def _worker(self, pool: str, command_types: List[str]):
+        """Claim and run the jobs of one worker pool until cancelled"""
+        wakeup = self._wakeups[pool]
+        while not self._stopping:
+            # Cleared before claiming, so a submission during the claim is
+            # never missed
+            wakeup.clear()
+            try:
+                job = await self.job_store.claim_job(
+                    self.owner,
+                    self.lease_seconds,
+                    self.max_wait,
+                    command_types,
+                )
+            except Exception as e:
+                logger.error(f"Failed to claim a job: {e}")
+                job = None
+            
+            if job is None:
+                try:
+                    # Submissions of this process wake the workers; jobs of
+                    # other instances are picked up on the next poll
+                    await asyncio.wait_for(wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            # More jobs may be queued: let an idle worker of the pool look
+            wakeup.set()
+            self._busy[pool] += 1
+            try:
+                await self._run(job, pool)
+            finally:
+                self._busy[pool] -= 1
+    
+    async def _run(self, job: Dict[str, Any], pool: str):
+        """Run one claimed job and report how it ended"""
+        job_id = job['id']
+        self._active.add(job_id)
+        started = False
+        result = error = None
+        share_key = None
+        try:
+            spec = self.tasks.get(job['command_type'])
+            if spec is None:
+                raise ValueError(f"Unknown task: {job['command_type']}")
+            
+            params = json.loads(job['metadata'] or '{}').get('params', {})
+            share_key = self._share_key(job['command_type'], params)
+            task = spec.factory(self.config, params)
+            started = True
+            result = await self.executor.execute_job(job_id, task.execute, pool=pool)
+        except asyncio.CancelledError:
+            raise
+        except (Exception, JobCancelled) as e:
+            error = e
+            if not started:
+                # execute_job records its own failures
+                await self.job_store.update_job(job_id, status=JobStatus.FAILED, error_message=str(e))
+        finally:
+            self._active.discard(job_id)
+        
+        job_result = (result or {}).get(RESULT_METADATA_KEY) if error is None else None
+        if share_key is not None or job_result:
+            # Under the lock, so a request joins before delivery reads the
+            # subscribers or finds the finished result, and the result
+            # metadata does not overwrite a subscriber added meanwhile
+            async with self._share_lock:
+                if job_result:
+                    job_metadata = json.loads((await self.job_store.get_job(job_id) or {}).get('metadata') or '{}')
+                    job_metadata['result'] = job_result
+                    await self.job_store.update_job(job_id, metadata=job_metadata)
+                if share_key is not None:
+                    if self._in_flight.get(share_key) == job_id:
+                        del self._in_flight[share_key]
+                    if error is None and self.reuse_ttl(job['command_type']):
+                        self._remember_finished(share_key, job_id, result or {})
+        
+        future = self._waiters.get(job_id)
+        if future and not future.done():
+            if error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        
+        self._notify_listeners(job_id, result, error)
+    
+    def _remember_finished(self, share_key: Tuple[str, str], job_id: str, result: Dict[str, Any]):
+        now = time.monotonic()
+        for key, (_, _, finished_at) in list(self._finished.items()):
+            if now - finished_at > self.reuse_ttl(key[0]):
+                del self._finished[key]
+        self._finished[share_key] = (job_id, result, now)
+    
+    def _notify_listeners(
+        self,
+        job_id: str,
+        result: Optional[Dict[str, Any]],
+        error: Optional[BaseException],
+        requests: Optional[List[Dict[str, Any]]] = None,
+    ):
+        for listener in self._listeners:
+            # Own task each, so a slow upload never holds a worker
+            notification = asyncio.create_task(self._notify(listener, job_id, result, error, requests))
+            self._notifications.add(notification)
+            notification.add_done_callback(self._notifications.discard)
+    
+    @staticmethod
+    async def _notify(listener: JobListener, job_id: str, result, error, requests):
+        try:
+            await listener(job_id, result, error, requests)
+        except Exception as e:
+            logger.error(f"Job listener failed for {job_id}: {e}")
+    
+    async def _maintain(self):
+        """Renew the leases of running jobs, stop cancelled ones, recover expired ones"""
+        while not self._stopping:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if self._active:
+                    await self.job_store.renew_leases(self.owner, list(self._active), self.lease_seconds)
+                    await self._stop_cancelled()
+                await self._recover()
+            except Exception as e:
+                logger.error(f"Job lease maintenance failed: {e}")
+    
+    async def _stop_cancelled(self):
+        """Stop running jobs that were cancelled through another instance"""
+        for job_id in list(self._active):
+            job = await self.job_store.get_job(job_id)
+            if job and job['status'] == JobStatus.CANCELLED.value:
+                self.executor.cancel(job_id)
+    
+    async def _recover(self):
+        """Re-queue or fail jobs whose worker died"""
+        requeued, failed = await self.job_store.recover_expired_leases(
+            self.max_attempts,
+            self._retryable,
+        )
+        if requeued or failed:
+            logger.warning(f"Recovered interrupted jobs: {requeued} re-queued, {failed} failed")
+            for wakeup in self._wakeups.values():
+                wakeup.set()
+    
+    def _retryable(self, job: Dict[str, Any]) -> bool:
+        spec = self.tasks.get(job['command_type'])
+        return bool(spec and spec.retry_on_interrupt)
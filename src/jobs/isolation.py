@@ -0,0 +1,221 @@
+"""Process-isolated task execution with resource limits"""
+
+import errno
+import logging
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, TextIO
+
+from src.jobs.job_output import LOG_FORMAT
+from src.jobs.retention import tree_size
+from src.utils.cancel import CancelToken, cancel_scope
+from src.utils.shell import KILL_GRACE_SECONDS
+
+# How often the parent checks for cancellation while waiting (seconds)
+POLL_INTERVAL = 0.2
+# The child sends its output in chunks of about this size, or this often
+SEND_CHUNK_CHARS = 8192
+SEND_INTERVAL = 0.2
+# Seconds between the soft (SIGXCPU) and hard (SIGKILL) CPU limit
+CPU_KILL_MARGIN = 5
+
+
+class ResourceLimits(NamedTuple):
+    """Limits of an isolated job, 0 means unlimited"""
+    memory_bytes: int = 0
+    cpu_seconds: int = 0
+    file_size_bytes: int = 0
+    disk_bytes: int = 0
+    disk_check_interval: float = 5.0
+
+
+class _PipeWriter:
+    """sys.stdout/sys.stderr of the child, batching writes to the parent"""
+    
+    def __init__(self, conn):
+        self.conn = conn
+        self._buffer = []
+        self._size = 0
+        self._last_send = time.monotonic()
+    
+    def write(self, text: str) -> int:
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= SEND_CHUNK_CHARS or time.monotonic() - self._last_send >= SEND_INTERVAL:
+            self.flush()
+        return len(text)
+    
+    def flush(self):
+        if self._buffer:
+            self.conn.send(('output', ''.join(self._buffer)))
+            self._buffer = []
+            self._size = 0
+        self._last_send = time.monotonic()
+    
+    def isatty(self) -> bool:
+        return False
+
+
+class _PipeLogHandler(logging.Handler):
+    def __init__(self, writer: _PipeWriter):
+        super().__init__()
+        self.writer = writer
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.writer.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+
+def _apply_limits(limits: ResourceLimits):
+    # Own process group: killing it also kills flutter, gradle, ...
+    os.setsid()
+    # Writing past the file size limit raises OSError(EFBIG) instead of
+    # killing the process, so the task can report it
+    signal.signal(signal.SIGXFSZ, signal.SIG_IGN)
+    if limits.memory_bytes:
+        resource.setrlimit(resource.RLIMIT_AS, (limits.memory_bytes, limits.memory_bytes))
+    if limits.cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + CPU_KILL_MARGIN))
+    if limits.file_size_bytes:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (limits.file_size_bytes, limits.file_size_bytes))
+
+
+def _limit_error(error: BaseException, limits: ResourceLimits) -> BaseException:
+    """Readable failure for an exception caused by a resource limit"""
+    if isinstance(error, MemoryError):
+        return RuntimeError(f"Memory limit exceeded ({limits.memory_bytes} bytes)")
+    if isinstance(error, OSError) and error.errno == errno.EFBIG:
+        return RuntimeError(f"File size limit exceeded ({limits.file_size_bytes} bytes)")
+    return error
+
+
+def _child_main(conn, task_func: Callable, args: tuple, kwargs: Dict[str, Any], limits: ResourceLimits):
+    """Entry point of the job process"""
+    _apply_limits(limits)
+    writer = _PipeWriter(conn)
+    sys.stdout = sys.stderr = writer
+    # Handlers inherited from the bot's logging setup would write to its
+    # log files; everything goes through the pipe instead
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_PipeLogHandler(writer))
+    root_logger.setLevel(logging.INFO)
+    # Commands started by ShellRunner run in sessions of their own, out of
+    # reach of killpg(); SIGTERM cancels them the same way /cancel does
+    token = CancelToken()
+    signal.signal(signal.SIGTERM, lambda signum, frame: token.cancel())
+    
+    try:
+        with cancel_scope(token):
+            result = task_func(*args, **kwargs)
+        writer.flush()
+        conn.send(('result', result or {}))
+    except BaseException as e:
+        error = _limit_error(e, limits)
+        try:
+            writer.flush()
+            conn.send(('error', error))
+        except Exception:
+            # Not picklable
+            conn.send(('error', RuntimeError(f"{type(error).__name__}: {error}")))
+    finally:
+        conn.close()
+
+
+def _exit_reason(exitcode: int, limits: ResourceLimits) -> str:
+    """Why the job process died without reporting a result"""
+    if exitcode == -signal.SIGXCPU:
+        return f"CPU time limit exceeded ({limits.cpu_seconds}s)"
+    if exitcode == -signal.SIGKILL:
+        return "Job process was killed (CPU or memory limit)"
+    if exitcode is not None and exitcode < 0:
+        return f"Job process died with signal {signal.Signals(-exitcode).name}"
+    return f"Job process exited with code {exitcode} without a result"
+
+
+def _kill(process, grace: float = KILL_GRACE_SECONDS):
+    """SIGTERM the job's process group, then SIGKILL what is left"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    process.join(grace)
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    process.join()
+
+
+def run_isolated(
+    token: CancelToken,
+    task_func: Callable,
+    args: tuple,
+    kwargs: Dict[str, Any],
+    sink: TextIO,
+    limits: ResourceLimits,
+    workspace_dir: str,
+) -> Dict[str, Any]:
+    """
+    Run task_func in a child process under resource limits
+    
+    Blocks (call it from a worker thread) until the task ends. The task's
+    output and log records are written to ``sink`` as they arrive over
+    the pipe, its result is returned and its exception re-raised. A task
+    that breaks a limit or dies fails with a RuntimeError saying why;
+    cancelling the token kills the child's whole process group. The task
+    must be picklable, as the child is spawned (not forked) to stay clear
+    of the bot's threads and locks.
+    """
+    context = multiprocessing.get_context('spawn')
+    reader, writer = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_child_main,
+        args=(writer, task_func, args, kwargs, limits),
+        daemon=True,
+    )
+    process.start()
+    writer.close()
+    
+    next_disk_check = time.monotonic() + limits.disk_check_interval
+    try:
+        while True:
+            if reader.poll(POLL_INTERVAL):
+                try:
+                    kind, payload = reader.recv()
+                except EOFError:
+                    # Died without a result
+                    break
+                if kind == 'output':
+                    sink.write(payload)
+                    continue
+                process.join()
+                if kind == 'result':
+                    return payload
+                raise payload
+            
+            if token.cancelled:
+                _kill(process)
+                token.check()
+            if limits.disk_bytes and time.monotonic() >= next_disk_check:
+                used = tree_size(Path(workspace_dir))
+                if used > limits.disk_bytes:
+                    _kill(process)
+                    raise RuntimeError(f"Disk quota exceeded: workspace uses {used} of {limits.disk_bytes} bytes")
+                next_disk_check = time.monotonic() + limits.disk_check_interval
+        
+        process.join()
+        raise RuntimeError(_exit_reason(process.exitcode, limits))
+    finally:
+        if process.is_alive():
+            _kill(process, grace=0)
+        reader.close()
@@ -0,0 +1,82 @@
+"""In-process cache of job rows"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class JobCache:
+    """
+    Bounded LRU cache of job rows keyed by job ID
+    
+    Rows of finished jobs no longer change, so they stay cached until they
+    are evicted; rows of pending/running jobs expire after ``active_ttl``
+    seconds, which bounds how stale they can get when another bot instance
+    shares the database.
+    
+    Writers go through ``apply()``/``invalidate()``. Both bump a version
+    number, and ``put()`` of a row read from the database is dropped if
+    the version moved while the row was being read, so a slow reader can
+    never overwrite a newer cached row with an older one.
+    """
+    
+    def __init__(self, max_size: int = 1024, active_ttl: float = 2.0, terminal_statuses: Iterable[str] = ()):
+        self.max_size = max_size
+        self.active_ttl = active_ttl
+        self.terminal_statuses = frozenset(terminal_statuses)
+        self._rows: "OrderedDict[str, Tuple[Dict[str, Any], Optional[float]]]" = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def version(self) -> int:
+        """Current write version, pass it to put()"""
+        with self._lock:
+            return self._version
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cached copy of a job row, or None"""
+        with self._lock:
+            entry = self._rows.get(job_id)
+            if entry is not None:
+                row, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._rows.move_to_end(job_id)
+                    return dict(row)
+                del self._rows[job_id]
+            return None
+    
+    def put(self, row: Dict[str, Any], version: int):
+        """Cache a row read from the database at the given version"""
+        with self._lock:
+            if version != self._version:
+                return
+            self._store(row['id'], dict(row))
+    
+    def apply(self, job_id: str, fields: Dict[str, Any]):
+        """Merge an update into the cached row, if the row is cached"""
+        with self._lock:
+            self._version += 1
+            entry = self._rows.get(job_id)
+            if entry is not None:
+                self._store(job_id, {**entry[0], **fields})
+    
+    def invalidate(self, job_id: Optional[str] = None):
+        """Drop one cached row, or all of them"""
+        with self._lock:
+            self._version += 1
+            if job_id is None:
+                self._rows.clear()
+            else:
+                self._rows.pop(job_id, None)
+    
+    def _store(self, job_id: str, row: Dict[str, Any]):
+        # Caller holds the lock
+        expires = None
+        if row.get('status') not in self.terminal_statuses:
+            expires = time.monotonic() + self.active_ttl
+        self._rows[job_id] = (row, expires)
+        self._rows.move_to_end(job_id)
+        while len(self._rows) > self.max_size:
+            self._rows.popitem(last=False)
@@ -1,36 +1,142 @@
 """Job executor with async task running"""
 
 import asyncio
+import functools
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Callable, Dict, Any, Optional
 
-from src.jobs.job_manager import JobManager, JobStatus
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.isolation import ResourceLimits, run_isolated
+from src.jobs.job_log import JobLogWriter
+from src.jobs.job_manager import JobStatus
+from src.jobs.job_output import capture_job_output
+from src.utils.cancel import REASON_CANCELLED, REASON_TIMEOUT, CancelToken, JobCancelled, cancel_scope
 from src.utils.redact import get_redactor
 
 logger = logging.getLogger(__name__)
 
+# Threads per task class, overridden by the [workers] config section
+DEFAULT_POOL_SIZES = {
+    'status': 4,
+    'audit': 8,
+    'load_test': 1,
+    'build': 1,
+    'default': 2,
+}
+
 
 class JobExecutor:
-    """Executes jobs asynchronously"""
+    """
+    Executes jobs asynchronously
+    
+    Each task class runs on its own bounded thread pool, so a long build
+    can only ever occupy the build threads and never delays status checks.
+    
+    Every job gets a CancelToken; cancel() or running longer than
+    ``security.max_job_timeout`` cancels it, which kills the process group
+    of the command the task is running, and execute_job() returns at once
+    instead of waiting for the task thread to notice. Such an abandoned
+    task keeps its pool thread until it returns; once abandoned tasks hold
+    every thread of a pool, the pool is replaced with a fresh one and the
+    old threads end in the background.
+    
+    With ``security.job_isolation = "process"`` each task runs in its own
+    child process under memory, CPU time and file size limits, with its
+    workspace checked against ``max_disk_per_job``; a task that breaks a
+    limit (or crashes) fails with the reason, the bot keeps running.
+    """
     
-    def __init__(self, job_manager: JobManager, config: dict):
-        self.job_manager = job_manager
+    def __init__(self, job_store: AsyncJobStore, config: dict):
+        self.job_store = job_store
         self.config = config
-        self.running_jobs: Dict[str, threading.Thread] = {}
+        self.cancel_tokens: Dict[str, CancelToken] = {}
+        security = config.get('security', {})
+        self.max_job_timeout = security.get('max_job_timeout', 1800)
+        self.isolation = security.get('job_isolation', 'thread')
+        if self.isolation not in ('thread', 'process'):
+            raise ValueError(f"Unknown job_isolation: {self.isolation}")
+        self.limits = ResourceLimits(
+            memory_bytes=security.get('max_memory_per_job', 0),
+            cpu_seconds=security.get('max_cpu_per_job', 0),
+            file_size_bytes=security.get('max_disk_per_job', 0),
+            disk_bytes=security.get('max_disk_per_job', 0),
+            disk_check_interval=security.get('disk_check_interval', 5.0),
+        )
         self.redactor = get_redactor(config)
+        self.pool_sizes = {**DEFAULT_POOL_SIZES, **config.get('workers', {})}
+        
+        log_config = config.get('job_logs', {})
+        self.log_max_bytes = log_config.get('max_bytes', 10 * 1024 * 1024)
+        self.log_tail_bytes = log_config.get('tail_bytes')
+        self.log_compress = log_config.get('compress', False)
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        # Abandoned tasks still running on each current pool
+        self._abandoned: Dict[str, int] = {}
+        self._pools_lock = threading.Lock()
+    
+    def pool(self, name: str) -> ThreadPoolExecutor:
+        """Thread pool of a task class, created on first use"""
+        with self._pools_lock:
+            if name not in self._pools:
+                self._pools[name] = ThreadPoolExecutor(
+                    max_workers=self.pool_sizes.get(name, self.pool_sizes['default']),
+                    thread_name_prefix=f"task-{name}",
+                )
+            return self._pools[name]
+    
+    def shutdown(self):
+        """Stop the task thread pools (running tasks finish in the background)"""
+        with self._pools_lock:
+            for pool in self._pools.values():
+                pool.shutdown(wait=False)
+            self._pools = {}
+            self._abandoned = {}
+    
+    def _abandon(self, name: str, pool: ThreadPoolExecutor, future: asyncio.Future):
+        """Stop waiting for a cancelled task; replace its pool if it is full of them"""
+        with self._pools_lock:
+            if self._pools.get(name) is pool:
+                self._abandoned[name] = self._abandoned.get(name, 0) + 1
+                if self._abandoned[name] >= self.pool_sizes.get(name, self.pool_sizes['default']):
+                    logger.warning(f"All threads of pool {name} run abandoned tasks, starting a new pool")
+                    pool.shutdown(wait=False)
+                    del self._pools[name]
+                    self._abandoned[name] = 0
+        future.add_done_callback(functools.partial(self._abandoned_done, name, pool))
+    
+    def _abandoned_done(self, name: str, pool: ThreadPoolExecutor, future: asyncio.Future):
+        with self._pools_lock:
+            if self._pools.get(name) is pool:
+                self._abandoned[name] -= 1
+        # Retrieve the exception so it is not logged
+        if not future.cancelled():
+            future.exception()
+    
+    def cancel(self, job_id: str, reason: str = REASON_CANCELLED) -> bool:
+        """Cancel a job running in this process; False if it is not running here"""
+        token = self.cancel_tokens.get(job_id)
+        return bool(token) and token.cancel(reason)
     
     async def execute_job(
         self,
         job_id: str,
         task_func: Callable,
         *args,
+        pool: str = 'default',
+        timeout: Optional[float] = None,
         **kwargs
     ) -> Dict[str, Any]:
-        """Execute a job task"""
+        """
+        Execute a job task on the thread pool of its task class
+        
+        Raises JobCancelled if the job was cancelled or timed out.
+        """
+        timeout = timeout or self.max_job_timeout
         # Update status to running
-        self.job_manager.update_job(job_id, status=JobStatus.RUNNING)
+        await self.job_store.update_job(job_id, status=JobStatus.RUNNING)
         
         # Create workspace directory
         workspace_dir = Path(self.config['paths']['workspaces_dir']) / job_id
@@ -38,32 +144,66 @@ class JobExecutor:
         
         logs_path = workspace_dir / "logs.txt"
         report_path = workspace_dir / "report.md"
+        # logs.txt.gz if logs are compressed
+        stored_logs_path = JobLogWriter.final_path(str(logs_path), self.log_compress)
+        
+        token = CancelToken()
+        self.cancel_tokens[job_id] = token
+        loop = asyncio.get_running_loop()
+        cancelled = asyncio.Event()
+        token.add_callback(lambda: loop.call_soon_threadsafe(cancelled.set))
         
         try:
-            # Run task in executor to avoid blocking
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
-                self._run_task_sync,
-                task_func,
-                job_id,
-                str(workspace_dir),
-                str(logs_path),
-                str(report_path),
-                *args,
-                **kwargs
+            # Run task in its class's pool to avoid blocking
+            executor = self.pool(pool)
+            task_future = loop.run_in_executor(
+                executor,
+                functools.partial(
+                    self._run_task_sync,
+                    token,
+                    task_func,
+                    job_id,
+                    str(workspace_dir),
+                    str(logs_path),
+                    str(report_path),
+                    *args,
+                    **kwargs
+                )
             )
+            cancel_waiter = asyncio.ensure_future(cancelled.wait())
+            await asyncio.wait({task_future, cancel_waiter}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            cancel_waiter.cancel()
+            
+            if not task_future.done():
+                token.cancel(REASON_TIMEOUT, f"Job timed out after {timeout}s")
+                # The task thread ends once its command is killed; the worker
+                # does not wait for it
+                self._abandon(pool, executor, task_future)
+                token.check()
+            result = task_future.result()
+            # Finished while being cancelled
+            token.check()
             
             # Update job with results
-            self.job_manager.update_job(
+            await self.job_store.update_job(
                 job_id,
                 status=JobStatus.COMPLETED,
-                logs_path=str(logs_path),
+                logs_path=str(stored_logs_path),
                 report_path=str(report_path) if report_path.exists() else None,
             )
             
             return result
             
+        except JobCancelled as e:
+            logger.warning(f"Job {job_id} stopped: {e}")
+            await self.job_store.update_job(
+                job_id,
+                status=JobStatus.CANCELLED if e.reason == REASON_CANCELLED else JobStatus.FAILED,
+                error_message=str(e),
+                logs_path=str(stored_logs_path) if stored_logs_path.exists() else None,
+            )
+            raise
+            
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Job {job_id} failed: {error_msg}")
@@ -71,17 +211,21 @@ class JobExecutor:
             # Redact sensitive info from error
             error_msg_redacted = self.redactor.redact(error_msg)
             
-            self.job_manager.update_job(
+            await self.job_store.update_job(
                 job_id,
                 status=JobStatus.FAILED,
                 error_message=error_msg_redacted,
-                logs_path=str(logs_path) if logs_path.exists() else None,
+                logs_path=str(stored_logs_path) if stored_logs_path.exists() else None,
             )
             
             raise
+        
+        finally:
+            self.cancel_tokens.pop(job_id, None)
     
     def _run_task_sync(
         self,
+        token: CancelToken,
         task_func: Callable,
         job_id: str,
         workspace_dir: str,
@@ -91,18 +235,34 @@ class JobExecutor:
         **kwargs
     ) -> Dict[str, Any]:
         """Run task synchronously (in thread)"""
-        import sys
-        from io import StringIO
-        
-        # Capture stdout/stderr
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        log_buffer = StringIO()
-        
-        try:
-            sys.stdout = log_buffer
-            sys.stderr = log_buffer
-            
+        # What the task prints or logs goes to this job's log file only, so
+        # jobs running at the same time never mix or lose their output; it
+        # is redacted and written while the task runs
+        log_file = JobLogWriter(
+            logs_path,
+            self.redactor,
+            max_bytes=self.log_max_bytes,
+            tail_bytes=self.log_tail_bytes,
+            compress=self.log_compress,
+        )
+        with log_file, capture_job_output(job_id, log_file), cancel_scope(token):
+            token.check()
+            if self.isolation == 'process':
+                return run_isolated(
+                    token,
+                    task_func,
+                    args,
+                    dict(
+                        job_id=job_id,
+                        workspace_dir=workspace_dir,
+                        logs_path=logs_path,
+                        report_path=report_path,
+                        **kwargs
+                    ),
+                    log_file,
+                    self.limits,
+                    workspace_dir,
+                )
             # Call task function
             result = task_func(
                 job_id=job_id,
@@ -114,17 +274,6 @@ class JobExecutor:
             )
             
             return result or {}
-            
-        finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
-            
-            # Write logs (redacted)
-            log_content = log_buffer.getvalue()
-            redacted_logs = self.redactor.redact(log_content)
-            
-            with open(logs_path, 'w', encoding='utf-8') as f:
-                f.write(redacted_logs)
     
     def cleanup_workspace(self, job_id: str):
         """Cleanup workspace after job completion"""
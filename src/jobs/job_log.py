@@ -0,0 +1,174 @@
+"""Streaming, size-capped job log files"""
+
+import gzip
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Optional
+
+from src.utils.redact import Redactor
+
+# A line longer than this is written out without waiting for its newline
+# (progress bars redraw with \r and may never print one)
+MAX_LINE_CHARS = 64 * 1024
+# Complete lines are redacted and written in chunks of about this size (or
+# every flush_interval), not one by one
+CHUNK_CHARS = 64 * 1024
+# Lines after an unterminated "-----BEGIN" are held back until "-----END",
+# so a private key block is redacted as a whole; at most this much
+MAX_HELD_CHARS = 1024 * 1024
+
+BLOCK_BEGIN = '-----BEGIN'
+BLOCK_END = '-----END'
+
+
+class JobLogWriter:
+    """
+    File-like sink that redacts and writes job output while the job runs
+    
+    Complete lines are redacted and written as they arrive, and the file
+    is flushed every ``flush_interval`` seconds, so memory use does not
+    grow with the output and the log is on disk if the bot dies. Once
+    ``max_bytes`` would be exceeded, only the last ``tail_bytes`` are kept
+    (in memory) and written after an "omitted" marker on close. With
+    ``compress`` the file is gzipped on close and ``path`` points to the
+    ``.gz`` file.
+    
+    Threads of one job (pipeline steps, output readers) may write at the
+    same time: each thread's unfinished line is kept apart until its
+    newline arrives, and complete lines are released under a lock.
+    """
+    
+    def __init__(
+        self,
+        path: str,
+        redactor: Redactor,
+        max_bytes: int = 10 * 1024 * 1024,
+        tail_bytes: Optional[int] = None,
+        compress: bool = False,
+        flush_interval: float = 1.0,
+    ):
+        self.path = Path(path)
+        self.redactor = redactor
+        self.tail_bytes = max_bytes // 2 if tail_bytes is None else min(tail_bytes, max_bytes)
+        self.head_bytes = max_bytes - self.tail_bytes
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.omitted = 0
+        self.closed = False
+        self._file = open(self.path, 'w', encoding='utf-8', errors='replace')
+        # Unfinished line of each writing thread
+        self._pending: Dict[int, str] = {}
+        self._held = ''
+        self._lock = threading.Lock()
+        self._tail: Deque[str] = deque()
+        self._tail_size = 0
+        self._truncated = False
+        self._last_flush = time.monotonic()
+    
+    @staticmethod
+    def final_path(path: str, compress: bool) -> Path:
+        """Where the log of ``path`` ends up after close()"""
+        path = Path(path)
+        return path.with_name(path.name + '.gz') if compress else path
+    
+    def __enter__(self) -> 'JobLogWriter':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def write(self, text: str) -> int:
+        with self._lock:
+            return self._write(text)
+    
+    def _write(self, text: str) -> int:
+        if self.closed:
+            raise ValueError("write to closed job log")
+        thread = threading.get_ident()
+        pending = self._pending.pop(thread, '') + text
+        if '\n' in text:
+            cut = pending.rfind('\n') + 1
+        elif len(pending) > MAX_LINE_CHARS:
+            cut = len(pending)
+        else:
+            self._pending[thread] = pending
+            return len(text)
+        
+        self._held += pending[:cut]
+        if pending[cut:]:
+            self._pending[thread] = pending[cut:]
+        due = time.monotonic() - self._last_flush >= self.flush_interval
+        if len(self._held) < CHUNK_CHARS and not due:
+            return len(text)
+        if self._held.rfind(BLOCK_BEGIN) > self._held.rfind(BLOCK_END):
+            if len(self._held) <= MAX_HELD_CHARS:
+                return len(text)
+            # Never write part of an unterminated key block
+            self._held = "***REDACTED***\n"
+        self._release()
+        self._file.flush()
+        self._last_flush = time.monotonic()
+        return len(text)
+    
+    def flush(self):
+        # Called by print(flush=True) and logging on every record; the file
+        # is flushed with each written chunk instead
+        pass
+    
+    def close(self):
+        """Write what is left and the kept tail, then compress if configured"""
+        with self._lock:
+            self._close()
+    
+    def _close(self):
+        if self.closed:
+            return
+        self._held += ''.join(self._pending.values())
+        self._pending.clear()
+        self._release()
+        if self._truncated:
+            self._file.write(f"\n... [{self.omitted} bytes omitted] ...\n\n")
+            self._file.writelines(self._tail)
+            self._tail.clear()
+        self._file.close()
+        self.closed = True
+        
+        if self.compress:
+            compressed = self.final_path(str(self.path), True)
+            with open(self.path, 'rb') as src, gzip.open(compressed, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(self.path)
+            self.path = compressed
+    
+    def _release(self):
+        """Redact the held lines and write them (under the lock)"""
+        text, self._held = self._held, ''
+        if not text:
+            return
+        text = self.redactor.redact(text)
+        size = len(text.encode('utf-8', 'replace'))
+        if not self._truncated and self.written + size <= self.head_bytes:
+            self._file.write(text)
+            self.written += size
+            return
+        
+        for line in text.splitlines(keepends=True):
+            size = len(line.encode('utf-8', 'replace'))
+            if not self._truncated and self.written + size <= self.head_bytes:
+                self._file.write(line)
+                self.written += size
+                continue
+            
+            self._truncated = True
+            self._tail.append(line)
+            self._tail_size += size
+            while self._tail_size > self.tail_bytes:
+                dropped = self._tail.popleft()
+                dropped_size = len(dropped.encode('utf-8', 'replace'))
+                self._tail_size -= dropped_size
+                self.omitted += dropped_size
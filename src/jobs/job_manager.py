@@ -1,15 +1,20 @@
 """Job queue manager"""
 
-import sqlite3
+import logging
 import threading
 import time
-import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import json
 
+from src.jobs.job_cache import JobCache
+from src.jobs.job_stats import PERCENTILES, latency_stats
+from src.jobs.migrations import command_type
+from src.jobs.store import JobStore, create_job_store
+from src.jobs.write_behind import WriteBehindQueue
+from src.utils.timestamps import from_db_timestamp, to_db_timestamp, utc_now
+
 logger = logging.getLogger(__name__)
 
 
@@ -21,72 +26,91 @@ class JobStatus(Enum):
     CANCELLED = "cancelled"
 
 
+TERMINAL_STATUSES = (JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value)
+
+# A task result may carry a dict under this key; the dispatcher stores it
+# as the job's ``result`` metadata, which /job shows
+RESULT_METADATA_KEY = 'job_metadata'
+
+# Shortest job ID prefix accepted by resolve_job() (/jobs shows 8 characters)
+MIN_JOB_ID_PREFIX = 4
+
+
+def encode_cursor(job: Dict[str, Any]) -> str:
+    """Pagination cursor pointing after a job row"""
+    return f"{job['created_at']}|{job['id']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Parse a cursor from encode_cursor()"""
+    created_at, sep, job_id = cursor.partition('|')
+    if not sep or not created_at or not job_id:
+        raise ValueError(f"Invalid page cursor: {cursor}")
+    return created_at, job_id
+
+
 class JobManager:
     """Manages job queue and execution"""
     
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, store: Optional[JobStore] = None):
         self.config = config
         self.db_type = config.get('database', {}).get('type', 'sqlite')
-        self.db_path = config.get('database', {}).get('sqlite_path', '/opt/autobuilder/storage/jobs.db')
-        self.connection_string = config.get('database', {}).get('connection_string', '')
-        self.lock = threading.Lock()
+        self.store = store or create_job_store(config)
         self._init_database()
+        
+        # Group commit of status updates (0 disables write-behind)
+        write_behind_ms = config.get('database', {}).get('write_behind_ms', 20)
+        self.write_behind: Optional[WriteBehindQueue] = None
+        if write_behind_ms > 0:
+            self.write_behind = WriteBehindQueue(self.store, window_ms=write_behind_ms)
+        
+        # Read-through cache of job rows (0 disables it)
+        cache_size = config.get('database', {}).get('cache_size', 1024)
+        self.cache: Optional[JobCache] = None
+        if cache_size > 0:
+            self.cache = JobCache(
+                max_size=cache_size,
+                active_ttl=config.get('database', {}).get('cache_ttl', 2.0),
+                terminal_statuses=TERMINAL_STATUSES,
+            )
+        
+        # Last status of unfinished jobs with the monotonic time it was
+        # entered: job_id -> (command_type, status, monotonic seconds)
+        self._transitions: Dict[str, Tuple[str, str, float]] = {}
+        self._transitions_lock = threading.Lock()
     
     def _init_database(self):
-        """Initialize database tables"""
-        if self.db_type == 'sqlite':
-            # Ensure directory exists
-            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-            conn = sqlite3.connect(self.db_path)
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS jobs (
-                    id TEXT PRIMARY KEY,
-                    command TEXT NOT NULL,
-                    status TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    logs_path TEXT,
-                    report_path TEXT,
-                    error_message TEXT,
-                    metadata TEXT
-                )
-            """)
-            conn.commit()
-            conn.close()
-        else:
-            # MariaDB initialization would go here
-            # For now, we'll use SQLite as default
-            logger.warning("MariaDB support not fully implemented, using SQLite")
-            self.db_type = 'sqlite'
-            self._init_database()
-    
-    def _get_connection(self):
-        """Get database connection"""
-        if self.db_type == 'sqlite':
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
-        else:
-            # MariaDB connection would go here
-            raise NotImplementedError("MariaDB not implemented")
+        """Apply pending schema migrations"""
+        version = self.store.migrate()
+        logger.info(f"Job database ({self.store.dialect}) schema at version {version}")
     
-    def create_job(self, command: str, metadata: Optional[Dict[str, Any]] = None) -> str:
-        """Create a new job and return job ID"""
+    def create_job(self, command: str, metadata: Optional[Dict[str, Any]] = None, priority: int = 0) -> str:
+        """Create a new job and return job ID (higher priorities run first)"""
         import uuid
         job_id = str(uuid.uuid4())
         
-        with self.lock:
-            conn = self._get_connection()
-            try:
-                conn.execute("""
-                    INSERT INTO jobs (id, command, status, metadata)
-                    VALUES (?, ?, ?, ?)
-                """, (job_id, command, JobStatus.PENDING.value, json.dumps(metadata or {})))
-                conn.commit()
-                logger.info(f"Created job {job_id}: {command}")
-            finally:
-                conn.close()
+        now = utc_now()
+        job_type = command_type(command)
+        
+        with self._transitions_lock:
+            self._transitions[job_id] = (job_type, JobStatus.PENDING.value, time.monotonic())
+        
+        self.store.insert_job({
+            'id': job_id,
+            'command': command,
+            'command_type': job_type,
+            'status': JobStatus.PENDING.value,
+            'priority': priority,
+            'created_at': now,
+            'updated_at': now,
+            'metadata': json.dumps(metadata or {}),
+        }, events=[{
+            'job_id': job_id,
+            'command_type': job_type,
+            'to_status': JobStatus.PENDING.value,
+            'created_at': now,
+        }])
+        logger.info(f"Created job {job_id}: {command}")
         
         return job_id
     
@@ -100,70 +124,291 @@ class JobManager:
         metadata: Optional[Dict[str, Any]] = None,
     ):
         """Update job status and information"""
-        with self.lock:
-            conn = self._get_connection()
-            try:
-                updates = []
-                params = []
-                
-                if status:
-                    updates.append("status = ?")
-                    params.append(status.value)
-                
-                if logs_path:
-                    updates.append("logs_path = ?")
-                    params.append(logs_path)
-                
-                if report_path:
-                    updates.append("report_path = ?")
-                    params.append(report_path)
-                
-                if error_message:
-                    updates.append("error_message = ?")
-                    params.append(error_message)
-                
-                if metadata:
-                    updates.append("metadata = ?")
-                    params.append(json.dumps(metadata))
-                
-                if status == JobStatus.COMPLETED or status == JobStatus.FAILED:
-                    updates.append("completed_at = ?")
-                    params.append(datetime.now().isoformat())
-                
-                updates.append("updated_at = ?")
-                params.append(datetime.now().isoformat())
-                
-                params.append(job_id)
-                
-                query = f"UPDATE jobs SET {', '.join(updates)} WHERE id = ?"
-                conn.execute(query, params)
-                conn.commit()
-            finally:
-                conn.close()
+        fields: Dict[str, Any] = {}
+        
+        if status:
+            fields['status'] = status.value
+        
+        if logs_path:
+            fields['logs_path'] = logs_path
+        
+        if report_path:
+            fields['report_path'] = report_path
+        
+        if error_message:
+            fields['error_message'] = error_message
+        
+        if metadata:
+            fields['metadata'] = json.dumps(metadata)
+        
+        now = utc_now()
+        
+        if status == JobStatus.COMPLETED or status == JobStatus.FAILED:
+            fields['completed_at'] = now
+        
+        if status and status.value in TERMINAL_STATUSES:
+            fields['lease_owner'] = None
+            fields['lease_expires_at'] = None
+        
+        fields['updated_at'] = now
+        event = self._transition_event(job_id, status.value, now) if status else None
+        
+        if self.write_behind:
+            self.write_behind.submit(job_id, fields, event)
+        else:
+            self.store.update_job(job_id, fields, [event] if event else ())
+        
+        if self.cache:
+            # The cached row already carries queued updates, so cache hits
+            # need no flush
+            self.cache.apply(job_id, fields)
+    
+    def _transition_event(
+        self,
+        job_id: str,
+        status: str,
+        now: str,
+        job: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Lifecycle event for a status change, None if the status is unchanged
+        
+        The time spent in the previous status is measured on the monotonic
+        clock when this process saw that status begin; otherwise (restart,
+        another instance) it falls back to the wall-clock updated_at of the
+        row, given as ``job`` or read from the store.
+        """
+        with self._transitions_lock:
+            previous = self._transitions.get(job_id)
+        
+        if previous:
+            job_type, from_status, entered = previous
+            elapsed_ms = int((time.monotonic() - entered) * 1000)
+        else:
+            job = job or self.get_job(job_id)
+            if not job:
+                return None
+            job_type, from_status = job['command_type'], job['status']
+            elapsed = from_db_timestamp(now) - from_db_timestamp(job['updated_at'])
+            elapsed_ms = max(0, int(elapsed.total_seconds() * 1000))
+        
+        if from_status == status:
+            return None
+        
+        with self._transitions_lock:
+            if status in TERMINAL_STATUSES:
+                self._transitions.pop(job_id, None)
+            else:
+                self._transitions[job_id] = (job_type, status, time.monotonic())
+        
+        return {
+            'job_id': job_id,
+            'command_type': job_type,
+            'from_status': from_status,
+            'to_status': status,
+            'created_at': now,
+            'elapsed_ms': elapsed_ms,
+        }
+    
+    def claim_job(
+        self,
+        owner: str,
+        lease_seconds: float,
+        max_wait: Optional[float] = None,
+        command_types: Optional[List[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Lease the next pending job to a worker and mark it running
+        
+        Higher priorities go first; a job pending longer than ``max_wait``
+        seconds goes before any priority. ``command_types`` restricts the
+        claim to jobs a worker can run. The lease must be renewed with
+        renew_leases() before it expires, or recover_expired_leases() takes
+        the job back.
+        
+        Returns:
+            The claimed job row, or None if nothing is pending
+        """
+        # A cancellation still queued in write-behind must be visible first
+        if self.write_behind and self.write_behind.has_pending():
+            self.write_behind.flush()
+        
+        now = datetime.now(timezone.utc)
+        starved_before = to_db_timestamp(now - timedelta(seconds=max_wait)) if max_wait else None
+        now_ts = to_db_timestamp(now)
+        
+        def claim_events(row):
+            event = self._transition_event(row['id'], JobStatus.RUNNING.value, now_ts, row)
+            return [event] if event else []
+        
+        job = self.store.claim_job(
+            owner,
+            now_ts,
+            to_db_timestamp(now + timedelta(seconds=lease_seconds)),
+            starved_before=starved_before,
+            on_claim=claim_events,
+            command_types=command_types,
+        )
+        
+        if job and self.cache:
+            self.cache.invalidate(job['id'])
+        return job
+    
+    def count_pending(self) -> Dict[str, int]:
+        """Number of queued jobs per command type"""
+        if self.write_behind and self.write_behind.has_pending():
+            self.write_behind.flush()
+        return self.store.count_pending()
+    
+    def renew_leases(self, owner: str, job_ids: List[str], lease_seconds: float) -> int:
+        """Extend the leases of jobs a worker is still running"""
+        lease_until = to_db_timestamp(datetime.now(timezone.utc) + timedelta(seconds=lease_seconds))
+        return self.store.renew_leases(owner, job_ids, lease_until)
+    
+    def recover_expired_leases(self, max_attempts: int = 2, retryable=None, limit: int = 100) -> Tuple[int, int]:
+        """
+        Take back running jobs whose worker stopped renewing its lease
+        
+        A job is re-queued if it has been attempted fewer than max_attempts
+        times and ``retryable(job)`` (when given) allows it; otherwise it
+        is marked failed.
+        
+        Returns:
+            (requeued, failed)
+        """
+        self.flush()
+        now = utc_now()
+        requeued = failed = 0
+        
+        for job in self.store.list_expired_leases(now, limit):
+            fields: Dict[str, Any] = {
+                'lease_owner': None,
+                'lease_expires_at': None,
+                'updated_at': now,
+            }
+            if job['attempts'] < max_attempts and (retryable is None or retryable(job)):
+                fields['status'] = JobStatus.PENDING.value
+            else:
+                fields['status'] = JobStatus.FAILED.value
+                fields['completed_at'] = now
+                fields['error_message'] = "Job interrupted: worker stopped before finishing"
+            
+            event = self._transition_event(job['id'], fields['status'], now, job)
+            # Only if the lease was not renewed meanwhile
+            recovered = self.store.update_job(
+                job['id'],
+                fields,
+                [event] if event else (),
+                expected={'status': JobStatus.RUNNING.value, 'lease_expires_at': job['lease_expires_at']},
+            )
+            if not recovered:
+                continue
+            
+            if self.cache:
+                self.cache.invalidate(job['id'])
+            if fields['status'] == JobStatus.PENDING.value:
+                requeued += 1
+            else:
+                failed += 1
+            logger.warning(f"Recovered job {job['id']} with expired lease: {fields['status']}")
+        
+        return requeued, failed
+    
+    def flush(self):
+        """Commit queued updates, so that following reads see them"""
+        if self.write_behind:
+            self.write_behind.flush()
     
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         """Get job by ID"""
-        conn = self._get_connection()
-        try:
-            cursor = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
+        if self.cache:
+            job = self.cache.get(job_id)
+            if job:
+                return job
+            version = self.cache.version
+        
+        if self.write_behind and self.write_behind.has_pending(job_id):
+            self.write_behind.flush()
+        job = self.store.get_job(job_id)
+        
+        if job and self.cache:
+            self.cache.put(job, version)
+        return job
+    
+    def resolve_job(self, job_ref: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job by its full ID or by a unique ID prefix
+        
+        Raises:
+            ValueError: If the prefix is too short or matches several jobs
+        """
+        job_ref = job_ref.strip().lower()
+        job = self.get_job(job_ref)
+        if job:
+            return job
+        
+        if len(job_ref) < MIN_JOB_ID_PREFIX:
+            raise ValueError(f"Job ID prefix must be at least {MIN_JOB_ID_PREFIX} characters")
+        
+        if self.write_behind and self.write_behind.has_pending():
+            self.write_behind.flush()
+        version = self.cache.version if self.cache else 0
+        
+        jobs = self.store.find_jobs_by_id_prefix(job_ref, 2)
+        if len(jobs) > 1:
+            raise ValueError(f"Job ID prefix is ambiguous: {job_ref}")
+        if not jobs:
             return None
-        finally:
-            conn.close()
+        
+        if self.cache:
+            self.cache.put(jobs[0], version)
+        return jobs[0]
     
     def list_jobs(self, limit: int = 10) -> List[Dict[str, Any]]:
         """List recent jobs"""
-        conn = self._get_connection()
-        try:
-            cursor = conn.execute(
-                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?",
-                (limit,)
-            )
-            return [dict(row) for row in cursor.fetchall()]
-        finally:
-            conn.close()
+        jobs, _ = self.list_jobs_page(limit=limit)
+        return jobs
+    
+    def list_jobs_page(
+        self,
+        limit: int = 10,
+        status: Optional[JobStatus] = None,
+        command_prefix: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List one page of jobs, newest first
+        
+        Pages are keyset-paginated on (created_at, id), so fetching a page
+        costs the same however deep into history it is.
+        
+        Returns:
+            (jobs, next_cursor) - next_cursor is None on the last page
+        """
+        if self.write_behind and self.write_behind.has_pending():
+            self.write_behind.flush()
+        
+        rows = self.store.list_jobs(
+            limit + 1,
+            status=status.value if status else None,
+            command_prefix=command_prefix,
+            since=to_db_timestamp(since) if since else None,
+            until=to_db_timestamp(until) if until else None,
+            after=decode_cursor(cursor) if cursor else None,
+        )
+        
+        if len(rows) <= limit:
+            return rows, None
+        
+        jobs = rows[:limit]
+        return jobs, encode_cursor(jobs[-1])
+    
+    def latency_stats(self, since: datetime) -> Dict[str, Dict[str, Any]]:
+        """Queue and run latency percentiles per command type since a time"""
+        self.flush()
+        return latency_stats(self.store.latency_percentiles(to_db_timestamp(since), PERCENTILES))
     
     def cancel_job(self, job_id: str) -> bool:
         """Cancel a job (best effort)"""
@@ -171,29 +416,44 @@ class JobManager:
         if not job:
             return False
         
-        if job['status'] in [JobStatus.COMPLETED.value, JobStatus.FAILED.value, JobStatus.CANCELLED.value]:
+        if job['status'] in TERMINAL_STATUSES:
             return False
         
         self.update_job(job_id, status=JobStatus.CANCELLED)
         logger.info(f"Cancelled job {job_id}")
         return True
     
-    def cleanup_old_jobs(self, days: int = 30):
-        """Cleanup old jobs"""
-        conn = self._get_connection()
-        try:
-            cutoff = datetime.now().timestamp() - (days * 24 * 60 * 60)
-            cutoff_iso = datetime.fromtimestamp(cutoff).isoformat()
-            conn.execute(
-                "DELETE FROM jobs WHERE created_at < ?",
-                (cutoff_iso,)
-            )
-            conn.commit()
-            logger.info(f"Cleaned up jobs older than {days} days")
-        finally:
-            conn.close()
+    def list_schedules(self) -> Dict[str, Dict[str, Any]]:
+        """Stored state of the recurring schedules by name"""
+        return self.store.list_schedules()
+    
+    def save_schedule(self, schedule: Dict[str, Any], expected_next_run: Optional[str] = None) -> bool:
+        """Insert a schedule, or advance it if its next run is still expected_next_run"""
+        return self.store.save_schedule(schedule, expected_next_run)
+    
+    def cleanup_old_jobs(self, days: int = 30, batch_size: int = 500) -> int:
+        """Delete jobs older than days in chunks, returns the number deleted"""
+        cutoff = to_db_timestamp(datetime.now(timezone.utc) - timedelta(days=days))
+        self.flush()
+        
+        deleted = 0
+        while True:
+            # One short transaction per chunk lets other writers in between
+            count = self.store.delete_jobs_before(cutoff, batch_size)
+            deleted += count
+            if count < batch_size:
+                break
+        
+        if deleted and self.cache:
+            self.cache.invalidate()
+        
+        logger.info(f"Cleaned up {deleted} jobs older than {days} days")
+        return deleted
     
     def shutdown(self):
         """Shutdown job manager"""
         logger.info("Job manager shutting down")
+        if self.write_behind:
+            self.write_behind.stop()
+        self.store.close()
 
@@ -0,0 +1,116 @@
+"""Per-job capture of task output"""
+
+import contextvars
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from io import StringIO
+from typing import Iterator, Optional, TextIO
+
+# Sink and log handler of the job whose task runs in the current context
+_current_sink: contextvars.ContextVar[Optional[TextIO]] = contextvars.ContextVar('job_output_sink', default=None)
+_current_handler: contextvars.ContextVar[Optional[logging.Handler]] = contextvars.ContextVar(
+    'job_output_handler',
+    default=None,
+)
+
+_install_lock = threading.Lock()
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class JobOutputRouter:
+    """
+    Stand-in for sys.stdout/sys.stderr that routes writes by job context
+    
+    Writes made while a job's task runs (in the same thread, or in
+    asyncio tasks it started) go to that job's sink; all other writes go
+    to the original stream. Installed once for the whole process, so
+    concurrent jobs never swap the global streams under each other.
+    """
+    
+    def __init__(self, original: TextIO):
+        self.original = original
+    
+    def _target(self) -> TextIO:
+        sink = _current_sink.get()
+        return sink if sink is not None else self.original
+    
+    def write(self, text: str) -> int:
+        return self._target().write(text)
+    
+    def writelines(self, lines):
+        self._target().writelines(lines)
+    
+    def flush(self):
+        self._target().flush()
+    
+    def isatty(self) -> bool:
+        return _current_sink.get() is None and self.original.isatty()
+    
+    def __getattr__(self, name):
+        # encoding, fileno() etc. of the real stream
+        return getattr(self.original, name)
+
+
+class JobLogHandler(logging.Handler):
+    """Writes the log records of one job's task to its sink"""
+    
+    def __init__(self, job_id: str, sink: TextIO):
+        super().__init__()
+        self.job_id = job_id
+        self.sink = sink
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.sink.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+
+class _JobLogRouter(logging.Handler):
+    """
+    Root handler passing records to the JobLogHandler of the current job
+    
+    Installed once: adding and removing a root handler per job would
+    mutate the handler list while other threads iterate over it.
+    """
+    
+    def emit(self, record: logging.LogRecord):
+        handler = _current_handler.get()
+        if handler is not None:
+            handler.handle(record)
+
+
+def install():
+    """Route sys.stdout, sys.stderr and logging by job context (idempotent)"""
+    with _install_lock:
+        if not isinstance(sys.stdout, JobOutputRouter):
+            sys.stdout = JobOutputRouter(sys.stdout)
+        if not isinstance(sys.stderr, JobOutputRouter):
+            sys.stderr = JobOutputRouter(sys.stderr)
+        root_logger = logging.getLogger()
+        if not any(isinstance(handler, _JobLogRouter) for handler in root_logger.handlers):
+            root_logger.addHandler(_JobLogRouter())
+
+
+@contextmanager
+def capture_job_output(job_id: str, sink: Optional[TextIO] = None) -> Iterator[TextIO]:
+    """
+    Capture what the current thread prints and logs into the job's sink
+    
+    Yields the sink (a new StringIO unless one is given). Threads started
+    by the task do not inherit the job context; their output goes to the
+    bot's own streams.
+    """
+    install()
+    sink = sink if sink is not None else StringIO()
+    sink_token = _current_sink.set(sink)
+    handler_token = _current_handler.set(JobLogHandler(job_id, sink))
+    try:
+        yield sink
+    finally:
+        _current_handler.reset(handler_token)
+        _current_sink.reset(sink_token)
@@ -0,0 +1,36 @@
+"""Latency statistics from job lifecycle events"""
+
+from typing import Any, Dict, Iterable
+
+PERCENTILES = (50, 95, 99)
+
+
+def _empty_summary() -> Dict[str, Any]:
+    """Summary of a command type and kind without events: no count, no percentiles"""
+    summary: Dict[str, Any] = {'count': 0}
+    for p in PERCENTILES:
+        summary[f'p{p}'] = None
+    return summary
+
+
+def latency_stats(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Queue and run latency per command type
+    
+    ``rows`` are the percentiles computed by the job store (see
+    JobStore.latency_percentiles()). Queue latency is the time a job spent
+    pending before it started running; run latency is the time it spent
+    running before it finished (completed, failed or cancelled) - a
+    requeue back to pending is not counted.
+    
+    Returns:
+        {command_type: {'queue': summary, 'run': summary}}, a summary
+        being the count and p50/p95/p99 in milliseconds
+    """
+    stats: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        by_kind = stats.setdefault(row['command_type'] or '?', {'queue': _empty_summary(), 'run': _empty_summary()})
+        summary = by_kind[row['kind']]
+        summary['count'] = row['count']
+        summary[f"p{row['percentile']}"] = row['elapsed_ms']
+    return dict(sorted(stats.items()))
@@ -0,0 +1,287 @@
+"""Versioned schema migrations for the job store"""
+
+import logging
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+from src.utils.timestamps import normalize_timestamp, utc_now
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    """A single schema migration
+
+    ``steps`` are portable SQL statements, dicts mapping a dialect
+    (``sqlite``/``mysql``) to SQL or a callable, or callables taking an
+    open connection; a dict without the current dialect is skipped. All
+    steps of a migration run in one transaction together with the version
+    bump, but MariaDB and MySQL commit each DDL statement on their own, so
+    every step must be safe to run again after a failure (IF [NOT] EXISTS
+    on SQLite, an information_schema lookup on MariaDB/MySQL, updates of
+    rows not yet updated).
+    """
+    version: int
+    description: str
+    steps: List[Union[str, Dict[str, Union[str, Callable]], Callable]]
+
+
+def _mysql_exists(conn, table: str, column: Optional[str] = None, index: Optional[str] = None) -> bool:
+    """Whether a column or an index of table exists in the current MariaDB/MySQL database"""
+    if column:
+        sql = "SELECT COUNT(*) AS found FROM information_schema.columns WHERE column_name = ?"
+        name = column
+    else:
+        sql = "SELECT COUNT(*) AS found FROM information_schema.statistics WHERE index_name = ?"
+        name = index
+    row = conn.execute(f"{sql} AND table_schema = DATABASE() AND table_name = ?", (name, table)).fetchone()
+    return row['found'] > 0
+
+
+def _add_column(table: str, column: str, sqlite_type: str, mysql_type: str) -> Dict[str, Union[str, Callable]]:
+    """Step adding a column; MySQL has no ADD COLUMN IF NOT EXISTS"""
+    def add(conn):
+        if not _mysql_exists(conn, table, column=column):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {mysql_type}")
+    
+    return {'sqlite': f"ALTER TABLE {table} ADD COLUMN {column} {sqlite_type}", 'mysql': add}
+
+
+def _create_index(
+    name: str,
+    table: str,
+    columns: str,
+    mysql_columns: Optional[str] = None,
+) -> Dict[str, Union[str, Callable]]:
+    """Step creating an index unless it exists"""
+    def create(conn):
+        if not _mysql_exists(conn, table, index=name):
+            conn.execute(f"CREATE INDEX {name} ON {table} ({mysql_columns or columns})")
+    
+    return {'sqlite': f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})", 'mysql': create}
+
+
+def _drop_index(name: str, table: str) -> Dict[str, Union[str, Callable]]:
+    """Step dropping an index if it exists"""
+    def drop(conn):
+        if _mysql_exists(conn, table, index=name):
+            conn.execute(f"DROP INDEX {name} ON {table}")
+    
+    return {'sqlite': f"DROP INDEX IF EXISTS {name}", 'mysql': drop}
+
+
+def _normalize_job_timestamps(conn):
+    """Rewrite legacy job timestamps into the sortable UTC format"""
+    rows = conn.execute(
+        "SELECT id, created_at, updated_at, completed_at FROM jobs"
+    ).fetchall()
+    
+    for row in rows:
+        conn.execute(
+            "UPDATE jobs SET created_at = ?, updated_at = ?, completed_at = ? WHERE id = ?",
+            (
+                normalize_timestamp(row['created_at']),
+                normalize_timestamp(row['updated_at']),
+                normalize_timestamp(row['completed_at']),
+                row['id'],
+            )
+        )
+
+
+def command_type(command: str) -> str:
+    """The command name of a job command line (its first word)"""
+    return command.split(' ', 1)[0]
+
+
+def _backfill_command_types(conn):
+    """Fill jobs.command_type for rows created before the column existed"""
+    rows = conn.execute("SELECT id, command FROM jobs WHERE command_type IS NULL").fetchall()
+    for row in rows:
+        conn.execute(
+            "UPDATE jobs SET command_type = ? WHERE id = ?",
+            (command_type(row['command']), row['id'])
+        )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create jobs table", [
+        {
+            'sqlite': """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    command TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    completed_at TIMESTAMP,
+                    logs_path TEXT,
+                    report_path TEXT,
+                    error_message TEXT,
+                    metadata TEXT
+                )
+            """,
+            'mysql': """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id VARCHAR(36) PRIMARY KEY,
+                    command VARCHAR(255) NOT NULL,
+                    status VARCHAR(16) NOT NULL,
+                    created_at VARCHAR(32),
+                    updated_at VARCHAR(32),
+                    completed_at VARCHAR(32),
+                    logs_path TEXT,
+                    report_path TEXT,
+                    error_message TEXT,
+                    metadata LONGTEXT
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        },
+    ]),
+    Migration(2, "Normalize job timestamps to UTC ISO-8601", [
+        _normalize_job_timestamps,
+    ]),
+    Migration(3, "Index jobs by creation time and status", [
+        _create_index('idx_jobs_created_at', 'jobs', 'created_at'),
+        _create_index('idx_jobs_status', 'jobs', 'status'),
+        _create_index('idx_jobs_status_created_at', 'jobs', 'status, created_at'),
+    ]),
+    Migration(4, "Keyset pagination indexes and command type column", [
+        _add_column('jobs', 'command_type', 'TEXT', 'VARCHAR(64)'),
+        _backfill_command_types,
+        # (created_at, id) is the pagination key; the filter columns lead so
+        # that a filtered page is a single index range scan
+        _create_index('idx_jobs_page', 'jobs', 'created_at, id'),
+        _create_index('idx_jobs_status_page', 'jobs', 'status, created_at, id'),
+        _create_index('idx_jobs_type_page', 'jobs', 'command_type, created_at, id'),
+        # Superseded by the pagination indexes above
+        _drop_index('idx_jobs_created_at', 'jobs'),
+        _drop_index('idx_jobs_status_created_at', 'jobs'),
+    ]),
+    Migration(5, "Job lifecycle events", [
+        {
+            'sqlite': """
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY,
+                    job_id TEXT NOT NULL,
+                    command_type TEXT,
+                    from_status TEXT,
+                    to_status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    elapsed_ms INTEGER
+                )
+            """,
+            'mysql': """
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    job_id VARCHAR(36) NOT NULL,
+                    command_type VARCHAR(64),
+                    from_status VARCHAR(16),
+                    to_status VARCHAR(16) NOT NULL,
+                    created_at VARCHAR(32) NOT NULL,
+                    elapsed_ms BIGINT
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        },
+        _create_index('idx_job_events_job', 'job_events', 'job_id'),
+        _create_index('idx_job_events_created_at', 'job_events', 'created_at'),
+    ]),
+    Migration(6, "Job queue priorities and worker leases", [
+        _add_column('jobs', 'priority', 'INTEGER NOT NULL DEFAULT 0', 'INTEGER NOT NULL DEFAULT 0'),
+        _add_column('jobs', 'attempts', 'INTEGER NOT NULL DEFAULT 0', 'INTEGER NOT NULL DEFAULT 0'),
+        _add_column('jobs', 'lease_owner', 'TEXT', 'VARCHAR(128)'),
+        _add_column('jobs', 'lease_expires_at', 'TEXT', 'VARCHAR(32)'),
+        # Jobs left running by earlier versions have no lease; an expired
+        # one makes lease recovery pick them up
+        "UPDATE jobs SET lease_expires_at = '' WHERE status = 'running' AND lease_expires_at IS NULL",
+        _create_index('idx_jobs_queue', 'jobs', 'status, priority, created_at'),
+        _create_index('idx_jobs_lease', 'jobs', 'status, lease_expires_at'),
+    ]),
+    Migration(7, "Recurring job schedules", [
+        {
+            'sqlite': """
+                CREATE TABLE IF NOT EXISTS schedules (
+                    name TEXT PRIMARY KEY,
+                    definition TEXT NOT NULL,
+                    next_run_at TEXT NOT NULL,
+                    last_run_at TEXT,
+                    last_job_id TEXT,
+                    updated_at TEXT NOT NULL
+                )
+            """,
+            'mysql': """
+                CREATE TABLE IF NOT EXISTS schedules (
+                    name VARCHAR(128) PRIMARY KEY,
+                    definition TEXT NOT NULL,
+                    next_run_at VARCHAR(32) NOT NULL,
+                    last_run_at VARCHAR(32),
+                    last_job_id VARCHAR(36),
+                    updated_at VARCHAR(32) NOT NULL
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """,
+        },
+    ]),
+    Migration(8, "Index jobs by command for prefix filters", [
+        _create_index('idx_jobs_command', 'jobs', 'command, created_at, id', 'command(191), created_at, id'),
+    ]),
+    Migration(9, "Unbounded job commands on MariaDB", [
+        # Long URLs and matrix parameters do not fit VARCHAR(255); the
+        # command index above only covers a 191-character prefix. SQLite
+        # columns are TEXT already
+        {'mysql': "ALTER TABLE jobs MODIFY command TEXT NOT NULL"},
+    ]),
+]
+
+
+def get_schema_version(conn) -> int:
+    """Get the current schema version (0 for a fresh database)"""
+    row = conn.execute("SELECT MAX(version) AS version FROM schema_migrations").fetchone()
+    return row['version'] or 0
+
+
+def apply_migrations(pool, dialect: str = 'sqlite') -> int:
+    """
+    Bring the database schema up to date
+
+    Each pending migration runs in its own write transaction, and the
+    version is re-checked under the pool's exclusive lock, so several
+    processes starting at once apply every migration exactly once. On
+    MariaDB a failed migration may leave its DDL steps applied; they are
+    written to be run again (see Migration).
+
+    Returns:
+        The schema version after migrating
+    """
+    with pool.exclusive('autobuilder_schema_migrations'):
+        with pool.transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at VARCHAR(32) NOT NULL
+                )
+            """)
+        
+        version = 0
+        for migration in MIGRATIONS:
+            with pool.transaction() as conn:
+                version = get_schema_version(conn)
+                if migration.version <= version:
+                    continue
+                
+                logger.info(f"Applying schema migration {migration.version}: {migration.description}")
+                for step in migration.steps:
+                    if callable(step):
+                        step(conn)
+                    elif isinstance(step, dict):
+                        if callable(step.get(dialect)):
+                            step[dialect](conn)
+                        elif dialect in step:
+                            conn.execute(step[dialect])
+                    else:
+                        conn.execute(step)
+                
+                conn.execute(
+                    "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                    (migration.version, migration.description, utc_now())
+                )
+                version = migration.version
+    
+    return version
@@ -0,0 +1,198 @@
+"""Background retention of jobs, reports and workspaces"""
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict
+
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.job_manager import JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Directory (inside each managed root) that doomed trees are renamed into
+TRASH_DIR = ".trash"
+
+ACTIVE_STATUSES = (JobStatus.PENDING.value, JobStatus.RUNNING.value)
+
+
+def tree_size(path: Path) -> int:
+    """Total size in bytes of the files under path (symlinks not followed)"""
+    if path.is_symlink() or not path.is_dir():
+        return path.lstat().st_size
+    
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class RetentionService:
+    """
+    Periodically reclaims space used by old jobs
+    
+    Each run:
+    - deletes jobs older than ``security.job_retention_days`` in small
+      chunked transactions, so one huge DELETE never holds the write lock
+    - removes workspaces that belong to no active job (crashed handlers),
+      and workspaces above ``security.max_disk_per_job``
+    - removes reports older than ``security.report_retention_days`` and
+      reports of jobs that no longer exist
+    
+    Trees are first renamed into a trash directory (instant, atomic) and
+    then deleted on a worker thread, so the event loop never walks a tree.
+    """
+    
+    def __init__(self, job_store: AsyncJobStore, config: dict):
+        self.job_store = job_store
+        security = config.get('security', {})
+        retention = config.get('retention', {})
+        paths = config.get('paths', {})
+        
+        self.job_retention_days = security.get('job_retention_days', 30)
+        self.report_retention_days = security.get('report_retention_days', 7)
+        self.max_disk_per_job = security.get('max_disk_per_job', 0)
+        self.interval = retention.get('interval_minutes', 60) * 60
+        self.batch_size = retention.get('batch_size', 500)
+        self.orphan_grace = retention.get('orphan_grace_minutes', 60) * 60
+        self.workspaces_dir = Path(paths.get('workspaces_dir', '/opt/autobuilder/workspaces'))
+        self.reports_dir = Path(paths.get('reports_dir', '/opt/autobuilder/reports'))
+    
+    async def run_forever(self):
+        """Run retention every interval until cancelled"""
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+    
+    async def run_once(self) -> Dict[str, Any]:
+        """Run one retention pass and return what it reclaimed"""
+        stats = {
+            'jobs_deleted': 0,
+            'workspaces_deleted': 0,
+            'reports_deleted': 0,
+            'bytes_reclaimed': 0,
+        }
+        
+        stats['jobs_deleted'] = await self.job_store.cleanup_old_jobs(
+            self.job_retention_days,
+            batch_size=self.batch_size,
+        )
+        
+        for root in (self.workspaces_dir, self.reports_dir):
+            stats['bytes_reclaimed'] += await self._empty_trash(root)
+        
+        await self._sweep_workspaces(stats)
+        await self._sweep_reports(stats)
+        
+        logger.info(
+            f"Retention: {stats['jobs_deleted']} jobs, {stats['workspaces_deleted']} workspaces, "
+            f"{stats['reports_deleted']} reports deleted, "
+            f"{stats['bytes_reclaimed'] / (1024 ** 2):.1f} MB reclaimed"
+        )
+        return stats
+    
+    async def _sweep_workspaces(self, stats: Dict[str, Any]):
+        """Delete workspaces of finished or unknown jobs, and oversized ones"""
+        now = time.time()
+        for entry in self._entries(self.workspaces_dir):
+            job = await self.job_store.get_job(entry.name)
+            if job and job['status'] in ACTIVE_STATUSES:
+                if self.max_disk_per_job:
+                    size = await self._run_in_thread(tree_size, entry)
+                    if size > self.max_disk_per_job:
+                        logger.warning(
+                            f"Workspace of running job {entry.name} uses {size} bytes "
+                            f"(limit {self.max_disk_per_job})"
+                        )
+                continue
+            
+            expired = now - entry.stat().st_mtime > self.orphan_grace
+            oversized = False
+            if not expired and self.max_disk_per_job:
+                oversized = await self._run_in_thread(tree_size, entry) > self.max_disk_per_job
+            
+            if expired or oversized:
+                stats['bytes_reclaimed'] += await self._delete_tree(self.workspaces_dir, entry)
+                stats['workspaces_deleted'] += 1
+    
+    async def _sweep_reports(self, stats: Dict[str, Any]):
+        """Delete expired reports and reports of deleted jobs"""
+        cutoff = time.time() - self.report_retention_days * 24 * 60 * 60
+        for entry in self._entries(self.reports_dir):
+            expired = entry.stat().st_mtime < cutoff
+            if not expired and _looks_like_job_id(entry.name):
+                expired = await self.job_store.get_job(entry.name) is None
+            
+            if expired:
+                stats['bytes_reclaimed'] += await self._delete_tree(self.reports_dir, entry)
+                stats['reports_deleted'] += 1
+    
+    @staticmethod
+    def _entries(root: Path):
+        """Managed entries of a root directory (trash and dotfiles excluded)"""
+        if not root.is_dir():
+            return []
+        return [entry for entry in root.iterdir() if not entry.name.startswith('.')]
+    
+    async def _delete_tree(self, root: Path, path: Path) -> int:
+        """Rename path into the root's trash, then delete it off the event loop"""
+        trash = root / TRASH_DIR
+        trash.mkdir(exist_ok=True)
+        doomed = trash / f"{path.name}-{uuid.uuid4().hex[:8]}"
+        try:
+            path.rename(doomed)
+        except FileNotFoundError:
+            return 0
+        return await self._run_in_thread(_remove_tree, doomed)
+    
+    async def _empty_trash(self, root: Path) -> int:
+        """Delete leftovers of interrupted runs"""
+        trash = root / TRASH_DIR
+        if not trash.is_dir():
+            return 0
+        reclaimed = 0
+        for entry in list(trash.iterdir()):
+            reclaimed += await self._run_in_thread(_remove_tree, entry)
+        return reclaimed
+    
+    @staticmethod
+    async def _run_in_thread(func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+
+def _remove_tree(path: Path) -> int:
+    """Delete a file or tree, returns the bytes freed"""
+    try:
+        size = tree_size(path)
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+        return size
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        logger.warning(f"Failed to delete {path}: {e}")
+        return 0
+
+
+def _looks_like_job_id(name: str) -> bool:
+    """Whether a directory name is a job UUID"""
+    try:
+        return str(uuid.UUID(name)) == name
+    except ValueError:
+        return False
@@ -0,0 +1,268 @@
+"""Recurring jobs from the [[schedules]] config"""
+
+import asyncio
+import json
+import logging
+import random
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+from src.jobs.dispatcher import JobDispatcher
+from src.jobs.job_manager import TERMINAL_STATUSES
+from src.utils.timestamps import from_db_timestamp, to_db_timestamp, utc_now
+
+logger = logging.getLogger(__name__)
+
+# Shorthands accepted in place of a cron expression
+CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+}
+# (lowest, highest) of minute, hour, day of month, month, day of week
+CRON_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# A cron expression that matches nothing (e.g. Feb 30) gives up after this
+CRON_SEARCH_YEARS = 5
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value) -> float:
+    """Seconds of a duration: a number, or "90s", "15m", "6h", "1d" """
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = re.fullmatch(r'(\d+(?:\.\d+)?)([smhd])', str(value).strip())
+    if not match:
+        raise ValueError(f"Invalid duration: {value} (e.g. 90s, 15m, 6h, 1d)")
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class CronExpression:
+    """
+    Five-field cron expression: minute hour day-of-month month day-of-week
+    
+    Fields take ``*``, numbers, ranges (``1-5``), steps (``*/15``,
+    ``0-30/10``) and lists of those; day-of-week 0 and 7 are Sunday. As in
+    cron, a run is due when both day fields match, or either one if both
+    are restricted.
+    """
+    
+    def __init__(self, expression: str):
+        self.expression = CRON_ALIASES.get(expression.strip(), expression.strip())
+        fields = self.expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression}")
+        
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, CRON_FIELD_RANGES)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+    
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        values: Set[int] = set()
+        for part in field.split(','):
+            range_part, _, step = part.partition('/')
+            if range_part == '*':
+                start, end = low, high
+            elif '-' in range_part:
+                start, end = (int(v) for v in range_part.split('-', 1))
+            else:
+                start = end = int(range_part)
+                if step:
+                    end = high
+            if not low <= start <= end <= high:
+                raise ValueError(f"Cron field out of range {low}-{high}: {field}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        return values
+    
+    def _day_matches(self, moment: datetime) -> bool:
+        day = moment.day in self.days
+        # Python counts weekdays from Monday, cron from Sunday
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day or weekday
+        return day and weekday
+    
+    def next_after(self, after: datetime) -> datetime:
+        """First matching minute after ``after`` (naive local time)"""
+        moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * CRON_SEARCH_YEARS)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f"Cron expression never matches: {self.expression}")
+
+
+class Schedule(NamedTuple):
+    """One [[schedules]] entry"""
+    name: str
+    command: str
+    params: Dict[str, Any]
+    cron: Optional[CronExpression]
+    every: Optional[float]
+    jitter: float
+    chat_id: Optional[int]
+    # Canonical form; a changed definition restarts the schedule's timing
+    definition: str
+    
+    def next_run(self, after: datetime) -> datetime:
+        """Next run time after ``after`` (naive local time), jitter included"""
+        if self.cron:
+            base = self.cron.next_after(after)
+        else:
+            base = after + timedelta(seconds=self.every)
+        return base + timedelta(seconds=random.uniform(0, self.jitter))
+
+
+def load_schedules(config: dict, tasks: Dict[str, Any]) -> List[Schedule]:
+    """Parse the [[schedules]] config, raises ValueError for invalid entries"""
+    default_chat_id = config.get('telegram', {}).get('chat_id')
+    schedules = []
+    names = set()
+    for entry in config.get('schedules', []):
+        name = entry.get('name')
+        command = entry.get('command', '')
+        if not name or name in names:
+            raise ValueError(f"Schedule needs a unique name: {entry}")
+        if command.split(' ', 1)[0] not in tasks:
+            raise ValueError(f"Schedule {name}: unknown command {command!r}")
+        if ('cron' in entry) == ('every' in entry):
+            raise ValueError(f"Schedule {name}: set either cron or every")
+        
+        cron = CronExpression(entry['cron']) if 'cron' in entry else None
+        every = parse_duration(entry['every']) if 'every' in entry else None
+        if every is not None and every <= 0:
+            raise ValueError(f"Schedule {name}: every must be positive")
+        params = entry.get('params', {})
+        definition = json.dumps({
+            'command': command,
+            'params': params,
+            'cron': cron.expression if cron else None,
+            'every': every,
+        }, sort_keys=True)
+        
+        names.add(name)
+        schedules.append(Schedule(
+            name=name,
+            command=command,
+            params=params,
+            cron=cron,
+            every=every,
+            jitter=parse_duration(entry.get('jitter', 0)),
+            chat_id=entry.get('chat_id', default_chat_id),
+            definition=definition,
+        ))
+    return schedules
+
+
+class JobScheduler:
+    """
+    Queues the jobs of recurring schedules
+    
+    Next run times are kept in the ``schedules`` table, so they survive
+    restarts; a run missed while the bot was down is made up once at
+    start. Runs are queued through JobDispatcher like user commands and
+    delivered to the schedule's chat. A run that comes due while the
+    previous run of the same schedule is still queued or running is
+    skipped. Taking a run is a conditional update of its next run time,
+    so bot instances sharing MariaDB never queue the same run twice.
+    """
+    
+    def __init__(self, dispatcher: JobDispatcher, config: dict):
+        self.dispatcher = dispatcher
+        self.job_store = dispatcher.job_store
+        self.schedules = load_schedules(config, dispatcher.tasks)
+        self.poll_interval = config.get('scheduler', {}).get('poll_interval', 30)
+    
+    async def run_forever(self):
+        """Queue due runs until cancelled"""
+        if not self.schedules:
+            return
+        logger.info(f"Scheduler started: {', '.join(s.name for s in self.schedules)}")
+        while True:
+            try:
+                delay = await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler run failed: {e}")
+                delay = self.poll_interval
+            await asyncio.sleep(delay)
+    
+    async def run_due(self) -> float:
+        """Queue the runs that are due, returns seconds until the next one"""
+        rows = await self.job_store.list_schedules()
+        now = datetime.now()
+        next_due = now + timedelta(seconds=self.poll_interval)
+        for schedule in self.schedules:
+            row = rows.get(schedule.name)
+            if row is None or row['definition'] != schedule.definition:
+                row = await self._reset(schedule, row, now)
+                if row is None:
+                    # Another instance got there first
+                    continue
+            
+            next_run = from_db_timestamp(row['next_run_at']).astimezone().replace(tzinfo=None)
+            if next_run <= now:
+                next_run = await self._run(schedule, row, now)
+            next_due = min(next_due, next_run)
+        return max((next_due - datetime.now()).total_seconds(), 0.1)
+    
+    async def _reset(self, schedule: Schedule, row: Optional[Dict[str, Any]], now: datetime):
+        """Store a new or changed schedule with its first run time"""
+        fresh = {
+            'name': schedule.name,
+            'definition': schedule.definition,
+            'next_run_at': to_db_timestamp(schedule.next_run(now)),
+            'updated_at': utc_now(),
+        }
+        saved = await self.job_store.save_schedule(fresh, row['next_run_at'] if row else None)
+        if not saved:
+            return None
+        logger.info(f"Schedule {schedule.name}: next run at {fresh['next_run_at']}")
+        return {**(row or {}), **fresh}
+    
+    async def _run(self, schedule: Schedule, row: Dict[str, Any], now: datetime) -> datetime:
+        """Take a due run and queue its job, returns the next run time"""
+        next_run = schedule.next_run(now)
+        update = {
+            'name': schedule.name,
+            'next_run_at': to_db_timestamp(next_run),
+            'last_run_at': utc_now(),
+            'updated_at': utc_now(),
+        }
+        if not await self.job_store.save_schedule(update, row['next_run_at']):
+            # Taken by another instance
+            return next_run
+        
+        previous = row.get('last_job_id') and await self.job_store.get_job(row['last_job_id'])
+        if previous and previous['status'] not in TERMINAL_STATUSES:
+            logger.warning(
+                f"Schedule {schedule.name}: previous run {previous['id']} is still "
+                f"{previous['status']}, skipping this run"
+            )
+            return next_run
+        
+        metadata = {'schedule': schedule.name}
+        if schedule.chat_id:
+            metadata['chat_id'] = schedule.chat_id
+        job_id = await self.dispatcher.submit(schedule.command, schedule.params, metadata)
+        await self.job_store.save_schedule(
+            {'name': schedule.name, 'last_job_id': job_id, 'updated_at': utc_now()},
+            update['next_run_at'],
+        )
+        logger.info(f"Schedule {schedule.name}: queued job {job_id}, next run at {update['next_run_at']}")
+        return next_run
@@ -0,0 +1,535 @@
+"""Job storage backends"""
+
+import logging
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.jobs.db_pool import MariaDBConnectionPool, SQLiteConnectionPool
+from src.jobs.migrations import apply_migrations
+
+logger = logging.getLogger(__name__)
+
+# Columns that update_job() may change
+UPDATABLE_COLUMNS = (
+    'status',
+    'updated_at',
+    'completed_at',
+    'logs_path',
+    'report_path',
+    'error_message',
+    'metadata',
+    'lease_owner',
+    'lease_expires_at',
+)
+
+# Columns of a schedules row, see JobScheduler
+SCHEDULE_COLUMNS = (
+    'name',
+    'definition',
+    'next_run_at',
+    'last_run_at',
+    'last_job_id',
+    'updated_at',
+)
+
+# Columns of a job_events row, see JobManager for how they are filled
+EVENT_COLUMNS = (
+    'job_id',
+    'command_type',
+    'from_status',
+    'to_status',
+    'created_at',
+    'elapsed_ms',
+)
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with prefix"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class JobStore(ABC):
+    """Storage interface used by JobManager"""
+    
+    dialect = ''
+    
+    @abstractmethod
+    def migrate(self) -> int:
+        """Apply pending schema migrations, returns the schema version"""
+    
+    @abstractmethod
+    def insert_job(self, job: Dict[str, Any], events: Sequence[Dict[str, Any]] = ()):
+        """Insert a new job row, and its lifecycle events in the same transaction"""
+    
+    @abstractmethod
+    def update_job(
+        self,
+        job_id: str,
+        fields: Dict[str, Any],
+        events: Sequence[Dict[str, Any]] = (),
+        expected: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        """
+        Update columns of a job
+        
+        ``expected`` maps columns to the values they must still have for
+        the update to apply. Returns False if no row was updated.
+        """
+    
+    @abstractmethod
+    def update_jobs(self, updates: Dict[str, Dict[str, Any]], events: Sequence[Dict[str, Any]] = ()):
+        """Apply updates of several jobs (job_id -> fields) in one transaction"""
+    
+    @abstractmethod
+    def claim_job(
+        self,
+        owner: str,
+        now: str,
+        lease_until: str,
+        starved_before: Optional[str] = None,
+        on_claim: Optional[Callable[[Dict[str, Any]], Sequence[Dict[str, Any]]]] = None,
+        command_types: Optional[Sequence[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Take the next pending job and lease it to owner
+        
+        Jobs created before ``starved_before`` go first, oldest first, so
+        low priorities cannot starve; otherwise the highest priority wins,
+        then the oldest. ``command_types`` limits the claim to those types.
+        ``on_claim`` gets the row as it was before the claim and returns
+        lifecycle events to append in the same transaction. Returns the
+        claimed row, or None if no matching job is pending.
+        """
+    
+    @abstractmethod
+    def count_pending(self) -> Dict[str, int]:
+        """Number of pending jobs per command type"""
+    
+    @abstractmethod
+    def renew_leases(self, owner: str, job_ids: Sequence[str], lease_until: str) -> int:
+        """Extend the leases owner holds on running jobs, returns how many"""
+    
+    @abstractmethod
+    def list_expired_leases(self, now: str, limit: int) -> List[Dict[str, Any]]:
+        """Running jobs whose lease expired before now"""
+    
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job row by ID"""
+    
+    @abstractmethod
+    def find_jobs_by_id_prefix(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """Get up to limit jobs whose ID starts with prefix"""
+    
+    @abstractmethod
+    def list_jobs(
+        self,
+        limit: int,
+        status: Optional[str] = None,
+        command_prefix: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        List jobs newest first, ordered by (created_at, id)
+        
+        ``after`` is the (created_at, id) key of the last row of the previous
+        page; rows strictly older than it are returned.
+        """
+    
+    @abstractmethod
+    def latency_percentiles(self, since: str, percentiles: Sequence[int]) -> List[Dict[str, Any]]:
+        """
+        Nearest-rank percentiles of queue and run latency since a timestamp
+        
+        Queue latency is pending -> running, run latency is running -> a
+        terminal status (not a requeue). Returns one row of command_type,
+        kind ('queue'/'run'), count, percentile and elapsed_ms per command
+        type, kind and percentile, computed in the database.
+        """
+    
+    @abstractmethod
+    def delete_jobs_before(self, cutoff: str, limit: int) -> int:
+        """
+        Delete up to limit of the oldest jobs created before cutoff
+        
+        Returns the number of rows deleted; callers loop until it is below
+        limit, so each transaction stays short.
+        """
+    
+    @abstractmethod
+    def list_schedules(self) -> Dict[str, Dict[str, Any]]:
+        """All schedule rows by name"""
+    
+    @abstractmethod
+    def save_schedule(self, schedule: Dict[str, Any], expected_next_run: Optional[str] = None) -> bool:
+        """
+        Insert or update a schedule row
+        
+        Without ``expected_next_run`` the row is inserted unless it exists;
+        with it the row is updated only if its next_run_at still has that
+        value, so of several instances only one starts a run. Returns
+        False if nothing was written.
+        """
+    
+    @abstractmethod
+    def close(self):
+        """Release all database resources"""
+
+
+class SQLJobStore(JobStore):
+    """
+    Job store on top of a connection pool
+
+    Queries use ``?`` placeholders and portable SQL, so the same
+    implementation serves SQLite and MariaDB; the pools hide the driver
+    differences.
+    """
+    
+    def __init__(self, pool):
+        self.pool = pool
+    
+    def migrate(self) -> int:
+        """Apply pending schema migrations"""
+        return apply_migrations(self.pool, self.dialect)
+    
+    def insert_job(self, job: Dict[str, Any], events: Sequence[Dict[str, Any]] = ()):
+        columns = ', '.join(job.keys())
+        placeholders = ', '.join('?' for _ in job)
+        with self.pool.transaction() as conn:
+            conn.execute(
+                f"INSERT INTO jobs ({columns}) VALUES ({placeholders})",
+                tuple(job.values())
+            )
+            self._insert_events(conn, events)
+    
+    @staticmethod
+    def _insert_events(conn, events: Sequence[Dict[str, Any]]):
+        """Append lifecycle events inside an open transaction"""
+        for event in events:
+            conn.execute(
+                f"INSERT INTO job_events ({', '.join(EVENT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in EVENT_COLUMNS)})",
+                tuple(event.get(c) for c in EVENT_COLUMNS)
+            )
+    
+    @staticmethod
+    def _update_statement(job_id: str, fields: Dict[str, Any]):
+        """Build the UPDATE statement for one job"""
+        unknown = set(fields) - set(UPDATABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot update job columns: {', '.join(sorted(unknown))}")
+        
+        # Fixed column order keeps the number of distinct statements small,
+        # so they stay in the prepared statement cache
+        columns = [c for c in UPDATABLE_COLUMNS if c in fields]
+        assignments = ', '.join(f"{c} = ?" for c in columns)
+        params = [fields[c] for c in columns] + [job_id]
+        return f"UPDATE jobs SET {assignments} WHERE id = ?", params
+    
+    def update_job(
+        self,
+        job_id: str,
+        fields: Dict[str, Any],
+        events: Sequence[Dict[str, Any]] = (),
+        expected: Optional[Dict[str, Any]] = None,
+    ) -> bool:
+        query, params = self._update_statement(job_id, fields)
+        for column, value in (expected or {}).items():
+            if column not in UPDATABLE_COLUMNS:
+                raise ValueError(f"Cannot compare job column: {column}")
+            query += f" AND {column} = ?"
+            params.append(value)
+        
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(query, params)
+            if cursor.rowcount == 0:
+                return False
+            self._insert_events(conn, events)
+            return True
+    
+    def update_jobs(self, updates: Dict[str, Dict[str, Any]], events: Sequence[Dict[str, Any]] = ()):
+        statements = [self._update_statement(job_id, fields) for job_id, fields in updates.items()]
+        with self.pool.transaction() as conn:
+            for query, params in statements:
+                conn.execute(query, params)
+            self._insert_events(conn, events)
+    
+    def claim_job(
+        self,
+        owner: str,
+        now: str,
+        lease_until: str,
+        starved_before: Optional[str] = None,
+        on_claim: Optional[Callable[[Dict[str, Any]], Sequence[Dict[str, Any]]]] = None,
+        command_types: Optional[Sequence[str]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        type_filter = ""
+        type_params: List[Any] = []
+        if command_types:
+            type_filter = f" AND command_type IN ({', '.join('?' for _ in command_types)})"
+            type_params = list(command_types)
+        
+        # Another instance may take the selected row first; the conditional
+        # UPDATE detects that and the next transaction picks another row
+        for _ in range(5):
+            with self.pool.transaction() as conn:
+                row = None
+                if starved_before:
+                    row = conn.execute(
+                        f"SELECT * FROM jobs WHERE status = 'pending' AND created_at < ?{type_filter} "
+                        f"ORDER BY created_at, id LIMIT 1",
+                        [starved_before, *type_params]
+                    ).fetchone()
+                if not row:
+                    row = conn.execute(
+                        f"SELECT * FROM jobs WHERE status = 'pending'{type_filter} "
+                        f"ORDER BY priority DESC, created_at, id LIMIT 1",
+                        type_params
+                    ).fetchone()
+                if not row:
+                    return None
+                
+                job = dict(row)
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires_at = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE id = ? AND status = 'pending'",
+                    (owner, lease_until, now, job['id'])
+                )
+                if cursor.rowcount == 0:
+                    continue
+                
+                if on_claim:
+                    self._insert_events(conn, on_claim(job))
+                
+                job.update({
+                    'status': 'running',
+                    'lease_owner': owner,
+                    'lease_expires_at': lease_until,
+                    'attempts': job['attempts'] + 1,
+                    'updated_at': now,
+                })
+                return job
+        return None
+    
+    def count_pending(self) -> Dict[str, int]:
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                "SELECT command_type, COUNT(*) AS pending FROM jobs WHERE status = 'pending' "
+                "GROUP BY command_type"
+            )
+            return {row['command_type']: row['pending'] for row in cursor.fetchall()}
+    
+    def renew_leases(self, owner: str, job_ids: Sequence[str], lease_until: str) -> int:
+        if not job_ids:
+            return 0
+        placeholders = ', '.join('?' for _ in job_ids)
+        with self.pool.transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET lease_expires_at = ? WHERE lease_owner = ? AND status = 'running' "
+                f"AND id IN ({placeholders})",
+                [lease_until, owner, *job_ids]
+            )
+            return cursor.rowcount
+    
+    def list_expired_leases(self, now: str, limit: int) -> List[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'running' AND lease_expires_at < ? "
+                "ORDER BY lease_expires_at LIMIT ?",
+                (now, limit)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return dict(row) if row else None
+    
+    def find_jobs_by_id_prefix(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        # A range on the primary key instead of LIKE, so it is an index seek
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                "SELECT * FROM jobs WHERE id >= ? AND id < ? ORDER BY id LIMIT ?",
+                (prefix, _prefix_upper_bound(prefix), limit)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def list_jobs(
+        self,
+        limit: int,
+        status: Optional[str] = None,
+        command_prefix: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+    ) -> List[Dict[str, Any]]:
+        conditions = []
+        params: List[Any] = []
+        
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        
+        if command_prefix:
+            # A range on the indexed command column, so a partial command
+            # name (cmd:build) matches too
+            conditions.append("command >= ? AND command < ?")
+            params.extend([command_prefix, _prefix_upper_bound(command_prefix)])
+        
+        if since:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        
+        if until:
+            conditions.append("created_at < ?")
+            params.append(until)
+        
+        if after:
+            # Keyset condition written so that created_at stays an index range
+            created_at, job_id = after
+            conditions.append("created_at <= ? AND (created_at < ? OR id < ?)")
+            params.extend([created_at, created_at, job_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                params
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def latency_percentiles(self, since: str, percentiles: Sequence[int]) -> List[Dict[str, Any]]:
+        wanted = ' UNION ALL '.join('SELECT ? AS percentile' for _ in percentiles)
+        with self.pool.connection() as conn:
+            # The nearest rank of p is the smallest position with
+            # position * 100 >= count * p; integer arithmetic, so the same
+            # on SQLite and MariaDB. Only a few rows per command type leave
+            # the database
+            cursor = conn.execute(
+                f"""
+                WITH samples AS (
+                    SELECT command_type,
+                           CASE WHEN from_status = 'pending' THEN 'queue' ELSE 'run' END AS kind,
+                           elapsed_ms
+                    FROM job_events
+                    WHERE created_at >= ? AND elapsed_ms IS NOT NULL AND (
+                        (from_status = 'pending' AND to_status = 'running')
+                        OR (from_status = 'running' AND to_status IN ('completed', 'failed', 'cancelled'))
+                    )
+                ), ranked AS (
+                    SELECT command_type, kind, elapsed_ms,
+                           ROW_NUMBER() OVER (PARTITION BY command_type, kind ORDER BY elapsed_ms) AS position,
+                           COUNT(*) OVER (PARTITION BY command_type, kind) AS total
+                    FROM samples
+                ), wanted AS ({wanted})
+                SELECT ranked.command_type, ranked.kind, ranked.total AS count,
+                       wanted.percentile, ranked.elapsed_ms
+                FROM ranked JOIN wanted
+                    ON ranked.position * 100 >= ranked.total * wanted.percentile
+                    AND (ranked.position - 1) * 100 < ranked.total * wanted.percentile
+                """,
+                (since, *percentiles)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def delete_jobs_before(self, cutoff: str, limit: int) -> int:
+        with self.pool.transaction() as conn:
+            # Select then delete by key: portable, and DELETE ... LIMIT is
+            # not available in every SQLite build
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE created_at < ? ORDER BY created_at LIMIT ?",
+                (cutoff, limit)
+            ).fetchall()
+            if not rows:
+                return 0
+            
+            ids = [row['id'] for row in rows]
+            placeholders = ', '.join('?' for _ in ids)
+            conn.execute(f"DELETE FROM job_events WHERE job_id IN ({placeholders})", ids)
+            cursor = conn.execute(f"DELETE FROM jobs WHERE id IN ({placeholders})", ids)
+            return cursor.rowcount
+    
+    def list_schedules(self) -> Dict[str, Dict[str, Any]]:
+        with self.pool.connection() as conn:
+            cursor = conn.execute("SELECT * FROM schedules")
+            return {row['name']: dict(row) for row in cursor.fetchall()}
+    
+    def save_schedule(self, schedule: Dict[str, Any], expected_next_run: Optional[str] = None) -> bool:
+        unknown = set(schedule) - set(SCHEDULE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown schedule columns: {', '.join(sorted(unknown))}")
+        
+        with self.pool.transaction() as conn:
+            if expected_next_run is None:
+                if conn.execute("SELECT name FROM schedules WHERE name = ?", (schedule['name'],)).fetchone():
+                    return False
+                columns = [c for c in SCHEDULE_COLUMNS if c in schedule]
+                conn.execute(
+                    f"INSERT INTO schedules ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                    [schedule[c] for c in columns]
+                )
+                return True
+            
+            columns = [c for c in SCHEDULE_COLUMNS if c in schedule and c != 'name']
+            cursor = conn.execute(
+                f"UPDATE schedules SET {', '.join(f'{c} = ?' for c in columns)} "
+                f"WHERE name = ? AND next_run_at = ?",
+                [schedule[c] for c in columns] + [schedule['name'], expected_next_run]
+            )
+            return cursor.rowcount > 0
+    
+    def close(self):
+        self.pool.close_all()
+
+
+class SQLiteJobStore(SQLJobStore):
+    """Job store in a local SQLite database"""
+    
+    dialect = 'sqlite'
+    
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000, synchronous: str = "NORMAL"):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(SQLiteConnectionPool(
+            db_path,
+            busy_timeout_ms=busy_timeout_ms,
+            synchronous=synchronous,
+        ))
+
+
+class MariaDBJobStore(SQLJobStore):
+    """Job store in a MariaDB/MySQL database, shareable by several bot instances"""
+    
+    dialect = 'mysql'
+    
+    def __init__(self, connection_string: str, pool_size: int = 8, acquire_timeout: float = 10.0):
+        super().__init__(MariaDBConnectionPool(
+            connection_string,
+            pool_size=pool_size,
+            acquire_timeout=acquire_timeout,
+        ))
+
+
+def create_job_store(config: dict) -> SQLJobStore:
+    """Create the job store configured in [database]"""
+    db_config = config.get('database', {})
+    db_type = db_config.get('type', 'sqlite')
+    
+    if db_type == 'sqlite':
+        return SQLiteJobStore(
+            db_config.get('sqlite_path', '/opt/autobuilder/storage/jobs.db'),
+            busy_timeout_ms=db_config.get('sqlite_busy_timeout_ms', 5000),
+            synchronous=db_config.get('sqlite_synchronous', 'NORMAL'),
+        )
+    elif db_type in ('mariadb', 'mysql'):
+        return MariaDBJobStore(
+            db_config.get('connection_string', ''),
+            pool_size=db_config.get('pool_size', 8),
+            acquire_timeout=db_config.get('pool_timeout', 10.0),
+        )
+    else:
+        raise ValueError(f"Unsupported database type: {db_type}")
@@ -0,0 +1,113 @@
+"""Write-behind batching of job updates"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Coalesces job updates into group commits
+
+    Updates are merged per job in memory (later values win) and written by
+    a background thread in one transaction per window, so the several
+    status changes of a job cost one commit (and one fsync) instead of
+    one each. Lifecycle events are appended in the same transaction.
+    ``flush()`` writes everything queued so far before it returns, which
+    gives read-your-writes to the caller.
+    """
+    
+    def __init__(self, store, window_ms: int = 20, max_batch: int = 512):
+        self.store = store
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name="job-write-behind",
+            daemon=True,
+        )
+        self._thread.start()
+    
+    def submit(self, job_id: str, fields: Dict[str, Any], event: Optional[Dict[str, Any]] = None):
+        """Queue an update of job columns, and optionally a lifecycle event"""
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError("Write-behind queue is stopped")
+            self._pending.setdefault(job_id, {}).update(fields)
+            if event:
+                self._events.append(event)
+            pending_count = len(self._pending)
+        
+        self._wakeup.set()
+        if pending_count >= self.max_batch:
+            self.flush()
+    
+    def has_pending(self, job_id: str = None) -> bool:
+        """Whether updates (of one job, or of any job) are not yet committed"""
+        with self._lock:
+            if job_id is None:
+                return bool(self._pending or self._inflight)
+            return job_id in self._pending or job_id in self._inflight
+    
+    def flush(self):
+        """Commit all queued updates now"""
+        # Holding the flush lock also waits for a batch the background
+        # thread is writing, so nothing queued before this call is lost
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                events, self._events = self._events, []
+                self._inflight = batch
+            
+            if not batch:
+                return
+            
+            try:
+                self.store.update_jobs(batch, events)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} queued job updates: {e}")
+                # Re-queue without overwriting newer values
+                with self._lock:
+                    for job_id, fields in batch.items():
+                        self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+                    self._events[:0] = events
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = {}
+    
+    def _run(self):
+        """Background loop: wait for updates, collect a window, commit"""
+        while True:
+            self._wakeup.wait()
+            if self._stopped:
+                return
+            
+            # Let more updates arrive to share the commit
+            time.sleep(self.window)
+            self._wakeup.clear()
+            
+            try:
+                self.flush()
+            except Exception:
+                # Already logged; retry on the next window
+                self._wakeup.set()
+                time.sleep(1.0)
+    
+    def stop(self):
+        """Stop the background thread and commit what is left"""
+        with self._lock:
+            self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self.flush()
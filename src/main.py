@@ -12,14 +12,19 @@ from pathlib import Path
 
 # Import telegram bot library FIRST (before adding src to path to avoid module conflict)
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, ContextTypes
 
 # Add project root to Python path AFTER importing telegram library
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
 # Now import our modules (using full path)
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.dispatcher import JobDispatcher
 from src.jobs.job_manager import JobManager
+from src.jobs.retention import RetentionService
+from src.jobs.scheduler import JobScheduler
+from src.telegram.delivery import ResultDelivery
 from src.telegram.handlers import (
     handle_start,
     handle_help,
@@ -28,9 +33,12 @@ from src.telegram.handlers import (
     handle_build_weather_apk,
     handle_ddos,
     handle_jobs,
+    handle_jobs_page,
     handle_job,
     handle_cancel,
+    handle_stats,
 )
+from src.tasks.registry import TASKS
 from src.utils.config import load_config
 
 # Setup logging
@@ -62,6 +70,11 @@ logger = logging.getLogger(__name__)
 # Global application instance
 application = None
 job_manager = None
+job_store = None
+dispatcher = None
+retention_task = None
+scheduler = None
+scheduler_task = None
 
 
 def signal_handler(signum, frame):
@@ -69,6 +82,8 @@ def signal_handler(signum, frame):
     logger.info(f"Received signal {signum}, shutting down...")
     if application:
         asyncio.create_task(application.stop())
+    if job_store:
+        job_store.shutdown()
     if job_manager:
         job_manager.shutdown()
     sys.exit(0)
@@ -76,9 +91,22 @@ def signal_handler(signum, frame):
 
 async def post_init(app: Application) -> None:
     """Post-initialization tasks"""
+    global retention_task, scheduler_task
     logger.info("AutoBuilder Bot started successfully")
-    # Send startup notification if configured
     config = load_config()
+    
+    # Recover jobs interrupted by the last shutdown and start the workers;
+    # results are sent to the chats the jobs came from
+    dispatcher.add_listener(ResultDelivery(app.bot, dispatcher).deliver)
+    await dispatcher.start()
+    
+    # Start background retention of old jobs, reports and workspaces
+    retention_task = asyncio.create_task(RetentionService(job_store, config).run_forever())
+    
+    # Start queueing the recurring jobs of [[schedules]]
+    scheduler_task = asyncio.create_task(scheduler.run_forever())
+    
+    # Send startup notification if configured
     if config.get('telegram', {}).get('chat_id'):
         try:
             await app.bot.send_message(
@@ -92,11 +120,23 @@ async def post_init(app: Application) -> None:
 async def post_shutdown(app: Application) -> None:
     """Post-shutdown cleanup"""
     logger.info("AutoBuilder Bot shutting down...")
+    if retention_task:
+        retention_task.cancel()
+    if scheduler_task:
+        scheduler_task.cancel()
+    if dispatcher:
+        await dispatcher.stop()
+    # run_polling() handles SIGINT/SIGTERM itself, so signal_handler does
+    # not run: wait for pending database calls, then flush and close
+    if job_store:
+        job_store.shutdown()
+    if job_manager:
+        job_manager.shutdown()
 
 
 def main():
     """Main entry point"""
-    global application, job_manager
+    global application, job_manager, job_store, dispatcher, scheduler
     
     # Load configuration
     try:
@@ -108,6 +148,12 @@ def main():
     # Initialize job manager
     try:
         job_manager = JobManager(config)
+        job_store = AsyncJobStore(
+            job_manager,
+            max_workers=config.get('database', {}).get('async_workers', 4),
+        )
+        dispatcher = JobDispatcher(job_store, config, TASKS)
+        scheduler = JobScheduler(dispatcher, config)
         logger.info("Job manager initialized")
     except Exception as e:
         logger.error(f"Failed to initialize job manager: {e}")
@@ -127,18 +173,29 @@ def main():
         logger.error("Example: sudo nano /etc/autobuilder/config.toml")
         sys.exit(1)
     
-    application = Application.builder().token(bot_token).post_init(post_init).post_shutdown(post_shutdown).build()
+    # Handlers only queue jobs, but several updates are still handled at once
+    # so a slow reply (e.g. /jobs) never holds up the others
+    application = (
+        Application.builder()
+        .token(bot_token)
+        .concurrent_updates(telegram_config.get('concurrent_updates', 32))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Register command handlers
-    application.add_handler(CommandHandler("start", lambda u, c: handle_start(u, c, job_manager)))
-    application.add_handler(CommandHandler("help", lambda u, c: handle_help(u, c, job_manager)))
-    application.add_handler(CommandHandler("status", lambda u, c: handle_status(u, c, job_manager)))
-    application.add_handler(CommandHandler("audit_site", lambda u, c: handle_audit_site(u, c, job_manager)))
-    application.add_handler(CommandHandler("build_weather_apk", lambda u, c: handle_build_weather_apk(u, c, job_manager)))
-    application.add_handler(CommandHandler("ddos", lambda u, c: handle_ddos(u, c, job_manager)))
-    application.add_handler(CommandHandler("jobs", lambda u, c: handle_jobs(u, c, job_manager)))
-    application.add_handler(CommandHandler("job", lambda u, c: handle_job(u, c, job_manager)))
-    application.add_handler(CommandHandler("cancel", lambda u, c: handle_cancel(u, c, job_manager)))
+    application.add_handler(CommandHandler("start", lambda u, c: handle_start(u, c, job_store)))
+    application.add_handler(CommandHandler("help", lambda u, c: handle_help(u, c, job_store)))
+    application.add_handler(CommandHandler("status", lambda u, c: handle_status(u, c, dispatcher)))
+    application.add_handler(CommandHandler("audit_site", lambda u, c: handle_audit_site(u, c, dispatcher)))
+    application.add_handler(CommandHandler("build_weather_apk", lambda u, c: handle_build_weather_apk(u, c, dispatcher)))
+    application.add_handler(CommandHandler("ddos", lambda u, c: handle_ddos(u, c, dispatcher)))
+    application.add_handler(CommandHandler("jobs", lambda u, c: handle_jobs(u, c, job_store)))
+    application.add_handler(CallbackQueryHandler(lambda u, c: handle_jobs_page(u, c, job_store), pattern=r"^jobs:"))
+    application.add_handler(CommandHandler("job", lambda u, c: handle_job(u, c, job_store)))
+    application.add_handler(CommandHandler("cancel", lambda u, c: handle_cancel(u, c, dispatcher)))
+    application.add_handler(CommandHandler("stats", lambda u, c: handle_stats(u, c, dispatcher)))
     
     # Start bot
     use_webhook = config.get('telegram', {}).get('use_webhook', False)
@@ -1,22 +1,149 @@
 """Build Android APK task"""
 
+import hashlib
+import json
+import logging
+import re
+import shutil
 import subprocess
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
 
+from src.jobs.job_manager import RESULT_METADATA_KEY
+from src.tasks.build_cache import (
+    GRADLE_CACHE,
+    PUB_CACHE,
+    ArtifactStore,
+    FlutterTemplateCache,
+    SharedBuildCaches,
+    clone_tree,
+    flutter_sdk_version,
+)
+from src.tasks.pipeline import Pipeline, Step
 from src.utils.markdown import MarkdownReport
 from src.utils.shell import ShellRunner
 from src.tasks.github_push import GitHubPusher
 
+logger = logging.getLogger(__name__)
+
+# Generated while building, at any depth; not part of the pushed source
+BUILD_OUTPUTS = ('build', '.dart_tool')
+FLUTTER_ORG = 'com.autobuilder'
+FLUTTER_PROJECT_NAME = 'weather_app'
+BUILD_APK_COMMAND = "build apk --release"
+# Where flutter puts the release APK, relative to the project
+APK_OUTPUTS = (
+    Path("build/app/outputs/flutter-apk/app-release.apk"),
+    Path("build/app/outputs/apk/release/app-release.apk"),
+)
+# Part of the artifact key: bump when the build steps change what an
+# APK is made of in a way the other inputs do not show
+BUILD_RECIPE_VERSION = 1
+# ABIs that flutter build apk --split-per-abi makes an APK for
+SPLIT_ABIS = ('armeabi-v7a', 'arm64-v8a', 'x86_64')
+
+DEFAULT_CITY = "Tashkent"
+DEFAULT_LANGUAGE = "en"
+# Texts of the generated app, by language
+WEATHER_LABELS = {
+    'en': {
+        'app_title': 'Weather App',
+        'title': 'Weather',
+        'condition': 'Sunny',
+        'humidity': 'Humidity',
+        'wind': 'Wind',
+        'wind_speed': '10 km/h',
+        'refresh': 'Refresh',
+    },
+    'uz': {
+        'app_title': 'Ob-havo',
+        'title': 'Ob-havo',
+        'condition': 'Quyoshli',
+        'humidity': 'Namlik',
+        'wind': 'Shamol',
+        'wind_speed': '10 km/soat',
+        'refresh': 'Yangilash',
+    },
+    'ru': {
+        'app_title': 'Погода',
+        'title': 'Погода',
+        'condition': 'Солнечно',
+        'humidity': 'Влажность',
+        'wind': 'Ветер',
+        'wind_speed': '10 км/ч',
+        'refresh': 'Обновить',
+    },
+}
+# Letters, digits, spaces, dots and hyphens: safe in Dart strings and paths
+CITY_PATTERN = re.compile(r"^\w[\w .-]{0,39}$")
+DEFAULT_MATRIX_MAX_VARIANTS = 24
+
+
+def weather_matrix(
+    cities: Optional[Sequence[str]],
+    languages: Optional[Sequence[str]],
+    max_variants: int = DEFAULT_MATRIX_MAX_VARIANTS,
+) -> Tuple[List[str], List[str]]:
+    """Validated cities and languages of a build, duplicates removed"""
+    cities = list(dict.fromkeys(city.strip() for city in cities or [DEFAULT_CITY] if city.strip()))
+    languages = list(dict.fromkeys(language.strip().lower() for language in languages or [DEFAULT_LANGUAGE]))
+    for city in cities:
+        if not CITY_PATTERN.match(city):
+            raise ValueError(f"Invalid city name: {city}")
+    unknown = [language for language in languages if language not in WEATHER_LABELS]
+    if unknown:
+        raise ValueError(f"Unsupported languages: {', '.join(unknown)} (supported: {', '.join(WEATHER_LABELS)})")
+    if not cities or len(cities) * len(languages) > max_variants:
+        raise ValueError(f"A build has 1 to {max_variants} variants, got {len(cities) * len(languages)}")
+    return cities, languages
+
+
+def variant_name(city: str, language: str) -> str:
+    """Directory and file name part of a matrix variant"""
+    slug = re.sub(r'[^\w.-]+', '_', city.lower()).strip('_')
+    return f"{slug}-{language}"
+
 
 class BuildWeatherApkTask:
-    """Build a weather app APK"""
+    """
+    Build a weather app APK
     
-    def __init__(self, config: dict):
+    With more than one city or language, or with ``split_per_abi``, the
+    task builds a matrix: the project is created and its dependencies
+    fetched once, then every variant gets a clone of it with its own
+    main.dart and is built, ``[build] matrix_parallel`` at a time.
+    """
+    
+    def __init__(
+        self,
+        config: dict,
+        cities: Optional[Sequence[str]] = None,
+        languages: Optional[Sequence[str]] = None,
+        split_per_abi: bool = False,
+    ):
         self.config = config
+        build_config = config.get('build', {})
+        self.cities, self.languages = weather_matrix(
+            cities,
+            languages,
+            build_config.get('matrix_max_variants', DEFAULT_MATRIX_MAX_VARIANTS),
+        )
+        self.split_per_abi = split_per_abi
+        self.matrix_parallel = max(1, build_config.get('matrix_parallel', 2))
         self.shell = ShellRunner(timeout=1800)  # 30 minutes
         self.flutter_path = config.get('build', {}).get('flutter_path', 'flutter')
         self.github_pusher = GitHubPusher(config)
+        self.template_cache = None
+        if config.get('build', {}).get('template_cache', True):
+            self.template_cache = FlutterTemplateCache(config, self.shell)
+        self.build_caches = None
+        if config.get('build', {}).get('shared_caches', True):
+            self.build_caches = SharedBuildCaches(config)
+        self.artifacts = None
+        if config.get('build', {}).get('artifact_cache', True):
+            self.artifacts = ArtifactStore(config)
     
     def execute(
         self,
@@ -28,95 +155,373 @@ class BuildWeatherApkTask:
         language: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Execute build task"""
+        if self.split_per_abi or len(self.cities) * len(self.languages) > 1:
+            return self._execute_matrix(job_id, workspace_dir, report_path)
+        
         report = MarkdownReport("Weather App Build Report")
         
-        city = city or "Tashkent"
-        language = language or "en"
+        city = city or self.cities[0]
+        language = language or self.languages[0]
         
         app_dir = Path(workspace_dir) / "app"
+        source_dir = Path(workspace_dir) / "source"
+        branch = self.config.get('github', {}).get('branch', 'myself')
+        
+        artifact_key = None
+        if self.artifacts:
+            try:
+                artifact_key = self._artifact_key(city, language)
+                cached = self.artifacts.fetch(artifact_key, app_dir / APK_OUTPUTS[0])
+            except Exception as e:
+                # The cache never fails a build; build from scratch instead
+                logger.warning(f"Artifact cache lookup failed: {e}")
+                artifact_key = cached = None
+            if cached:
+                apk_path = app_dir / APK_OUTPUTS[0]
+                return self._cached_result(report, report_path, apk_path, artifact_key, cached, city, language)
+        
+        # The push only needs the generated code, so it runs next to the
+        # APK build, from a copy of the code: pub and Gradle write into
+        # app_dir while it builds. A re-queued job resumes after its last
+        # finished step
+        pipeline = Pipeline(
+            [
+                Step('create', "Create Flutter project", lambda outputs: self._create_flutter_project(app_dir)),
+                Step(
+                    'generate',
+                    "Generate weather app code",
+                    lambda outputs: self._generate_step(app_dir, source_dir, city, language),
+                    depends=('create',),
+                ),
+                Step(
+                    'build',
+                    "Build Android APK",
+                    lambda outputs: self._build_apk_step(app_dir),
+                    depends=('generate',),
+                ),
+                Step(
+                    'push',
+                    "Push code to GitHub",
+                    lambda outputs: self.github_pusher.push_changes(
+                        str(source_dir),
+                        job_id,
+                        f"[{job_id}] Weather app - {city}",
+                    ),
+                    depends=('generate',),
+                ),
+            ],
+            str(Path(workspace_dir) / "pipeline.json"),
+        )
         
         try:
-            # Step 1: Create Flutter project
-            report.add_checked_item("Create Flutter project")
-            self._create_flutter_project(app_dir)
-            
-            # Step 2: Generate weather app code
-            report.add_checked_item("Generate weather app code")
-            self._generate_weather_app_code(app_dir, city, language)
-            
-            # Step 3: Build APK
-            report.add_checked_item("Build Android APK")
-            apk_path = self._build_apk(app_dir)
-            
-            # Step 4: Push to GitHub
-            report.add_checked_item("Push code to GitHub")
-            github_result = self.github_pusher.push_changes(
-                str(app_dir),
-                job_id,
-                f"[{job_id}] Weather app - {city}"
+            outputs = pipeline.run()
+        except BaseException as e:
+            # JobCancelled too, so the report shows how far the build got
+            for line in pipeline.summary():
+                report.add_checked_item(line)
+            report.set_summary("red", f"❌ Build failed: {str(e)}")
+            report.add_finding('critical', "Build error", str(e))
+            report.save(report_path)
+            raise
+        
+        for line in pipeline.summary():
+            report.add_checked_item(line)
+        
+        github_result = outputs['push']
+        if github_result['success']:
+            report.add_finding(
+                'good',
+                "Code pushed to GitHub",
+                f"Successfully pushed to {branch} branch"
             )
-            
-            if github_result['success']:
-                report.add_finding(
-                    'good',
-                    "Code pushed to GitHub",
-                    f"Successfully pushed to {self.config.get('github', {}).get('branch', 'myself')} branch"
-                )
-            else:
-                report.add_finding(
-                    'warning',
-                    "GitHub push failed",
-                    github_result['message']
-                )
-            
-            # Build summary
-            if apk_path and apk_path.exists():
-                report.set_summary("green", f"✅ APK built successfully!\n\n**Location:** {apk_path}\n**City:** {city}\n**Language:** {language}")
-                report.add_finding(
-                    'good',
-                    "APK build successful",
-                    f"APK file created at {apk_path}"
-                )
-            else:
-                report.set_summary("red", "❌ APK build failed")
-                report.add_finding(
-                    'critical',
-                    "APK build failed",
-                    "APK file was not created"
-                )
-            
+        else:
+            report.add_finding(
+                'warning',
+                "GitHub push failed",
+                github_result['message']
+            )
+        
+        # Build summary
+        build_output = outputs['build']
+        apk_path = Path(build_output['apk_path']) if build_output['apk_path'] else None
+        if apk_path and apk_path.exists():
+            report.set_summary("green", f"✅ APK built successfully!\n\n**Location:** {apk_path}\n**City:** {city}\n**Language:** {language}")
+            report.add_finding(
+                'good',
+                "APK build successful",
+                f"APK file created at {apk_path}"
+            )
+        else:
+            report.set_summary("red", "❌ APK build failed")
+            report.add_finding(
+                'critical',
+                "APK build failed",
+                "APK file was not created"
+            )
+        
+        if build_output.get('caches'):
+            report.add_section("📦 Build Caches", self._cache_summary(build_output))
+        
+        result = {
+            'success': bool(apk_path and apk_path.exists()),
+            'apk_path': str(apk_path) if apk_path else None,
+            'github_pushed': github_result['success'],
+            'steps': pipeline.records,
+        }
+        if artifact_key and result['success']:
+            try:
+                self.artifacts.put(artifact_key, apk_path, job_id)
+            except Exception as e:
+                logger.warning(f"Failed to store the APK in the artifact cache: {e}")
+            report.add_checked_item(f"Artifact cache: miss, APK stored under {artifact_key[:16]}")
+            result[RESULT_METADATA_KEY] = {'artifact_cache': 'miss', 'artifact_key': artifact_key[:16]}
+        
+        report.save(report_path)
+        
+        return result
+    
+    def _artifact_key(self, city: str, language: str, split_per_abi: bool = False) -> str:
+        """
+        Hash of everything the APK is built from
+        
+        The SDK version and project name fix the template and its
+        dependencies, the generated code is the only source the build
+        adds, and the recipe version covers the build steps themselves.
+        """
+        inputs = {
+            'recipe': BUILD_RECIPE_VERSION,
+            'flutter_sdk': flutter_sdk_version(self.flutter_path, self.shell),
+            'org': FLUTTER_ORG,
+            'project_name': FLUTTER_PROJECT_NAME,
+            'main.dart': hashlib.sha256(self._weather_app_code(city, language).encode('utf-8')).hexdigest(),
+            'build_command': self._build_command(split_per_abi),
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+    
+    def _cached_result(
+        self,
+        report: MarkdownReport,
+        report_path: str,
+        apk_path: Path,
+        artifact_key: str,
+        cached: Dict[str, Any],
+        city: str,
+        language: str,
+    ) -> Dict[str, Any]:
+        """Result and report of a build answered by the artifact cache"""
+        report.set_summary(
+            "green",
+            f"✅ APK served from the artifact cache\n\n**Location:** {apk_path}\n"
+            f"**City:** {city}\n**Language:** {language}"
+        )
+        report.add_checked_item(f"Artifact cache: hit ({artifact_key[:16]})")
+        report.add_finding(
+            'good',
+            "APK from artifact cache",
+            f"Same build inputs as job {cached['job_id']} ({cached['created_at']}); the Flutter build was skipped"
+        )
+        report.add_finding(
+            'info',
+            "GitHub push skipped",
+            f"The code is the same as the code job {cached['job_id']} pushed"
+        )
+        report.save(report_path)
+        return {
+            'success': True,
+            'apk_path': str(apk_path),
+            'github_pushed': False,
+            'steps': {},
+            RESULT_METADATA_KEY: {
+                'artifact_cache': 'hit',
+                'artifact_key': artifact_key[:16],
+                'built_by': cached['job_id'],
+            },
+        }
+    
+    def _execute_matrix(self, job_id: str, workspace_dir: str, report_path: str) -> Dict[str, Any]:
+        """Build every city/language variant from one prepared project"""
+        report = MarkdownReport("Weather App Matrix Build Report")
+        app_dir = Path(workspace_dir) / "app"
+        variants_dir = Path(workspace_dir) / "variants"
+        variants = [(city, language) for city in self.cities for language in self.languages]
+        
+        steps = [
+            Step('create', "Create Flutter project", lambda outputs: self._create_flutter_project(app_dir)),
+            Step('prepare', "Get dependencies", lambda outputs: self._get_dependencies(app_dir), depends=('create',)),
+        ]
+        for city, language in variants:
+            name = variant_name(city, language)
+            steps.append(Step(
+                f"variant:{name}",
+                f"Build {city} ({language})",
+                lambda outputs, city=city, language=language, name=name: self._build_variant(
+                    app_dir, variants_dir / name, city, language, job_id
+                ),
+                depends=('prepare',),
+            ))
+        # Only the variant builds run side by side
+        pipeline = Pipeline(steps, str(Path(workspace_dir) / "pipeline.json"), max_parallel=self.matrix_parallel)
+        
+        start = time.monotonic()
+        before = self.build_caches.snapshot() if self.build_caches else None
+        try:
+            outputs = pipeline.run()
+        except BaseException as e:
+            for line in pipeline.summary():
+                report.add_checked_item(line)
+            report.set_summary("red", f"❌ Matrix build failed: {str(e)}")
+            report.add_finding('critical', "Build error", str(e))
             report.save(report_path)
+            raise
+        finally:
+            if self.build_caches:
+                self.build_caches.evict()
+        elapsed = time.monotonic() - start
+        
+        for line in pipeline.summary():
+            report.add_checked_item(line)
+        
+        results = [outputs[f"variant:{variant_name(city, language)}"] for city, language in variants]
+        built = [result for result in results if not result.get('error')]
+        lines = []
+        for result in results:
+            label = f"{result['city']} ({result['language']})"
+            if result.get('error'):
+                lines.append(f"{label}: ❌ failed after {result['seconds']:.1f}s")
+                report.add_finding('critical', f"{label} build failed", result['error'])
+                continue
+            source = "from artifact cache" if result.get('artifact_cache') == 'hit' else "built"
+            lines.append(
+                f"{label}: {source} in {result['seconds']:.1f}s, "
+                f"{len(result['apks'])} APK(s), {result['bytes'] / 1024 ** 2:.1f} MB"
+            )
+        report.add_section("📱 Variants", lines)
+        
+        summary = (
+            f"**Variants:** {len(built)} of {len(results)} built in {elapsed:.0f}s "
+            f"({self.matrix_parallel} in parallel)\n"
+            f"**Cities:** {', '.join(self.cities)}\n**Languages:** {', '.join(self.languages)}\n"
+            f"**Split per ABI:** {'yes' if self.split_per_abi else 'no'}"
+        )
+        if len(built) == len(results):
+            report.set_summary("green", f"✅ All APKs built!\n\n{summary}")
+        elif built:
+            report.set_summary("yellow", f"⚠️ Some variants failed\n\n{summary}")
+        else:
+            report.set_summary("red", f"❌ No variant was built\n\n{summary}")
+        report.add_finding('info', "GitHub push skipped", "Matrix builds are not pushed; build one variant to push it")
+        
+        if before is not None:
+            report.add_section("📦 Build Caches", self._cache_summary(self._cache_usage(app_dir, before)))
+        report.save(report_path)
+        
+        if not built:
+            raise Exception(f"All {len(results)} variant builds failed: {results[0]['error']}")
+        
+        hits = sum(result.get('artifact_cache') == 'hit' for result in built)
+        job_result = {'variants': f"{len(built)}/{len(results)}"}
+        if self.artifacts:
+            job_result['artifact_cache'] = f"{hits} hit, {len(built) - hits} miss"
+        return {
+            'success': len(built) == len(results),
+            'variants': results,
+            'github_pushed': False,
+            'steps': pipeline.records,
+            RESULT_METADATA_KEY: job_result,
+        }
+    
+    def _build_variant(self, app_dir: Path, variant_dir: Path, city: str, language: str, job_id: str) -> Dict[str, Any]:
+        """
+        Pipeline step of a matrix build: one variant
+        
+        Serves the variant from the artifact cache, or clones the prepared
+        project into variant_dir and builds it there. A failed build is
+        returned as ``error``, so the other variants still run.
+        """
+        start = time.monotonic()
+        outputs_dir = variant_dir / APK_OUTPUTS[0].parent
+        names = self._apk_names(self.split_per_abi)
+        result: Dict[str, Any] = {'city': city, 'language': language}
+        try:
+            if variant_dir.exists():
+                # Left by an interrupted run of the same job
+                shutil.rmtree(variant_dir)
+            artifact_keys = {}
+            cached = None
+            if self.artifacts:
+                try:
+                    key = self._artifact_key(city, language, self.split_per_abi)
+                    # One stored artifact per APK of a split build
+                    artifact_keys = {
+                        name: key if not self.split_per_abi else f"{key}-{abi}"
+                        for name, abi in zip(names, SPLIT_ABIS if self.split_per_abi else [None])
+                    }
+                    entries = [self.artifacts.fetch(artifact_keys[name], outputs_dir / name) for name in names]
+                    cached = entries[0] if all(entries) else None
+                except Exception as e:
+                    logger.warning(f"Artifact cache lookup failed: {e}")
             
-            return {
-                'success': apk_path and apk_path.exists(),
-                'apk_path': str(apk_path) if apk_path else None,
-                'github_pushed': github_result['success'],
-            }
+            if cached:
+                result.update(artifact_cache='hit', built_by=cached['job_id'])
+            else:
+                # Fetched APKs are hardlinks to stored blobs; never build over them
+                shutil.rmtree(variant_dir, ignore_errors=True)
+                clone_tree(app_dir, variant_dir)
+                self._generate_weather_app_code(variant_dir, city, language)
+                self._run_build(variant_dir, self.split_per_abi, variant_dir.name)
+                missing = [name for name in names if not (outputs_dir / name).exists()]
+                if missing:
+                    raise Exception(f"APK file was not created: {', '.join(missing)}")
+                for name, key in artifact_keys.items():
+                    try:
+                        self.artifacts.put(key, outputs_dir / name, job_id)
+                    except Exception as e:
+                        logger.warning(f"Failed to store {name} in the artifact cache: {e}")
+                if artifact_keys:
+                    result['artifact_cache'] = 'miss'
             
+            result['apks'] = [str(outputs_dir / name) for name in names]
+            result['bytes'] = sum((outputs_dir / name).stat().st_size for name in names)
         except Exception as e:
-            report.set_summary("red", f"❌ Build failed: {str(e)}")
-            report.add_finding('critical', "Build error", str(e))
-            report.save(report_path)
-            raise
+            logger.error(f"Variant {city} ({language}) failed: {e}")
+            result['error'] = str(e)
+        result['seconds'] = round(time.monotonic() - start, 1)
+        return result
     
     def _create_flutter_project(self, app_dir: Path):
         """Create a new Flutter project"""
         app_dir.parent.mkdir(parents=True, exist_ok=True)
         
+        if self.template_cache:
+            # flutter create runs once per SDK version, see FlutterTemplateCache
+            self.template_cache.create_project(app_dir, FLUTTER_ORG, FLUTTER_PROJECT_NAME)
+            return
+        
         success, output = self.shell.run_safe(
-            f"{self.flutter_path} create --org com.autobuilder --project-name weather_app {app_dir}",
+            f"{self.flutter_path} create --org {FLUTTER_ORG} --project-name {FLUTTER_PROJECT_NAME} {app_dir}",
             timeout=300
         )
         
         if not success:
             raise Exception(f"Failed to create Flutter project: {output}")
     
+    def _generate_step(self, app_dir: Path, source_dir: Path, city: str, language: str):
+        """Pipeline step: generate the code and keep a copy of the sources for the push"""
+        self._generate_weather_app_code(app_dir, city, language)
+        if source_dir.exists():
+            # Left by an interrupted run of the same job
+            shutil.rmtree(source_dir)
+        shutil.copytree(app_dir, source_dir, symlinks=True, ignore=shutil.ignore_patterns('.git', *BUILD_OUTPUTS))
+    
     def _generate_weather_app_code(self, app_dir: Path, city: str, language: str):
         """Generate weather app code"""
-        # Create a simple weather app
         main_dart = app_dir / "lib" / "main.dart"
-        
-        weather_app_code = f'''import 'package:flutter/material.dart';
+        main_dart.write_text(self._weather_app_code(city, language), encoding='utf-8')
+    
+    def _weather_app_code(self, city: str, language: str) -> str:
+        """Source of lib/main.dart: a simple weather app"""
+        labels = WEATHER_LABELS[language]
+        return f'''import 'package:flutter/material.dart';
 
 void main() {{
   runApp(const WeatherApp());
@@ -128,7 +533,7 @@ class WeatherApp extends StatelessWidget {{
   @override
   Widget build(BuildContext context) {{
     return MaterialApp(
-      title: 'Weather App',
+      title: '{labels['app_title']}',
       theme: ThemeData(
         primarySwatch: Colors.blue,
         useMaterial3: true,
@@ -149,7 +554,7 @@ class WeatherScreen extends StatefulWidget {{
 
 class _WeatherScreenState extends State<WeatherScreen> {{
   String _temperature = "25°C";
-  String _condition = "Sunny";
+  String _condition = "{labels['condition']}";
   String _humidity = "60%";
   
   @override
@@ -162,7 +567,7 @@ class _WeatherScreenState extends State<WeatherScreen> {{
     // Simulated weather data
     setState(() {{
       _temperature = "25°C";
-      _condition = "Sunny";
+      _condition = "{labels['condition']}";
       _humidity = "60%";
     }});
   }}
@@ -171,7 +576,7 @@ class _WeatherScreenState extends State<WeatherScreen> {{
   Widget build(BuildContext context) {{
     return Scaffold(
       appBar: AppBar(
-        title: Text('Weather - ${{widget.city}}'),
+        title: Text('{labels['title']} - ${{widget.city}}'),
         backgroundColor: Colors.blue,
         foregroundColor: Colors.white,
       ),
@@ -204,14 +609,14 @@ class _WeatherScreenState extends State<WeatherScreen> {{
             Row(
               mainAxisAlignment: MainAxisAlignment.spaceEvenly,
               children: [
-                _buildInfoCard('Humidity', _humidity),
-                _buildInfoCard('Wind', '10 km/h'),
+                _buildInfoCard('{labels['humidity']}', _humidity),
+                _buildInfoCard('{labels['wind']}', '{labels['wind_speed']}'),
               ],
             ),
             const SizedBox(height: 30),
             ElevatedButton(
               onPressed: _loadWeather,
-              child: const Text('Refresh'),
+              child: const Text('{labels['refresh']}'),
             ),
           ],
         ),
@@ -247,38 +652,113 @@ class _WeatherScreenState extends State<WeatherScreen> {{
   }}
 }}
 '''
+
+    def _build_apk_step(self, app_dir: Path) -> Dict[str, Any]:
+        """Pipeline step: build the APK, returns its path and what the caches had"""
+        if not self.build_caches:
+            apk_path = self._build_apk(app_dir)
+            return {'apk_path': str(apk_path) if apk_path else None}
         
-        main_dart.write_text(weather_app_code, encoding='utf-8')
+        before = self.build_caches.snapshot()
+        try:
+            apk_path = self._build_apk(app_dir)
+        finally:
+            self.build_caches.evict()
+        return {'apk_path': str(apk_path) if apk_path else None, **self._cache_usage(app_dir, before)}
+    
+    def _cache_usage(self, app_dir: Path, before: Dict[str, Any]) -> Dict[str, Any]:
+        """What the shared caches had for a build, for _cache_summary()"""
+        used = self.build_caches.mark_used(app_dir / "pubspec.lock")
+        return {
+            'caches': self.build_caches.usage(before),
+            'pub_hits': len(used & before[PUB_CACHE]),
+            'pub_misses': len(used - before[PUB_CACHE]),
+        }
+    
+    def _cache_lock(self, name: str, exclusive: bool = False):
+        if not self.build_caches:
+            return nullcontext()
+        return self.build_caches.lock(name, exclusive)
+    
+    def _cache_summary(self, build_output: Dict[str, Any]) -> List[str]:
+        """Report lines: what came from the shared caches"""
+        caches = build_output['caches']
+        pub = caches[PUB_CACHE]
+        gradle = caches[GRADLE_CACHE]
+        daemon = "off"
+        if self.build_caches.warm_daemon:
+            daemon = f"warm (stops after {self.build_caches.daemon_idle_minutes} min idle)"
+        return [
+            f"Pub: {build_output['pub_hits']} packages from cache, {build_output['pub_misses']} downloaded "
+            f"({pub['bytes'] / 1024 ** 2:.1f} MB cached)",
+            f"Gradle: {gradle['cached']} entries cached, {gradle['added']} added "
+            f"({gradle['bytes'] / 1024 ** 2:.1f} MB cached)",
+            f"Gradle daemon: {daemon}",
+        ]
     
     def _build_apk(self, app_dir: Path) -> Optional[Path]:
         """Build Android APK"""
-        # Get dependencies
-        success, output = self.shell.run_safe(
-            f"cd {app_dir} && {self.flutter_path} pub get",
-            timeout=300
-        )
+        self._get_dependencies(app_dir)
+        self._run_build(app_dir)
+        
+        # Find APK file
+        for relative in APK_OUTPUTS:
+            apk_path = app_dir / relative
+            if apk_path.exists():
+                return apk_path
+        
+        return None
+    
+    @staticmethod
+    def _build_command(split_per_abi: bool = False) -> str:
+        return f"{BUILD_APK_COMMAND} --split-per-abi" if split_per_abi else BUILD_APK_COMMAND
+    
+    @staticmethod
+    def _apk_names(split_per_abi: bool = False) -> List[str]:
+        """APK files a build leaves in build/app/outputs/flutter-apk"""
+        if split_per_abi:
+            return [f"app-{abi}-release.apk" for abi in SPLIT_ABIS]
+        return [APK_OUTPUTS[0].name]
+    
+    @staticmethod
+    def _job_log(label: Optional[str] = None) -> Callable[[str], None]:
+        """Output callback: flutter's output goes to the job log as it comes"""
+        prefix = f"[{label}] " if label else ""
+        return lambda line: print(f"{prefix}{line}")
+    
+    def _get_dependencies(self, app_dir: Path):
+        """flutter pub get into the shared pub cache"""
+        env = self.build_caches.env() if self.build_caches else None
+        
+        # pub does not guard concurrent writes to its cache
+        with self._cache_lock(PUB_CACHE, exclusive=True):
+            success, output = self.shell.stream_safe(
+                f"{self.flutter_path} pub get",
+                self._job_log(),
+                timeout=300,
+                cwd=str(app_dir),
+                env=env,
+            )
         
         if not success:
             raise Exception(f"Failed to get dependencies: {output}")
+    
+    def _run_build(self, app_dir: Path, split_per_abi: bool = False, label: Optional[str] = None):
+        """flutter build apk; parallel builds share the Gradle cache and warm daemons"""
+        env = self.build_caches.env() if self.build_caches else None
         
-        # Build APK
-        success, output = self.shell.run_safe(
-            f"cd {app_dir} && {self.flutter_path} build apk --release",
-            timeout=1200  # 20 minutes
-        )
+        # The build reads packages from the pub cache throughout, so it is
+        # held shared too and eviction leaves it alone until the build ends.
+        # Gradle writes a lot over many minutes: streamed, only a tail is kept
+        with self._cache_lock(PUB_CACHE), self._cache_lock(GRADLE_CACHE):
+            success, output = self.shell.stream_safe(
+                f"{self.flutter_path} {self._build_command(split_per_abi)}",
+                self._job_log(label),
+                timeout=1200,  # 20 minutes
+                cwd=str(app_dir),
+                env=env,
+            )
         
         if not success:
             raise Exception(f"Failed to build APK: {output}")
-        
-        # Find APK file
-        apk_paths = [
-            app_dir / "build" / "app" / "outputs" / "flutter-apk" / "app-release.apk",
-            app_dir / "build" / "app" / "outputs" / "apk" / "release" / "app-release.apk",
-        ]
-        
-        for apk_path in apk_paths:
-            if apk_path.exists():
-                return apk_path
-        
-        return None
 
@@ -0,0 +1,511 @@
+"""Caches that keep Flutter builds from starting from scratch"""
+
+import errno
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set
+
+from src.jobs.retention import tree_size
+from src.utils.shell import ShellRunner
+from src.utils.timestamps import utc_now
+
+logger = logging.getLogger(__name__)
+
+# ioctl that makes a file share the blocks of another (btrfs, XFS)
+FICLONE = 0x40049409
+# Files no build step writes to, so a hardlink to the template is safe;
+# text files (pubspec.lock, local.properties, lib/) are rewritten in place
+HARDLINK_SUFFIXES = {'.png', '.jpg', '.jpeg', '.webp', '.gif', '.ico', '.icns', '.jar', '.ttf', '.otf'}
+
+CLONE_REFLINK = 'reflink'
+CLONE_HARDLINK = 'hardlink'
+CLONE_COPY = 'copy'
+
+PUB_CACHE = 'pub'
+GRADLE_CACHE = 'gradle'
+# What eviction removes as a whole, least recently used first: packages,
+# dependency groups, transforms, Gradle versions and wrapper distributions
+CACHE_ENTRIES = {
+    PUB_CACHE: ('hosted/*/*', 'git/*'),
+    GRADLE_CACHE: (
+        'caches/modules-2/files-2.1/*',
+        'caches/transforms-*/*',
+        'caches/build-cache-*/*',
+        'caches/[0-9]*',
+        'wrapper/dists/*',
+    ),
+}
+DEFAULT_CACHE_MAX_BYTES = {
+    PUB_CACHE: 4 * 1024 ** 3,
+    GRADLE_CACHE: 10 * 1024 ** 3,
+}
+DEFAULT_ARTIFACT_MAX_BYTES = 2 * 1024 ** 3
+# Eviction frees space down to this share of the limit
+EVICT_TARGET = 0.8
+
+
+def default_cache_dir(config: dict) -> Path:
+    """Base directory of the build caches"""
+    base_dir = config.get('paths', {}).get('base_dir', '/opt/autobuilder')
+    return Path(config.get('build', {}).get('cache_dir') or Path(base_dir) / 'cache')
+
+
+def _reflink(source: Path, target: Path):
+    with open(source, 'rb') as src, open(target, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, target)
+
+
+def clone_tree(source: Path, target: Path) -> dict:
+    """
+    Clone a directory tree as cheaply as the filesystem allows
+    
+    Files are reflinked where the filesystem supports it; otherwise
+    files no build writes to (images, jars) are hardlinked and the rest
+    copied. Returns how many files each method cloned.
+    """
+    counts = {CLONE_REFLINK: 0, CLONE_HARDLINK: 0, CLONE_COPY: 0}
+    reflink = True
+    hardlink = True
+    for root, dirs, files in os.walk(source):
+        relative = Path(root).relative_to(source)
+        (target / relative).mkdir(parents=True, exist_ok=True)
+        for name in dirs:
+            path = Path(root) / name
+            if path.is_symlink():
+                os.symlink(os.readlink(path), target / relative / name)
+        dirs[:] = [name for name in dirs if not (Path(root) / name).is_symlink()]
+        
+        for name in files:
+            src = Path(root) / name
+            dst = target / relative / name
+            if src.is_symlink():
+                os.symlink(os.readlink(src), dst)
+                continue
+            if reflink:
+                try:
+                    _reflink(src, dst)
+                    counts[CLONE_REFLINK] += 1
+                    continue
+                except OSError as e:
+                    if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+                        raise
+                    reflink = False
+                    dst.unlink(missing_ok=True)
+            if hardlink and src.suffix.lower() in HARDLINK_SUFFIXES:
+                try:
+                    os.link(src, dst)
+                    counts[CLONE_HARDLINK] += 1
+                    continue
+                except OSError as e:
+                    if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                        raise
+                    hardlink = False
+            shutil.copy2(src, dst)
+            counts[CLONE_COPY] += 1
+    return counts
+
+
+def flutter_sdk_version(flutter_path: str, shell: ShellRunner) -> str:
+    """Short fingerprint of the installed Flutter SDK"""
+    flutter = shutil.which(flutter_path)
+    if flutter:
+        # <sdk>/bin/flutter; reading the version files is much faster
+        # than starting the flutter tool
+        sdk_root = Path(flutter).resolve().parent.parent
+        stamps = [
+            sdk_root / 'version',
+            sdk_root / 'bin' / 'cache' / 'flutter.version.json',
+            sdk_root / 'bin' / 'internal' / 'engine.version',
+        ]
+        parts = [stamp.read_text().strip() for stamp in stamps if stamp.is_file()]
+        if parts:
+            return hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:12]
+    
+    success, output = shell.run_safe(f"{flutter_path} --version --machine", timeout=120)
+    if not success:
+        raise Exception(f"Failed to get Flutter version: {output}")
+    return hashlib.sha256(output.strip().encode()).hexdigest()[:12]
+
+
+@contextmanager
+def _file_lock(path: Path, shared: bool = False, blocking: bool = True) -> Iterator[bool]:
+    """
+    Lock between threads and processes (job isolation)
+    
+    Yields False if ``blocking`` is off and the lock is taken.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as lock_file:
+        operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        try:
+            fcntl.flock(lock_file.fileno(), operation if blocking else operation | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class FlutterTemplateCache:
+    """
+    ``flutter create`` once per SDK version, org and project name
+    
+    Templates live in ``<cache_dir>/flutter-templates``, one directory per
+    key; jobs get a clone (see clone_tree) instead of running ``flutter
+    create`` in their workspace. The SDK version is part of the key, so
+    after an SDK upgrade the next build creates a new template and the
+    ones of other versions are removed. A template is created in a
+    temporary directory under a file lock and renamed into place, so
+    parallel builds create it once and never see half of one.
+    """
+    
+    def __init__(self, config: dict, shell: Optional[ShellRunner] = None):
+        build_config = config.get('build', {})
+        self.flutter_path = build_config.get('flutter_path', 'flutter')
+        self.templates_dir = default_cache_dir(config) / 'flutter-templates'
+        self.shell = shell or ShellRunner(timeout=300)
+    
+    def sdk_version(self) -> str:
+        """Short fingerprint of the installed Flutter SDK"""
+        return flutter_sdk_version(self.flutter_path, self.shell)
+    
+    @staticmethod
+    def _prefix(org: str, project_name: str) -> str:
+        return re.sub(r'[^A-Za-z0-9_.-]', '_', f"{project_name}-{org}") + '-'
+    
+    def template(self, org: str, project_name: str) -> Path:
+        """Template directory for the current SDK, created if missing"""
+        prefix = self._prefix(org, project_name)
+        template_dir = self.templates_dir / f"{prefix}{self.sdk_version()}"
+        if template_dir.is_dir():
+            return template_dir
+        
+        with _file_lock(self.templates_dir / f".{prefix}lock"):
+            if template_dir.is_dir():
+                # Created by a parallel build while this one waited
+                return template_dir
+            
+            start = time.monotonic()
+            tmp_dir = self.templates_dir / f".{template_dir.name}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            success, output = self.shell.run_safe(
+                f"{self.flutter_path} create --org {org} --project-name {project_name} {tmp_dir}",
+                timeout=300
+            )
+            if not success:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise Exception(f"Failed to create Flutter project: {output}")
+            os.rename(tmp_dir, template_dir)
+            logger.info(f"Created Flutter template {template_dir.name} in {time.monotonic() - start:.1f}s")
+            
+            # Templates of older SDKs are never used again
+            for stale in self.templates_dir.glob(f"{prefix}*"):
+                # Same length: not the template of a longer org/project name
+                if stale != template_dir and len(stale.name) == len(template_dir.name):
+                    shutil.rmtree(stale, ignore_errors=True)
+                    logger.info(f"Removed stale Flutter template {stale.name}")
+        return template_dir
+    
+    def create_project(self, app_dir: Path, org: str, project_name: str) -> dict:
+        """Put a fresh project into app_dir, returns clone_tree() counts"""
+        template_dir = self.template(org, project_name)
+        start = time.monotonic()
+        if app_dir.exists():
+            # Left by an interrupted run of the same job
+            shutil.rmtree(app_dir)
+        counts = clone_tree(template_dir, app_dir)
+        logger.info(
+            f"Cloned Flutter template into {app_dir} in {time.monotonic() - start:.2f}s "
+            f"({', '.join(f'{count} {method}' for method, count in counts.items() if count)})"
+        )
+        return counts
+
+
+class SharedBuildCaches:
+    """
+    PUB_CACHE and GRADLE_USER_HOME shared by all builds
+    
+    Each build used to download its packages and Gradle dependencies into
+    a fresh home of its own. Now builds share ``<cache_dir>/pub`` and
+    ``<cache_dir>/gradle``: ``pub get`` runs under an exclusive lock,
+    since pub does not guard concurrent writes, and Gradle builds, which
+    lock their own cache, hold a shared one, and the pub cache shared as
+    well, since they read packages from it throughout. Eviction takes the lock
+    exclusively and only when no build holds it. Above the size limit it
+    removes the least recently used entries (CACHE_ENTRIES), by
+    modification time: pub packages are touched by every build that uses
+    them, Gradle entries change when Gradle adds to them.
+    
+    In warm daemon mode one Gradle daemon stays up between builds until
+    it has been idle for ``gradle_daemon_idle_minutes``. With process
+    isolation the daemon is turned off, as it would keep the resource
+    limits of the job that started it.
+    """
+    
+    def __init__(self, config: dict):
+        build_config = config.get('build', {})
+        cache_dir = default_cache_dir(config)
+        self.dirs = {PUB_CACHE: cache_dir / 'pub', GRADLE_CACHE: cache_dir / 'gradle'}
+        self.max_bytes = {
+            PUB_CACHE: build_config.get('pub_cache_max_bytes', DEFAULT_CACHE_MAX_BYTES[PUB_CACHE]),
+            GRADLE_CACHE: build_config.get('gradle_cache_max_bytes', DEFAULT_CACHE_MAX_BYTES[GRADLE_CACHE]),
+        }
+        isolated = config.get('security', {}).get('job_isolation', 'thread') == 'process'
+        self.warm_daemon = build_config.get('gradle_daemon', 'warm') == 'warm' and not isolated
+        self.daemon_idle_minutes = build_config.get('gradle_daemon_idle_minutes', 60)
+    
+    def env(self) -> Dict[str, str]:
+        """Environment for flutter commands: os.environ and the cache locations"""
+        for cache_dir in self.dirs.values():
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        self._write_gradle_properties()
+        return {
+            **os.environ,
+            'PUB_CACHE': str(self.dirs[PUB_CACHE]),
+            'GRADLE_USER_HOME': str(self.dirs[GRADLE_CACHE]),
+        }
+    
+    def _write_gradle_properties(self):
+        # GRADLE_USER_HOME/gradle.properties overrides the project's
+        lines = [f"org.gradle.daemon={'true' if self.warm_daemon else 'false'}"]
+        if self.warm_daemon:
+            lines.append(f"org.gradle.daemon.idletimeout={int(self.daemon_idle_minutes * 60 * 1000)}")
+        content = "# Written by AutoBuilder (SharedBuildCaches)\n" + "\n".join(lines) + "\n"
+        path = self.dirs[GRADLE_CACHE] / 'gradle.properties'
+        if path.exists() and path.read_text() == content:
+            return
+        tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+        tmp_path.write_text(content)
+        os.replace(tmp_path, path)
+    
+    @contextmanager
+    def lock(self, name: str, exclusive: bool = False) -> Iterator[bool]:
+        """Hold a cache while a command uses it"""
+        with _file_lock(self.dirs[name].parent / f".{name}.lock", shared=not exclusive) as locked:
+            yield locked
+    
+    def entries(self, name: str) -> Set[str]:
+        """Cache entries (see CACHE_ENTRIES), relative to the cache directory"""
+        cache_dir = self.dirs[name]
+        return {
+            str(path.relative_to(cache_dir))
+            for pattern in CACHE_ENTRIES[name]
+            for path in cache_dir.glob(pattern)
+            if path.is_dir()
+        }
+    
+    def snapshot(self) -> Dict[str, Set[str]]:
+        """Entries of every cache, to compare after a build"""
+        return {name: self.entries(name) for name in self.dirs}
+    
+    def mark_used(self, lock_path: Path) -> Set[str]:
+        """
+        Touch the pub cache entries of the packages in a pubspec.lock
+        
+        Their modification time is what eviction goes by (access times
+        change whenever the cache is scanned). Returns the entries.
+        """
+        if not lock_path.exists():
+            return set()
+        
+        packages = []
+        name = None
+        for line in lock_path.read_text().splitlines():
+            match = re.match(r'^  ([\w-]+):$', line)
+            if match:
+                name = match.group(1)
+                continue
+            match = re.match(r'^    version: "?([^"]+)"?$', line)
+            if match and name:
+                packages.append(f"{name}-{match.group(1)}")
+        
+        used = set()
+        cache_dir = self.dirs[PUB_CACHE]
+        for package in packages:
+            for path in cache_dir.glob(f"hosted/*/{package}"):
+                os.utime(path)
+                used.add(str(path.relative_to(cache_dir)))
+        return used
+    
+    def usage(self, before: Dict[str, Set[str]]) -> Dict[str, Dict[str, int]]:
+        """Per cache: entries there before the build, entries it added, size now"""
+        usage = {}
+        for name in self.dirs:
+            after = self.entries(name)
+            usage[name] = {
+                'cached': len(before[name]),
+                'added': len(after - before[name]),
+                'bytes': tree_size(self.dirs[name]) if self.dirs[name].exists() else 0,
+            }
+        return usage
+    
+    def evict(self) -> Dict[str, int]:
+        """Shrink caches over their limit, returns bytes freed per cache"""
+        freed = {}
+        for name, cache_dir in self.dirs.items():
+            if not cache_dir.exists():
+                continue
+            with _file_lock(cache_dir.parent / f".{name}.lock", blocking=False) as locked:
+                if not locked:
+                    # In use; the next build that finishes tries again
+                    continue
+                freed[name] = self._evict(name)
+        return freed
+    
+    def _evict(self, name: str) -> int:
+        cache_dir = self.dirs[name]
+        total = tree_size(cache_dir)
+        if total <= self.max_bytes[name]:
+            return 0
+        
+        target = self.max_bytes[name] * EVICT_TARGET
+        freed = 0
+        # Oldest first; see mark_used()
+        for entry in sorted((cache_dir / relative for relative in self.entries(name)), key=lambda p: p.stat().st_mtime):
+            if total - freed <= target:
+                break
+            size = tree_size(entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            freed += size
+        logger.info(f"Evicted {freed / 1024 / 1024:.1f} MB from the {name} cache ({total / 1024 / 1024:.1f} MB)")
+        return freed
+
+
+class ArtifactStore:
+    """
+    Finished APKs by the hash of everything that went into the build
+    
+    ``<cache_dir>/artifacts/blobs/<sha256>`` holds each APK once, named
+    by the hash of its content; ``keys/<key>.json`` maps a build input
+    key (see BuildWeatherApkTask) to a blob and the job that built it.
+    Lookups touch the key file, and above ``artifact_cache_max_bytes``
+    the least recently used keys go first, then the blobs no key points
+    to. Files are written to a temporary name and renamed into place;
+    a file lock keeps eviction away from lookups and stores.
+    """
+    
+    def __init__(self, config: dict):
+        self.base_dir = default_cache_dir(config) / 'artifacts'
+        self.blobs_dir = self.base_dir / 'blobs'
+        self.keys_dir = self.base_dir / 'keys'
+        self.max_bytes = config.get('build', {}).get('artifact_cache_max_bytes', DEFAULT_ARTIFACT_MAX_BYTES)
+        self.lock_path = self.base_dir / '.lock'
+    
+    def _key_path(self, key: str) -> Path:
+        return self.keys_dir / f"{key}.json"
+    
+    def _tmp_path(self, path: Path) -> Path:
+        return path.with_name(f".{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Entry for a key ({blob, size, job_id, created_at}) or None"""
+        with _file_lock(self.lock_path, shared=True):
+            return self._get(key)
+    
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        key_path = self._key_path(key)
+        try:
+            entry = json.loads(key_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if not (self.blobs_dir / entry['blob']).is_file():
+            return None
+        os.utime(key_path)
+        return entry
+    
+    def fetch(self, key: str, target: Path) -> Optional[Dict[str, Any]]:
+        """Put the stored artifact of a key at target, returns its entry or None on a miss"""
+        with _file_lock(self.lock_path, shared=True):
+            entry = self._get(key)
+            if not entry:
+                return None
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.exists():
+                target.unlink()
+            blob = self.blobs_dir / entry['blob']
+            try:
+                # Blobs are never written to once stored
+                os.link(blob, target)
+            except OSError:
+                shutil.copy2(blob, target)
+            return entry
+    
+    def put(self, key: str, source: Path, job_id: str) -> Dict[str, Any]:
+        """Store a finished artifact under a key, then evict; returns the entry"""
+        digest = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        entry = {
+            'blob': digest.hexdigest(),
+            'size': source.stat().st_size,
+            'job_id': job_id,
+            'created_at': utc_now(),
+        }
+        
+        with _file_lock(self.lock_path):
+            self.blobs_dir.mkdir(parents=True, exist_ok=True)
+            self.keys_dir.mkdir(parents=True, exist_ok=True)
+            blob = self.blobs_dir / entry['blob']
+            if not blob.exists():
+                tmp_path = self._tmp_path(blob)
+                shutil.copy2(source, tmp_path)
+                os.replace(tmp_path, blob)
+            key_path = self._key_path(key)
+            tmp_path = self._tmp_path(key_path)
+            tmp_path.write_text(json.dumps(entry))
+            os.replace(tmp_path, key_path)
+            self._evict(keep=key)
+        return entry
+    
+    def evict(self) -> int:
+        """Shrink the store below its limit, returns bytes freed"""
+        if not self.base_dir.exists():
+            return 0
+        with _file_lock(self.lock_path):
+            return self._evict()
+    
+    def _evict(self, keep: Optional[str] = None) -> int:
+        blobs = {path.name: path.stat().st_size for path in self.blobs_dir.glob('*') if not path.name.startswith('.')}
+        total = sum(blobs.values())
+        if total <= self.max_bytes:
+            return 0
+        
+        target = self.max_bytes * EVICT_TARGET
+        keys = {}
+        for key_path in self.keys_dir.glob('*.json'):
+            try:
+                keys[key_path] = json.loads(key_path.read_text())['blob']
+            except (OSError, ValueError, KeyError):
+                key_path.unlink(missing_ok=True)
+        
+        freed = 0
+        # Least recently used first; get() touches the key files
+        for key_path in sorted(keys, key=lambda p: p.stat().st_mtime):
+            if total - freed <= target:
+                break
+            if key_path.stem == keep:
+                continue
+            blob = keys.pop(key_path)
+            key_path.unlink(missing_ok=True)
+            if blob in blobs and blob not in keys.values():
+                (self.blobs_dir / blob).unlink(missing_ok=True)
+                freed += blobs.pop(blob)
+        # Blobs of keys lost to a crash
+        for blob in set(blobs) - set(keys.values()):
+            (self.blobs_dir / blob).unlink(missing_ok=True)
+            freed += blobs.pop(blob)
+        logger.info(f"Evicted {freed / 1024 / 1024:.1f} MB of build artifacts ({total / 1024 / 1024:.1f} MB)")
+        return freed
@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import Optional, Dict, Any
 import logging
 
+from src.utils.shell import run_process
+
 logger = logging.getLogger(__name__)
 
 
@@ -77,11 +79,12 @@ class GitHubPusher:
         env = os.environ.copy()
         env['GIT_SSH_COMMAND'] = f'ssh -i {self.ssh_key_path} -o StrictHostKeyChecking=no'
         
-        subprocess.run(
+        run_process(
             ['git', 'clone', self.repo_url, str(self.repo_path)],
             env=env,
             check=True,
-            timeout=300
+            timeout=300,
+            capture_output=False,
         )
     
     def _setup_git_config(self):
@@ -171,11 +174,12 @@ class GitHubPusher:
         )
         
         # Push
-        subprocess.run(
+        run_process(
             ['git', 'push', 'origin', self.branch],
             cwd=self.repo_path,
             env=env,
             check=True,
-            timeout=300
+            timeout=300,
+            capture_output=False,
         )
 
@@ -6,6 +6,7 @@ import time
 from typing import Dict, Any
 from urllib.parse import urlparse
 
+from src.utils.cancel import current_cancel_token
 from src.utils.markdown import MarkdownReport
 
 
@@ -54,7 +55,14 @@ class LoadTestTask:
         # Run load test
         report.add_checked_item(f"Load test: {self.request_count} requests to {self.target_url}")
         
-        results = asyncio.run(self._run_load_test())
+        token = current_cancel_token()
+        try:
+            results = asyncio.run(self._run_load_test())
+        except asyncio.CancelledError:
+            # Stopped by the job's cancel token
+            if token:
+                token.check()
+            raise
         
         # Build summary
         success_rate = (results['successful'] / results['total']) * 100 if results['total'] > 0 else 0
@@ -119,6 +127,18 @@ class LoadTestTask:
         failed = 0
         start_time = time.time()
         
+        # Cancelling the job cancels the requests in flight
+        token = current_cancel_token()
+        if token:
+            loop = asyncio.get_running_loop()
+            main_task = asyncio.current_task()
+            
+            def stop():
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(main_task.cancel)
+            
+            token.add_callback(stop)
+        
         async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
             tasks = []
             for i in range(self.request_count):
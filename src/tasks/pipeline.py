@@ -0,0 +1,173 @@
+"""Multi-step tasks with step dependencies"""
+
+import contextvars
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+from src.utils.cancel import current_cancel_token
+from src.utils.timestamps import utc_now
+
+logger = logging.getLogger(__name__)
+
+STEP_PENDING = 'pending'
+STEP_RUNNING = 'running'
+STEP_DONE = 'done'
+STEP_FAILED = 'failed'
+# Not started because a step failed or the job was stopped
+STEP_SKIPPED = 'skipped'
+
+
+class Step(NamedTuple):
+    """
+    One step of a Pipeline
+    
+    ``func(outputs)`` gets the outputs of the finished steps by name and
+    returns the step's own output, which must be JSON-serializable so a
+    resumed run can hand it to the steps that depend on it.
+    """
+    name: str
+    title: str
+    func: Callable[[Dict[str, Any]], Any]
+    depends: Tuple[str, ...] = ()
+
+
+class Pipeline:
+    """
+    Runs the steps of a task in dependency order
+    
+    Steps whose dependencies are done run in parallel threads, in the
+    output capture and cancel scope of the job. Status, timing, error and
+    output of every step are written to ``state_path`` (in the job
+    workspace) as they change; a job that runs again in the same
+    workspace (re-queued after an interrupt) skips the steps that are
+    already done. After a failure no new steps start, running ones are
+    waited for and the first error is raised.
+    """
+    
+    def __init__(self, steps: List[Step], state_path: str, max_parallel: int = 4):
+        self.steps = {step.name: step for step in steps}
+        if len(self.steps) != len(steps):
+            raise ValueError("Duplicate pipeline step names")
+        for step in steps:
+            unknown = set(step.depends) - set(self.steps)
+            if unknown:
+                raise ValueError(f"Step {step.name} depends on unknown steps: {', '.join(sorted(unknown))}")
+        self._check_cycles()
+        self.state_path = Path(state_path)
+        self.max_parallel = max_parallel
+        self.records: Dict[str, Dict[str, Any]] = {}
+    
+    def _check_cycles(self):
+        done = set()
+        remaining = dict(self.steps)
+        while remaining:
+            ready = [name for name, step in remaining.items() if set(step.depends) <= done]
+            if not ready:
+                raise ValueError(f"Pipeline steps depend on each other: {', '.join(sorted(remaining))}")
+            for name in ready:
+                done.add(name)
+                del remaining[name]
+    
+    def _load(self):
+        """Records of the last run in this workspace, done steps only"""
+        try:
+            stored = json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            stored = {}
+        for name in self.steps:
+            record = stored.get(name)
+            if record and record.get('status') == STEP_DONE:
+                self.records[name] = {**record, 'resumed': True}
+            else:
+                self.records[name] = {'status': STEP_PENDING}
+    
+    def _save(self):
+        tmp_path = self.state_path.with_name(self.state_path.name + '.tmp')
+        tmp_path.write_text(json.dumps(self.records, indent=2))
+        os.replace(tmp_path, self.state_path)
+    
+    def _run_step(self, step: Step, outputs: Dict[str, Any]) -> Any:
+        token = current_cancel_token()
+        if token:
+            token.check()
+        return step.func(outputs)
+    
+    def run(self) -> Dict[str, Any]:
+        """Run the steps that are not done yet, returns the outputs of all steps"""
+        self._load()
+        outputs = {
+            name: record.get('output') for name, record in self.records.items() if record['status'] == STEP_DONE
+        }
+        resumed = sorted(outputs)
+        if resumed:
+            logger.info(f"Resuming pipeline, already done: {', '.join(resumed)}")
+        self._save()
+        
+        running: Dict[Future, Tuple[Step, float]] = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix='pipeline') as pool:
+            while True:
+                if error is None:
+                    for step in self._ready(outputs):
+                        logger.info(f"Step {step.name} started")
+                        self.records[step.name] = {'status': STEP_RUNNING, 'started_at': utc_now()}
+                        # Each step thread keeps the job's log capture and cancel token
+                        context = contextvars.copy_context()
+                        future = pool.submit(context.run, self._run_step, step, dict(outputs))
+                        running[future] = (step, time.monotonic())
+                    self._save()
+                if not running:
+                    break
+                
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step, started = running.pop(future)
+                    record = self.records[step.name]
+                    record['finished_at'] = utc_now()
+                    record['duration'] = round(time.monotonic() - started, 3)
+                    step_error = future.exception()
+                    if step_error is None:
+                        record['status'] = STEP_DONE
+                        record['output'] = outputs[step.name] = future.result()
+                        logger.info(f"Step {step.name} done in {record['duration']}s")
+                    else:
+                        record['status'] = STEP_FAILED
+                        record['error'] = str(step_error)
+                        logger.error(f"Step {step.name} failed after {record['duration']}s: {step_error}")
+                        error = error or step_error
+                self._save()
+        
+        if error is not None:
+            for record in self.records.values():
+                if record['status'] == STEP_PENDING:
+                    record['status'] = STEP_SKIPPED
+            self._save()
+            raise error
+        return outputs
+    
+    def _ready(self, outputs: Dict[str, Any]) -> List[Step]:
+        """Steps not started yet whose dependencies are done"""
+        return [
+            step for name, step in self.steps.items()
+            if self.records[name]['status'] == STEP_PENDING and all(dep in outputs for dep in step.depends)
+        ]
+    
+    def summary(self) -> List[str]:
+        """One line per step for reports: title, status and time"""
+        lines = []
+        for name, step in self.steps.items():
+            record = self.records.get(name, {'status': STEP_PENDING})
+            line = f"{step.title}: {record['status']}"
+            if record.get('resumed'):
+                line += " (previous run)"
+            elif 'duration' in record:
+                line += f" in {record['duration']:.1f}s"
+            if record.get('error'):
+                line += f" - {record['error']}"
+            lines.append(line)
+        return lines
@@ -0,0 +1,89 @@
+"""Registry of the tasks the job queue can run"""
+
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from src.tasks.audit_public_site import AuditPublicSiteTask
+from src.tasks.build_android_apk import DEFAULT_CITY, DEFAULT_LANGUAGE, BuildWeatherApkTask
+from src.tasks.load_test import LoadTestTask
+from src.tasks.remote_status import RemoteStatusTask
+from src.tasks.system_status import SystemStatusTask
+
+
+class TaskSpec(NamedTuple):
+    """How to run the jobs of one command type
+    
+    ``factory(config, params)`` builds the task object from the job's
+    ``params`` (stored in its metadata), so a queued job can run in any
+    bot instance, also after a restart. Higher priorities are claimed
+    first. ``pool`` is the task class whose worker pool (sized in the
+    ``[workers]`` config section) runs the jobs. Jobs interrupted by a
+    crash are re-queued only if ``retry_on_interrupt`` is set.
+    
+    ``share_key(params)`` gives the normalized arguments of a request;
+    identical requests share one queued or running job, and a finished
+    report is reused for ``reuse_ttl`` seconds (``[reuse_ttl]`` config
+    section). Without it every request runs its own job.
+    """
+    factory: Callable[[dict, Dict[str, Any]], Any]
+    priority: int = 0
+    pool: str = 'default'
+    retry_on_interrupt: bool = True
+    share_key: Optional[Callable[[Dict[str, Any]], Any]] = None
+    reuse_ttl: float = 0
+
+
+def _status_task(config: dict, params: Dict[str, Any]):
+    if params.get('host'):
+        return RemoteStatusTask(config, params['host'])
+    return SystemStatusTask(config)
+
+
+def _audit_site_task(config: dict, params: Dict[str, Any]):
+    return AuditPublicSiteTask(config, target_domain=params.get('domain'))
+
+
+def _normalize_host(value: Optional[str]) -> str:
+    return (value or '').strip().lower().rstrip('/')
+
+
+def _status_key(params: Dict[str, Any]):
+    return _normalize_host(params.get('host'))
+
+
+def _audit_site_key(params: Dict[str, Any]):
+    # send_details (-d) only changes what is sent, not what is checked
+    return _normalize_host(params.get('domain'))
+
+
+def _build_key(params: Dict[str, Any]):
+    # The order of cities and languages does not change the APKs; the case
+    # of a city does, it is shown in the app as written
+    return (
+        sorted({city.strip() for city in params.get('cities') or [DEFAULT_CITY]}),
+        sorted({language.strip().lower() for language in params.get('languages') or [DEFAULT_LANGUAGE]}),
+        bool(params.get('split_per_abi')),
+    )
+
+
+def _load_test_task(config: dict, params: Dict[str, Any]):
+    return LoadTestTask(config, params['url'], params['count'])
+
+
+def _build_weather_apk_task(config: dict, params: Dict[str, Any]):
+    return BuildWeatherApkTask(
+        config,
+        cities=params.get('cities'),
+        languages=params.get('languages'),
+        split_per_abi=params.get('split_per_abi', False),
+    )
+
+
+TASKS: Dict[str, TaskSpec] = {
+    # Quick checks first, 20-minute builds last
+    'status': TaskSpec(_status_task, priority=100, pool='status', share_key=_status_key, reuse_ttl=30),
+    'audit_site': TaskSpec(_audit_site_task, priority=50, pool='audit', share_key=_audit_site_key, reuse_ttl=300),
+    # A load test must never be replayed without the user asking again, and
+    # every request is its own test
+    'ddos': TaskSpec(_load_test_task, priority=20, pool='load_test', retry_on_interrupt=False),
+    'build_weather_apk': TaskSpec(_build_weather_apk_task, priority=0, pool='build', share_key=_build_key),
+}
@@ -0,0 +1,202 @@
+"""Delivery of finished job results to Telegram"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.jobs.dispatcher import JobDispatcher
+from src.utils.cancel import REASON_CANCELLED, JobCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class ResultDelivery:
+    """
+    Sends the report, APK or error of a finished job to the chat it came from
+    
+    Command handlers only queue jobs (with the chat ID in the job
+    metadata) and return; this listener of JobDispatcher does what the
+    handlers used to do after awaiting the job. Jobs re-queued after a
+    restart are delivered as well, since the chat ID is stored. A job
+    shared by identical requests (JobDispatcher.request()) is delivered to
+    every chat that asked for it, each with its own flags.
+    """
+    
+    def __init__(self, bot, dispatcher: JobDispatcher):
+        self.bot = bot
+        self.dispatcher = dispatcher
+        self.senders = {
+            'status': self._send_status,
+            'audit_site': self._send_audit,
+            'build_weather_apk': self._send_build,
+            'ddos': self._send_load_test,
+        }
+    
+    async def deliver(
+        self,
+        job_id: str,
+        result: Optional[Dict[str, Any]],
+        error: Optional[BaseException],
+        requests: Optional[List[Dict[str, Any]]] = None,
+    ):
+        """JobDispatcher listener"""
+        job = await self.dispatcher.job_store.get_job(job_id)
+        if not job:
+            return
+        
+        metadata = json.loads(job['metadata'] or '{}')
+        if requests is None:
+            # Whoever queued the job and the identical requests that joined it
+            requests = [metadata] + metadata.get('subscribers', [])
+        requests = [request for request in requests if request.get('chat_id')]
+        
+        for request in requests:
+            try:
+                await self._deliver_to(
+                    request['chat_id'],
+                    job,
+                    request.get('params', {}),
+                    result,
+                    error,
+                    len(requests),
+                )
+            except Exception as e:
+                logger.error(f"Failed to deliver job {job_id} to chat {request['chat_id']}: {e}")
+        
+        # Cleanup; reusable reports stay until retention removes them
+        if requests and not error and not self.dispatcher.reuse_ttl(job['command_type']):
+            self.dispatcher.executor.cleanup_workspace(job_id)
+    
+    async def _deliver_to(
+        self,
+        chat_id,
+        job: Dict[str, Any],
+        params: Dict[str, Any],
+        result: Optional[Dict[str, Any]],
+        error: Optional[BaseException],
+        request_count: int,
+    ):
+        job_id = job['id']
+        if isinstance(error, JobCancelled):
+            if error.reason != REASON_CANCELLED:
+                await self.bot.send_message(chat_id, f"⏱ Vaqt tugadi, job to'xtatildi (`{job_id[:8]}`): {error}")
+            elif request_count > 1:
+                # The /cancel reply only told whoever cancelled the shared job
+                await self.bot.send_message(chat_id, f"🚫 Job bekor qilindi (`{job_id[:8]}`)")
+            return
+        
+        if error:
+            # The stored message is redacted, the exception text may not be
+            message = job.get('error_message') or "Xatolik yuz berdi."
+            if job['command_type'] == 'ddos' and isinstance(error, ValueError):
+                await self.bot.send_message(chat_id, f"🔒 Xavfsizlik: {message}")
+            else:
+                await self.bot.send_message(chat_id, f"❌ Xatolik (`{job_id[:8]}`): {message}")
+            return
+        
+        sender = self.senders.get(job['command_type'], self._send_report)
+        await sender(chat_id, job, params, result or {})
+    
+    async def _send_file(self, chat_id, path: Path, filename: str, caption: Optional[str] = None):
+        with open(path, 'rb') as document:
+            await self.bot.send_document(chat_id, document=document, filename=filename, caption=caption)
+    
+    @staticmethod
+    def _report_path(job: Dict[str, Any]) -> Optional[Path]:
+        """Report of a job, if it was written"""
+        if job.get('report_path') and Path(job['report_path']).exists():
+            return Path(job['report_path'])
+        return None
+    
+    async def _send_report(self, chat_id, job: Dict[str, Any], params: Dict[str, Any], result: Dict[str, Any]):
+        report_path = self._report_path(job)
+        if report_path:
+            await self._send_file(chat_id, report_path, "report.md", f"✅ {job['command']}")
+        else:
+            await self.bot.send_message(chat_id, f"✅ Yakunlandi: {job['command']}")
+    
+    async def _send_status(self, chat_id, job: Dict[str, Any], params: Dict[str, Any], result: Dict[str, Any]):
+        target_host = params.get('host')
+        if not job.get('report_path'):
+            await self.bot.send_message(chat_id, "❌ Xatolik yuz berdi.")
+            return
+        
+        report_path = self._report_path(job)
+        if report_path:
+            caption = f"📊 {'Remote' if target_host else 'Local'} server holati hisoboti"
+            if target_host:
+                caption += f": {target_host}"
+            await self._send_file(chat_id, report_path, "status_report.md", caption)
+        else:
+            await self.bot.send_message(chat_id, "✅ Tekshiruv yakunlandi. Hisobot yaratilmadi.")
+    
+    async def _send_audit(self, chat_id, job: Dict[str, Any], params: Dict[str, Any], result: Dict[str, Any]):
+        if not job.get('report_path'):
+            await self.bot.send_message(chat_id, "❌ Xatolik yuz berdi.")
+            return
+        
+        report_path = self._report_path(job)
+        if not report_path:
+            await self.bot.send_message(chat_id, "✅ Tekshiruv yakunlandi.")
+            return
+        
+        await self._send_file(chat_id, report_path, "audit_report.md", "🔒 Xavfsizlik tekshiruvi hisoboti")
+        
+        # Send detailed findings if -d flag was used
+        if params.get('send_details') and result.get('details'):
+            details = result['details']
+            detail_messages = []
+            
+            if details.get('exposed_paths'):
+                detail_messages.append("🔴 **Ochilgan fayllar:**\n")
+                for finding in details['exposed_paths']:
+                    detail_messages.append(f"• {finding.get('title', 'Unknown')}")
+            
+            if detail_messages:
+                await self.bot.send_message(chat_id, "\n".join(detail_messages), parse_mode='Markdown')
+    
+    async def _send_build(self, chat_id, job: Dict[str, Any], params: Dict[str, Any], result: Dict[str, Any]):
+        workspace_dir = Path(self.dispatcher.config['paths']['workspaces_dir']) / job['id']
+        
+        # Send APK if exists
+        apk_path = workspace_dir / "app" / "build" / "app" / "outputs" / "flutter-apk" / "app-release.apk"
+        if not apk_path.exists():
+            # Try alternative path
+            apk_path = workspace_dir / "app" / "build" / "app" / "outputs" / "apk" / "release" / "app-release.apk"
+        
+        # APKs of a matrix build, one directory per city/language variant
+        variant_apks = sorted(workspace_dir.glob("variants/*/build/app/outputs/flutter-apk/*.apk"))
+        
+        if apk_path.exists():
+            await self._send_file(chat_id, apk_path, "weather_app.apk", "📱 Weather App APK tayyor!")
+        elif variant_apks:
+            for variant_apk in variant_apks:
+                variant = variant_apk.parents[4].name
+                # app-release.apk, or app-<abi>-release.apk with --split-per-abi
+                abi = variant_apk.name[len("app-"):-len("release.apk")].rstrip('-')
+                filename = f"weather_app_{variant}{'_' + abi if abi else ''}.apk"
+                await self._send_file(chat_id, variant_apk, filename, f"📱 {variant}{' ' + abi if abi else ''}")
+        else:
+            await self.bot.send_message(chat_id, "⚠️ APK topilmadi. Loglarni tekshiring.")
+        
+        # Send report if exists
+        report_path = self._report_path(job)
+        if report_path:
+            await self._send_file(chat_id, report_path, "build_report.md")
+    
+    async def _send_load_test(self, chat_id, job: Dict[str, Any], params: Dict[str, Any], result: Dict[str, Any]):
+        if not job.get('report_path'):
+            await self.bot.send_message(chat_id, "❌ Xatolik yuz berdi.")
+            return
+        
+        report_path = self._report_path(job)
+        if report_path:
+            await self._send_file(
+                chat_id,
+                report_path,
+                "load_test_report.md",
+                f"⚡ Load test natijalari: {params.get('url')}",
+            )
+        else:
+            await self.bot.send_message(chat_id, "✅ Load test yakunlandi.")
@@ -1,26 +1,55 @@
 """Telegram bot command handlers"""
 
 import asyncio
+import json
 import logging
+import uuid
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Optional
 
-from telegram import Update
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
-from src.jobs.job_manager import JobManager, JobStatus
-from src.jobs.job_executor import JobExecutor
-from src.tasks.system_status import SystemStatusTask
-from src.tasks.audit_public_site import AuditPublicSiteTask
-from src.tasks.build_android_apk import BuildWeatherApkTask
-from src.tasks.remote_status import RemoteStatusTask
-from src.tasks.load_test import LoadTestTask
-from src.utils.config import load_config
+from src.jobs.async_store import AsyncJobStore
+from src.jobs.dispatcher import SHARED_CACHED, SHARED_IN_FLIGHT, JobDispatcher, Submission
+from src.jobs.job_manager import JobStatus
+from src.tasks.build_android_apk import DEFAULT_MATRIX_MAX_VARIANTS, WEATHER_LABELS, weather_matrix
 
 logger = logging.getLogger(__name__)
 
+JOBS_PAGE_SIZE = 10
+JOBS_MAX_PAGE_SIZE = 50
+# Pending "next page" states kept per chat
+JOBS_MAX_SAVED_PAGES = 20
+# Default window of /stats
+STATS_DEFAULT_WINDOW = "24h"
 
-async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+
+def _chat_metadata(update: Update) -> Dict[str, Any]:
+    """Job metadata that tells result delivery where to send the result"""
+    return {'chat_id': update.effective_chat.id}
+
+
+def _queued_text(text: str, job_id: str) -> str:
+    """Reply to a queued command: the result is sent when the job ends"""
+    return f"{text}\n🆔 Job: {job_id[:8]} (/job {job_id[:8]})\nNatija tayyor bo'lganda yuboriladi."
+
+
+def _submission_text(text: str, submission: Submission) -> str:
+    """Reply to a command answered by JobDispatcher.request()"""
+    job_ref = f"🆔 Job: {submission.job_id[:8]} (/job {submission.job_id[:8]})"
+    if submission.shared == SHARED_IN_FLIGHT:
+        return f"🔁 Xuddi shu so'rov allaqachon bajarilmoqda, natija sizga ham yuboriladi.\n{job_ref}"
+    if submission.shared == SHARED_CACHED:
+        return (
+            f"♻️ {int(submission.age)} soniya oldingi natija yuborilmoqda "
+            f"(qayta bajarish uchun -f qo'shing).\n{job_ref}"
+        )
+    return _queued_text(text, submission.job_id)
+
+
+async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE, job_store: AsyncJobStore):
     """Handle /start command"""
     message = """
 🤖 **AutoBuilder Bot**
@@ -28,13 +57,14 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE, job_m
 Men sizning serveringizda turli vazifalarni bajarishga yordam beraman.
 
 **Mavjud buyruqlar:**
-• `/status [host]` - Server holati (local yoki remote)
-• `/audit_site [-d] [domain]` - Saytni xavfsizlik tekshiruvi
+• `/status [-f] [host]` - Server holati (local yoki remote)
+• `/audit_site [-d] [-f] [domain]` - Saytni xavfsizlik tekshiruvi
 • `/ddos <url> -<count>` - Load test (faqat ruxsat berilgan serverlar)
-• `/build_weather_apk` - Weather app APK yaratish
-• `/jobs` - Oxirgi 10 ta job ro'yxati
+• `/build_weather_apk [cities:...] [langs:...]` - Weather app APK yaratish
+• `/jobs [holat] [cmd:buyruq]` - Joblar ro'yxati (filtrlar bilan)
 • `/job <id>` - Job holatini ko'rish
 • `/cancel <id>` - Jobni bekor qilish
+• `/stats [24h]` - Navbat va bajarilish vaqtlari statistikasi
 • `/help` - Batafsil yordam
 
 **Xavfsizlik qoidalari:**
@@ -45,19 +75,19 @@ Men sizning serveringizda turli vazifalarni bajarishga yordam beraman.
     await update.message.reply_text(message, parse_mode='Markdown')
 
 
-async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+async def handle_help(update: Update, context: ContextTypes.DEFAULT_TYPE, job_store: AsyncJobStore):
     """Handle /help command"""
     message = """
 📖 **Yordam**
 
 **Buyruqlar:**
 
-`/status [host]`
+`/status [-f] [host]`
 Server holatini ko'rsatadi (Nginx, PHP-FPM, MariaDB, disk, RAM)
 Agar host ko'rsatilsa, remote server holatini tekshiradi.
 Misol: `/status example.com`
 
-`/audit_site [-d] [domain]`
+`/audit_site [-d] [-f] [domain]`
 Saytni xavfsizlik tekshiruvi:
 • `.env` fayllarini tekshirish
 • `.git` katalogini tekshirish
@@ -75,22 +105,44 @@ Load test (faqat ruxsat berilgan serverlar):
 • Performance metrikalari
 Misol: `/ddos example.com -1000`
 
-`/build_weather_apk`
+`/build_weather_apk [-f] [-abi] [cities:shahar,...] [langs:til,...]`
 Weather app APK yaratadi:
 • Flutter loyihasi yaratadi
 • APK build qiladi
 • Telegram orqali yuboradi
 • GitHub'ga `myself` branchga push qiladi
-
-`/jobs`
-Oxirgi 10 ta job ro'yxati
+Bir nechta shahar yoki til berilsa, har bir variant uchun APK bitta jobda
+yaratiladi (loyiha bir marta tayyorlanadi, build'lar parallel):
+• `cities:` - vergul bilan, bo'shliq o'rniga `_` (`New_York`)
+• `langs:` - en, uz, ru
+• `-abi` - har bir ABI uchun alohida APK (`--split-per-abi`)
+Misol: `/build_weather_apk cities:Tashkent,Samarkand,Bukhara langs:en,uz`
+
+`/jobs [holat] [cmd:buyruq] [since:vaqt] [until:vaqt] [limit:N]`
+Joblar ro'yxati, eng yangilari birinchi:
+• `holat`: pending, running, completed, failed, cancelled
+• `cmd:` buyruq nomi yoki prefiksi (`cmd:audit_site example.com`)
+• `since:` / `until:` - `30m`, `24h`, `7d` yoki `2026-01-31`
+• "Keyingi sahifa" tugmasi bilan eskiroq joblar
+Misol: `/jobs failed cmd:build_weather_apk since:7d`
 
 `/job <id>`
-Job holati va natijalari
+Job holati va natijalari (`/jobs` dagi qisqa 8 belgili ID ham bo'ladi)
 
 `/cancel <id>`
 Jobni bekor qilish (ishlayotgan joblar uchun)
 
+`/stats [vaqt]`
+Worker pool'lar bandligi va navbat uzunligi, har bir buyruq turi uchun
+navbatda kutish va bajarilish vaqti (p50/p95/p99)
+• `vaqt`: `30m`, `24h`, `7d` yoki `2026-01-31` (standart: 24h)
+Misol: `/stats 7d`
+
+**Takroriy so'rovlar** (`/status`, `/audit_site`, `/build_weather_apk`):
+• Bir xil so'rov bajarilayotgan jobga qo'shiladi, natija hammaga yuboriladi
+• Yaqinda tayyor bo'lgan hisobot qayta yuboriladi
+• `-f` flag: hisobotni qayta ishlatmasdan yangidan bajarish
+
 **Xavfsizlik:**
 • Barcha buyruqlar timeout bilan ishlaydi
 • Sensitive ma'lumotlar redact qilinadi
@@ -99,183 +151,188 @@ Jobni bekor qilish (ishlayotgan joblar uchun)
     await update.message.reply_text(message, parse_mode='Markdown')
 
 
-async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+async def handle_status(update: Update, context: ContextTypes.DEFAULT_TYPE, dispatcher: JobDispatcher):
     """Handle /status command"""
-    # Check if remote host is specified
-    target_host = None
-    if context.args and len(context.args) > 0:
-        target_host = context.args[0]
-        await update.message.reply_text(f"⏳ {target_host} server holatini tekshiryapman...")
-    else:
-        await update.message.reply_text("⏳ Server holatini tekshiryapman...")
+    # Check if remote host is specified; -f skips the reuse of a recent report
+    args = context.args or []
+    force = '-f' in args
+    hosts = [arg for arg in args if not arg.startswith('-')]
+    target_host = hosts[0] if hosts else None
     
     try:
-        config = load_config()
-        executor = JobExecutor(job_manager, config)
-        
         if target_host:
             # Remote status check
-            task = RemoteStatusTask(config, target_host)
-            job_id = job_manager.create_job(f"status {target_host}")
+            submission = await dispatcher.request(
+                f"status {target_host}",
+                {'host': target_host},
+                _chat_metadata(update),
+                force=force,
+            )
         else:
             # Local status check
-            task = SystemStatusTask(config)
-            job_id = job_manager.create_job("status")
-        
-        # Run task
-        result = await executor.execute_job(job_id, task.execute)
+            submission = await dispatcher.request("status", metadata=_chat_metadata(update), force=force)
         
-        # Send report
-        job = job_manager.get_job(job_id)
-        if job and job.get('report_path'):
-            report_path = Path(job['report_path'])
-            if report_path.exists():
-                caption = f"📊 {'Remote' if target_host else 'Local'} server holati hisoboti"
-                if target_host:
-                    caption += f": {target_host}"
-                await update.message.reply_document(
-                    document=open(report_path, 'rb'),
-                    filename="status_report.md",
-                    caption=caption
-                )
-            else:
-                await update.message.reply_text("✅ Tekshiruv yakunlandi. Hisobot yaratilmadi.")
+        if target_host:
+            await update.message.reply_text(
+                _submission_text(f"⏳ {target_host} server holatini tekshiryapman...", submission)
+            )
         else:
-            await update.message.reply_text("❌ Xatolik yuz berdi.")
-        
-        # Cleanup
-        executor.cleanup_workspace(job_id)
-        
+            await update.message.reply_text(_submission_text("⏳ Server holatini tekshiryapman...", submission))
+    
     except Exception as e:
-        logger.error(f"Status task failed: {e}")
+        logger.error(f"Failed to queue status job: {e}")
         await update.message.reply_text(f"❌ Xatolik: {str(e)}")
 
 
-async def handle_audit_site(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+async def handle_audit_site(update: Update, context: ContextTypes.DEFAULT_TYPE, dispatcher: JobDispatcher):
     """Handle /audit_site command"""
     # Parse arguments
     target_domain = None
     send_details = False
+    force = False
     
     if context.args:
         for arg in context.args:
             if arg == '-d':
                 send_details = True
+            elif arg == '-f':
+                force = True
             elif not arg.startswith('-'):
                 target_domain = arg
     
-    if target_domain:
-        await update.message.reply_text(f"🔍 {target_domain} saytini tekshiryapman...")
-    else:
-        await update.message.reply_text("🔍 Saytni tekshiryapman...")
-    
     try:
-        config = load_config()
-        executor = JobExecutor(job_manager, config)
-        task = AuditPublicSiteTask(config, target_domain=target_domain)
-        task.send_details = send_details
-        
-        job_id = job_manager.create_job(f"audit_site {target_domain or 'default'}")
-        
-        # Run task
-        result = await executor.execute_job(job_id, task.execute)
+        submission = await dispatcher.request(
+            f"audit_site {target_domain or 'default'}",
+            {'domain': target_domain, 'send_details': send_details},
+            _chat_metadata(update),
+            force=force,
+        )
         
-        # Send report
-        job = job_manager.get_job(job_id)
-        if job and job.get('report_path'):
-            report_path = Path(job['report_path'])
-            if report_path.exists():
-                await update.message.reply_document(
-                    document=open(report_path, 'rb'),
-                    filename="audit_report.md",
-                    caption="🔒 Xavfsizlik tekshiruvi hisoboti"
-                )
-                
-                # Send detailed findings if -d flag was used
-                if send_details and result.get('details'):
-                    details = result['details']
-                    detail_messages = []
-                    
-                    if details.get('exposed_paths'):
-                        detail_messages.append("🔴 **Ochilgan fayllar:**\n")
-                        for finding in details['exposed_paths']:
-                            detail_messages.append(f"• {finding.get('title', 'Unknown')}")
-                    
-                    if detail_messages:
-                        await update.message.reply_text("\n".join(detail_messages), parse_mode='Markdown')
-            else:
-                await update.message.reply_text("✅ Tekshiruv yakunlandi.")
+        if target_domain:
+            await update.message.reply_text(
+                _submission_text(f"🔍 {target_domain} saytini tekshiryapman...", submission)
+            )
         else:
-            await update.message.reply_text("❌ Xatolik yuz berdi.")
-        
-        # Cleanup
-        executor.cleanup_workspace(job_id)
-        
+            await update.message.reply_text(_submission_text("🔍 Saytni tekshiryapman...", submission))
+    
     except Exception as e:
-        logger.error(f"Audit task failed: {e}")
+        logger.error(f"Failed to queue audit job: {e}")
         await update.message.reply_text(f"❌ Xatolik: {str(e)}")
 
 
-async def handle_build_weather_apk(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+async def handle_build_weather_apk(update: Update, context: ContextTypes.DEFAULT_TYPE, dispatcher: JobDispatcher):
     """Handle /build_weather_apk command"""
-    await update.message.reply_text("🏗️ Weather app APK yaratilmoqda... Bu biroz vaqt olishi mumkin.")
+    # [-f] [-abi] [cities:Tashkent,New_York] [langs:en,uz]
+    args = context.args or []
+    params: Dict[str, Any] = {}
+    for arg in args:
+        if arg == '-abi':
+            params['split_per_abi'] = True
+        elif arg.startswith('cities:'):
+            params['cities'] = [city.replace('_', ' ') for city in arg[len('cities:'):].split(',') if city]
+        elif arg.startswith('langs:'):
+            params['languages'] = [language for language in arg[len('langs:'):].split(',') if language]
+        elif arg != '-f':
+            await update.message.reply_text(
+                f"❌ Noma'lum parametr: `{arg}`\n"
+                "Format: `/build_weather_apk [-f] [-abi] [cities:Tashkent,New_York] [langs:en,uz]`",
+                parse_mode='Markdown'
+            )
+            return
     
+    max_variants = dispatcher.config.get('build', {}).get('matrix_max_variants', DEFAULT_MATRIX_MAX_VARIANTS)
     try:
-        config = load_config()
-        executor = JobExecutor(job_manager, config)
-        task = BuildWeatherApkTask(config)
-        
-        job_id = job_manager.create_job("build_weather_apk")
-        
-        # Run task
-        result = await executor.execute_job(job_id, task.execute)
-        
-        # Send results
-        job = job_manager.get_job(job_id)
-        if job:
-            workspace_dir = Path(config['paths']['workspaces_dir']) / job_id
-            
-            # Send APK if exists
-            apk_path = workspace_dir / "app" / "build" / "app" / "outputs" / "flutter-apk" / "app-release.apk"
-            if not apk_path.exists():
-                # Try alternative path
-                apk_path = workspace_dir / "app" / "build" / "app" / "outputs" / "apk" / "release" / "app-release.apk"
-            
-            if apk_path.exists():
-                await update.message.reply_document(
-                    document=open(apk_path, 'rb'),
-                    filename="weather_app.apk",
-                    caption="📱 Weather App APK tayyor!"
-                )
-            else:
-                await update.message.reply_text("⚠️ APK topilmadi. Loglarni tekshiring.")
-            
-            # Send report if exists
-            if job.get('report_path'):
-                report_path = Path(job['report_path'])
-                if report_path.exists():
-                    await update.message.reply_document(
-                        document=open(report_path, 'rb'),
-                        filename="build_report.md"
-                    )
-        
-        # Cleanup
-        executor.cleanup_workspace(job_id)
+        cities, languages = weather_matrix(params.get('cities'), params.get('languages'), max_variants)
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❌ {e}\nTillar: {', '.join(WEATHER_LABELS)}; shaharlar soni × tillar soni ≤ {max_variants}"
+        )
+        return
+    
+    try:
+        submission = await dispatcher.request(
+            " ".join(["build_weather_apk", *(arg for arg in args if arg != '-f')]),
+            params or None,
+            _chat_metadata(update),
+            force='-f' in args,
+        )
         
+        if len(cities) * len(languages) > 1 or params.get('split_per_abi'):
+            text = (
+                f"🏗️ {len(cities) * len(languages)} ta variant yaratilmoqda "
+                f"({', '.join(cities)} × {', '.join(languages)})... Bu biroz vaqt olishi mumkin."
+            )
+        else:
+            text = "🏗️ Weather app APK yaratilmoqda... Bu biroz vaqt olishi mumkin."
+        await update.message.reply_text(_submission_text(text, submission))
+    
     except Exception as e:
-        logger.error(f"Build task failed: {e}")
+        logger.error(f"Failed to queue build job: {e}")
         await update.message.reply_text(f"❌ Xatolik: {str(e)}")
 
 
-async def handle_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
-    """Handle /jobs command"""
-    jobs = job_manager.list_jobs(limit=10)
+def _parse_time_arg(value: str) -> datetime:
+    """Parse a relative (30m, 24h, 7d) or absolute (2026-01-31) time"""
+    units = {'m': 'minutes', 'h': 'hours', 'd': 'days'}
+    if value[-1:] in units and value[:-1].isdigit():
+        return datetime.now(timezone.utc) - timedelta(**{units[value[-1]]: int(value[:-1])})
     
-    if not jobs:
-        await update.message.reply_text("📋 Hozircha joblar yo'q.")
-        return
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _parse_job_filters(args) -> Dict[str, Any]:
+    """
+    Parse /jobs arguments
+    
+    Format: [status] [cmd:<command> [args...]] [since:<time>] [until:<time>] [limit:<n>]
+    """
+    filters: Dict[str, Any] = {'limit': JOBS_PAGE_SIZE}
+    statuses = {status.value: status for status in JobStatus}
+    command_words = []
+    
+    for arg in args or []:
+        key, sep, value = arg.partition(':')
+        if not sep and arg in statuses:
+            filters['status'] = statuses[arg]
+        elif sep and key == 'cmd' and value:
+            command_words = [value]
+        elif sep and key in ('since', 'until') and value:
+            try:
+                filters[key] = _parse_time_arg(value)
+            except ValueError:
+                raise ValueError(f"Noto'g'ri vaqt: {value} (misol: 24h, 7d, 2026-01-31)")
+        elif sep and key == 'limit' and value.isdigit():
+            filters['limit'] = max(1, min(int(value), JOBS_MAX_PAGE_SIZE))
+        elif command_words:
+            # Further words narrow the command prefix (cmd:audit_site example.com)
+            command_words.append(arg)
+        else:
+            raise ValueError(f"Noma'lum argument: {arg}")
+    
+    if command_words:
+        filters['command_prefix'] = ' '.join(command_words)
+    
+    return filters
+
+
+def _format_jobs_page(jobs, filters: Dict[str, Any]) -> str:
+    """Format a page of jobs as a Markdown message"""
+    description = []
+    if filters.get('status'):
+        description.append(filters['status'].value)
+    if filters.get('command_prefix'):
+        description.append(f"cmd: {filters['command_prefix']}")
+    if filters.get('since'):
+        description.append(f"since {filters['since'].strftime('%Y-%m-%d %H:%M')}")
+    if filters.get('until'):
+        description.append(f"until {filters['until'].strftime('%Y-%m-%d %H:%M')}")
+    
+    message = f"📋 **Joblar ({len(jobs)} ta)"
+    message += f" - {', '.join(description)}:**\n\n" if description else ":**\n\n"
     
-    message = "📋 **Oxirgi 10 ta job:**\n\n"
     for job in jobs:
         status_emoji = {
             'pending': '⏳',
@@ -287,17 +344,91 @@ async def handle_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE, job_ma
         
         message += f"{status_emoji} `{job['id'][:8]}` - {job['command']} ({job['status']})\n"
     
-    await update.message.reply_text(message, parse_mode='Markdown')
+    return message
+
+
+def _next_page_markup(context: ContextTypes.DEFAULT_TYPE, filters: Dict[str, Any], cursor: Optional[str]):
+    """Inline keyboard with a "next page" button (None on the last page)"""
+    if not cursor:
+        return None
+    
+    # Callback data is limited to 64 bytes, so the page state stays in chat_data
+    pages = context.chat_data.setdefault('job_pages', {})
+    while len(pages) >= JOBS_MAX_SAVED_PAGES:
+        pages.pop(next(iter(pages)))
+    
+    token = uuid.uuid4().hex[:12]
+    pages[token] = {'filters': filters, 'cursor': cursor}
+    
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("➡️ Keyingi sahifa", callback_data=f"jobs:{token}")
+    ]])
 
 
-async def handle_job(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+async def handle_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE, job_store: AsyncJobStore):
+    """Handle /jobs [status] [cmd:<command>] [since:<time>] [until:<time>] [limit:<n>] command"""
+    try:
+        filters = _parse_job_filters(context.args)
+    except ValueError as e:
+        await update.message.reply_text(
+            f"❌ {e}\nFormat: `/jobs [holat] [cmd:buyruq] [since:7d] [until:2026-01-31] [limit:20]`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    jobs, next_cursor = await job_store.list_jobs_page(**filters)
+    
+    if not jobs:
+        await update.message.reply_text("📋 Hozircha joblar yo'q.")
+        return
+    
+    await update.message.reply_text(
+        _format_jobs_page(jobs, filters),
+        parse_mode='Markdown',
+        reply_markup=_next_page_markup(context, filters, next_cursor)
+    )
+
+
+async def handle_jobs_page(update: Update, context: ContextTypes.DEFAULT_TYPE, job_store: AsyncJobStore):
+    """Handle the "next page" button of /jobs"""
+    query = update.callback_query
+    token = query.data.split(':', 1)[1]
+    page = context.chat_data.get('job_pages', {}).pop(token, None)
+    
+    if not page:
+        await query.answer("Sahifa eskirgan, /jobs ni qayta yuboring.")
+        return
+    
+    await query.answer()
+    filters = page['filters']
+    jobs, next_cursor = await job_store.list_jobs_page(cursor=page['cursor'], **filters)
+    
+    if not jobs:
+        await query.edit_message_text("📋 Boshqa joblar yo'q.")
+        return
+    
+    await query.edit_message_text(
+        _format_jobs_page(jobs, filters),
+        parse_mode='Markdown',
+        reply_markup=_next_page_markup(context, filters, next_cursor)
+    )
+
+
+async def handle_job(update: Update, context: ContextTypes.DEFAULT_TYPE, job_store: AsyncJobStore):
     """Handle /job <id> command"""
     if not context.args or len(context.args) == 0:
         await update.message.reply_text("❌ Job ID kiriting: `/job <id>`", parse_mode='Markdown')
         return
     
     job_id = context.args[0]
-    job = job_manager.get_job(job_id)
+    try:
+        job = await job_store.resolve_job(job_id)
+    except ValueError:
+        await update.message.reply_text(
+            f"❌ Job ID aniq emas: `{context.args[0]}` (to'liq ID yoki `/jobs` dagi 8 belgini kiriting)",
+            parse_mode='Markdown'
+        )
+        return
     
     if not job:
         await update.message.reply_text(f"❌ Job topilmadi: `{job_id}`", parse_mode='Markdown')
@@ -318,13 +449,17 @@ async def handle_job(update: Update, context: ContextTypes.DEFAULT_TYPE, job_man
 **Holat:** {job['status']}
 **Yaratilgan:** {job['created_at']}
 """
-    
+
     if job.get('completed_at'):
         message += f"**Yakunlangan:** {job['completed_at']}\n"
     
     if job.get('error_message'):
         message += f"**Xatolik:** {job['error_message']}\n"
     
+    # What the task recorded about its result, e.g. artifact cache hit/miss
+    for key, value in json.loads(job.get('metadata') or '{}').get('result', {}).items():
+        message += f"**{key.replace('_', ' ').capitalize()}:** `{value}`\n"
+    
     await update.message.reply_text(message, parse_mode='Markdown')
     
     # Send report if exists
@@ -337,14 +472,24 @@ async def handle_job(update: Update, context: ContextTypes.DEFAULT_TYPE, job_man
             )
 
 
-async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE, dispatcher: JobDispatcher):
     """Handle /cancel <id> command"""
     if not context.args or len(context.args) == 0:
         await update.message.reply_text("❌ Job ID kiriting: `/cancel <id>`", parse_mode='Markdown')
         return
     
-    job_id = context.args[0]
-    success = job_manager.cancel_job(job_id)
+    try:
+        job = await dispatcher.job_store.resolve_job(context.args[0])
+    except ValueError:
+        await update.message.reply_text(
+            f"❌ Job ID aniq emas: `{context.args[0]}` (to'liq ID yoki `/jobs` dagi 8 belgini kiriting)",
+            parse_mode='Markdown'
+        )
+        return
+    
+    job_id = job['id'] if job else context.args[0]
+    # Also stops a running job and kills its processes
+    success = bool(job) and await dispatcher.cancel(job_id)
     
     if success:
         await update.message.reply_text(f"✅ Job bekor qilindi: `{job_id}`", parse_mode='Markdown')
@@ -352,7 +497,60 @@ async def handle_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE, job_
         await update.message.reply_text(f"❌ Job bekor qilinmadi (topilmadi yoki yakunlangan): `{job_id}`", parse_mode='Markdown')
 
 
-async def handle_ddos(update: Update, context: ContextTypes.DEFAULT_TYPE, job_manager: JobManager):
+def _format_duration(ms: Optional[float]) -> str:
+    """Short human readable duration"""
+    if ms is None:
+        return "-"
+    if ms < 1000:
+        return f"{ms:.0f}ms"
+    if ms < 60_000:
+        return f"{ms / 1000:.1f}s"
+    if ms < 3_600_000:
+        return f"{ms / 60_000:.1f}m"
+    return f"{ms / 3_600_000:.1f}h"
+
+
+async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, dispatcher: JobDispatcher):
+    """Handle /stats [window] command - queue and run latency per command type"""
+    window = context.args[0] if context.args else STATS_DEFAULT_WINDOW
+    try:
+        since = _parse_time_arg(window)
+    except ValueError:
+        await update.message.reply_text(
+            f"❌ Noto'g'ri vaqt: {window} (misol: 24h, 7d, 2026-01-31)"
+        )
+        return
+    
+    stats = await dispatcher.job_store.latency_stats(since)
+    pools = await dispatcher.pool_stats()
+    
+    message = "⚙️ **Worker pool'lar (band/jami, navbatda):**\n"
+    for pool, pool_stats in pools.items():
+        message += f"`{pool}`: {pool_stats['busy']}/{pool_stats['size']}, {pool_stats['queued']} navbatda\n"
+    
+    if not stats:
+        message += f"\n📊 {window} ichida tugagan joblar yo'q."
+        await update.message.reply_text(message, parse_mode='Markdown')
+        return
+    
+    message += f"\n📊 **Job vaqtlari ({window}):**\n"
+    for command, by_kind in stats.items():
+        message += f"\n`{command}`\n"
+        for kind, label in (('queue', "⏳ Navbat"), ('run', "🔄 Bajarilish")):
+            summary = by_kind[kind]
+            if not summary['count']:
+                continue
+            message += (
+                f"{label} ({summary['count']}): "
+                f"p50 {_format_duration(summary['p50'])}, "
+                f"p95 {_format_duration(summary['p95'])}, "
+                f"p99 {_format_duration(summary['p99'])}\n"
+            )
+    
+    await update.message.reply_text(message, parse_mode='Markdown')
+
+
+async def handle_ddos(update: Update, context: ContextTypes.DEFAULT_TYPE, dispatcher: JobDispatcher):
     """Handle /ddos command - Load test (only allowed domains)"""
     if not context.args or len(context.args) < 2:
         await update.message.reply_text(
@@ -381,44 +579,23 @@ async def handle_ddos(update: Update, context: ContextTypes.DEFAULT_TYPE, job_ma
         await update.message.reply_text("❌ Request count 1-10000 orasida bo'lishi kerak")
         return
     
-    await update.message.reply_text(
-        f"⚡ Load test boshlandi: {target_url}\n"
-        f"📊 So'rovlar soni: {request_count}\n"
-        f"⏳ Bu biroz vaqt olishi mumkin..."
-    )
-    
     try:
-        config = load_config()
-        executor = JobExecutor(job_manager, config)
-        task = LoadTestTask(config, target_url, request_count)
-        
-        job_id = job_manager.create_job(f"ddos {target_url} -{request_count}")
-        
-        # Run task
-        result = await executor.execute_job(job_id, task.execute)
-        
-        # Send report
-        job = job_manager.get_job(job_id)
-        if job and job.get('report_path'):
-            report_path = Path(job['report_path'])
-            if report_path.exists():
-                await update.message.reply_document(
-                    document=open(report_path, 'rb'),
-                    filename="load_test_report.md",
-                    caption=f"⚡ Load test natijalari: {target_url}"
-                )
-            else:
-                await update.message.reply_text("✅ Load test yakunlandi.")
-        else:
-            await update.message.reply_text("❌ Xatolik yuz berdi.")
-        
-        # Cleanup
-        executor.cleanup_workspace(job_id)
+        job_id = await dispatcher.submit(
+            f"ddos {target_url} -{request_count}",
+            {'url': target_url, 'count': request_count},
+            _chat_metadata(update),
+        )
         
-    except ValueError as e:
-        logger.error(f"Load test security error: {e}")
-        await update.message.reply_text(f"🔒 Xavfsizlik: {str(e)}")
+        await update.message.reply_text(
+            _queued_text(
+                f"⚡ Load test boshlandi: {target_url}\n"
+                f"📊 So'rovlar soni: {request_count}\n"
+                f"⏳ Bu biroz vaqt olishi mumkin...",
+                job_id,
+            )
+        )
+    
     except Exception as e:
-        logger.error(f"Load test failed: {e}")
+        logger.error(f"Failed to queue load test: {e}")
         await update.message.reply_text(f"❌ Xatolik: {str(e)}")
 
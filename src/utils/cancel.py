@@ -0,0 +1,100 @@
+"""Cooperative cancellation of running jobs"""
+
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REASON_CANCELLED = 'cancelled'
+REASON_TIMEOUT = 'timeout'
+
+# Token of the job whose task runs in the current context (thread)
+_current_token: contextvars.ContextVar[Optional['CancelToken']] = contextvars.ContextVar(
+    'cancel_token',
+    default=None,
+)
+
+
+class JobCancelled(BaseException):
+    """
+    Raised in a task when its job was cancelled or timed out
+    
+    A BaseException like asyncio.CancelledError, so the broad
+    ``except Exception`` blocks of tasks do not swallow it.
+    """
+    
+    def __init__(self, reason: str = REASON_CANCELLED, message: Optional[str] = None):
+        super().__init__(message or f"Job {reason}")
+        self.reason = reason
+
+
+class CancelToken:
+    """
+    Cancellation flag of one job, shared by the executor and the task
+    
+    The executor cancels it on /cancel or when the job runs out of time;
+    ShellRunner polls it and kills the process group of the command it
+    runs, and tasks can call ``check()`` between their steps.
+    """
+    
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self.message: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+    
+    def cancel(self, reason: str = REASON_CANCELLED, message: Optional[str] = None) -> bool:
+        """Cancel the job; False if it was already cancelled"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self.message = message
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Cancel callback failed: {e}")
+        return True
+    
+    def add_callback(self, callback: Callable[[], None]):
+        """Call callback() (in the cancelling thread) once the token is cancelled"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+    
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until cancelled or timeout; True if cancelled"""
+        return self._event.wait(timeout)
+    
+    def check(self):
+        """Raise JobCancelled if the job was cancelled"""
+        if self._event.is_set():
+            raise JobCancelled(self.reason, self.message)
+
+
+def current_cancel_token() -> Optional[CancelToken]:
+    """Token of the job running in this context, if any"""
+    return _current_token.get()
+
+
+@contextmanager
+def cancel_scope(token: CancelToken) -> Iterator[CancelToken]:
+    """Make token the current one for the code run inside"""
+    reset_token = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset_token)
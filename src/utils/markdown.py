@@ -35,6 +35,11 @@ class MarkdownReport:
         """Add a recommendation"""
         self.recommendations.append(recommendation)
     
+    def add_section(self, title: str, items: List[str]):
+        """Add a section with a bullet list"""
+        lines = "\n".join(f"- {item}" for item in items)
+        self.sections.append(f"## {title}\n\n{lines}\n")
+    
     def add_checked_item(self, item: str):
         """Add an item that was checked"""
         self.checked_items.append(item)
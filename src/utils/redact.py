@@ -1,7 +1,13 @@
 """Sensitive data redaction utilities"""
 
 import re
-from typing import List, Optional
+from typing import IO, Iterable, Iterator, List, Optional
+
+# Longest text a single match may span in streaming mode; a private key
+# block is a few KB
+DEFAULT_MAX_MATCH = 64 * 1024
+# Read size of redact_file()/redact_fileobj()
+FILE_CHUNK_SIZE = 1024 * 1024
 
 
 class Redactor:
@@ -43,16 +49,92 @@ class Redactor:
         else:
             return "***REDACTED***"
     
+    def stream(self, max_match: int = DEFAULT_MAX_MATCH) -> 'StreamRedactor':
+        """Stateful redactor for text that arrives in chunks"""
+        return StreamRedactor(self, max_match)
+    
+    def redact_stream(self, chunks: Iterable[str], max_match: int = DEFAULT_MAX_MATCH) -> Iterator[str]:
+        """Redact an iterator of chunks, in memory bounded by ``max_match``"""
+        stream = self.stream(max_match)
+        for chunk in chunks:
+            redacted = stream.feed(chunk)
+            if redacted:
+                yield redacted
+        redacted = stream.finish()
+        if redacted:
+            yield redacted
+    
+    def redact_fileobj(self, src: IO[str], dst: IO[str], chunk_size: int = FILE_CHUNK_SIZE) -> int:
+        """Copy a text file object to another, redacted; returns characters written"""
+        written = 0
+        chunks = iter(lambda: src.read(chunk_size), '')
+        for redacted in self.redact_stream(chunks):
+            written += dst.write(redacted)
+        return written
+    
     def redact_file(self, filepath: str) -> str:
         """Read file and redact sensitive content"""
         try:
             with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-            return self.redact(content)
+                chunks = iter(lambda: f.read(FILE_CHUNK_SIZE), '')
+                return ''.join(self.redact_stream(chunks))
         except Exception as e:
             return f"Error reading file: {e}"
 
 
+class StreamRedactor:
+    """
+    Redacts text fed in chunks with the patterns of a Redactor
+    
+    Keeps back the last ``max_match`` characters (unredacted) of what it
+    was fed, plus the start of any match that reaches into them, so a
+    match split between chunks - e.g. a ``BEGIN ... END`` private key
+    block - is redacted exactly as ``Redactor.redact()`` would redact the
+    whole text. Only matches longer than ``max_match`` can be missed.
+    Memory use is bounded by about twice ``max_match`` plus one chunk.
+    """
+    
+    def __init__(self, redactor: Redactor, max_match: int = DEFAULT_MAX_MATCH):
+        self.redactor = redactor
+        self.max_match = max_match
+        self._carry = ''
+    
+    def feed(self, chunk: str) -> str:
+        """Redacted text that is final, possibly empty"""
+        self._carry += chunk
+        # Cut only once enough is buffered, so the patterns do not re-scan
+        # the kept-back text for every small chunk
+        if len(self._carry) <= 2 * self.max_match:
+            return ''
+        
+        cut = self._safe_cut(len(self._carry) - self.max_match)
+        ready, self._carry = self._carry[:cut], self._carry[cut:]
+        return self.redactor.redact(ready)
+    
+    def finish(self) -> str:
+        """Redacted rest of the text"""
+        ready, self._carry = self._carry, ''
+        return self.redactor.redact(ready)
+    
+    def _safe_cut(self, cut: int) -> int:
+        """Move ``cut`` back until no match of any pattern spans it"""
+        moved = True
+        while moved and cut > 0:
+            moved = False
+            # A match of at most max_match characters spanning cut starts
+            # inside this window
+            window_start = max(0, cut - self.max_match)
+            for pattern in self.redactor.compiled_patterns:
+                for match in pattern.finditer(self._carry, window_start):
+                    if match.start() >= cut:
+                        break
+                    if match.end() > cut:
+                        cut = match.start()
+                        moved = True
+                        break
+        return cut
+
+
 def get_redactor(config: dict) -> Redactor:
     """Get redactor instance from config"""
     patterns = config.get('security', {}).get('redact_patterns', [])
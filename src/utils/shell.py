@@ -1,12 +1,258 @@
 """Safe shell command execution with timeouts and resource limits"""
 
+import contextvars
+import os
+import signal
 import subprocess
 import shlex
-from typing import Optional, Tuple, List
+import threading
+import time
+from collections import deque
+from typing import Callable, IO, NamedTuple, Optional, Tuple, List
 import logging
 
+from src.utils.cancel import JobCancelled, current_cancel_token
+
 logger = logging.getLogger(__name__)
 
+# How often a running command checks for cancellation (seconds)
+CANCEL_POLL_INTERVAL = 0.2
+# Time between SIGTERM and SIGKILL (seconds)
+KILL_GRACE_SECONDS = 5
+# Last lines of a stream kept in memory, for error messages
+DEFAULT_TAIL_LINES = 200
+# Longer lines reach the callbacks in pieces
+MAX_LINE_CHARS = 64 * 1024
+
+LineCallback = Callable[[str], None]
+
+
+def kill_process_group(process: subprocess.Popen, grace: float = KILL_GRACE_SECONDS):
+    """SIGTERM the process group of a command, then SIGKILL what is left"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        process.wait(grace)
+    except subprocess.TimeoutExpired:
+        pass
+    # Children that ignored SIGTERM or outlived the leader
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_process(
+    cmd_list: List[str],
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None,
+    env: Optional[dict] = None,
+    check: bool = False,
+    capture_output: bool = True,
+) -> subprocess.CompletedProcess:
+    """
+    subprocess.run() that kills the whole process group and can be cancelled
+    
+    The command runs in its own session (process group), so flutter and
+    the gradle processes it starts are all stopped on timeout or when the
+    current job's CancelToken is cancelled - then JobCancelled is raised.
+    """
+    token = current_cancel_token()
+    if token:
+        token.check()
+    
+    pipe = subprocess.PIPE if capture_output else None
+    process = subprocess.Popen(
+        cmd_list,
+        stdout=pipe,
+        stderr=pipe,
+        text=True,
+        cwd=cwd,
+        env=env,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=CANCEL_POLL_INTERVAL)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            
+            if token and token.cancelled:
+                kill_process_group(process)
+                process.communicate()
+                token.check()
+            if deadline and time.monotonic() > deadline:
+                kill_process_group(process)
+                stdout, stderr = process.communicate()
+                raise subprocess.TimeoutExpired(cmd_list, timeout, stdout, stderr)
+    except BaseException:
+        # Never leave the group running, e.g. on KeyboardInterrupt
+        if process.poll() is None:
+            kill_process_group(process, grace=0)
+        raise
+    
+    result = subprocess.CompletedProcess(cmd_list, process.returncode, stdout, stderr)
+    if check:
+        result.check_returncode()
+    return result
+
+
+class OutputBuffer:
+    """
+    Tail of one stream of a command, with bounded memory
+    
+    Only the last ``tail_lines`` lines are kept, plus the size and line
+    count of the whole stream; the full output goes to the callbacks (and
+    so to the job log) as it comes. One thread appends, others read after
+    it is done.
+    """
+    
+    def __init__(self, tail_lines: int = DEFAULT_TAIL_LINES):
+        self.size = 0
+        self.lines = 0
+        self._tail: deque = deque(maxlen=tail_lines)
+        self._closed = False
+    
+    def append(self, line: str):
+        if self._closed:
+            # A reader still draining the pipe of a killed command
+            return
+        self.size += len(line.encode('utf-8', 'replace'))
+        self.lines += 1
+        self._tail.append(line)
+    
+    def tail(self, lines: Optional[int] = None) -> str:
+        """The last lines (all kept tail lines by default)"""
+        kept = list(self._tail)
+        return ''.join(kept[-lines:] if lines else kept)
+    
+    def close(self):
+        self._closed = True
+        self._tail.clear()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamResult(NamedTuple):
+    """Exit code and output buffers of stream_process(); close() the buffers"""
+    returncode: int
+    stdout: OutputBuffer
+    stderr: OutputBuffer
+    
+    def close(self):
+        self.stdout.close()
+        self.stderr.close()
+
+
+def _read_lines(
+    pipe: IO[str],
+    buffer: OutputBuffer,
+    callback: Optional[LineCallback],
+    callback_lock: threading.Lock,
+):
+    """Reader thread: move lines from a pipe into a buffer and the callback"""
+    try:
+        for line in iter(lambda: pipe.readline(MAX_LINE_CHARS), ''):
+            buffer.append(line)
+            if callback:
+                try:
+                    with callback_lock:
+                        callback(line.rstrip('\n'))
+                except Exception as e:
+                    # Keep reading, or the command blocks on a full pipe
+                    logger.warning(f"Output callback failed: {e}")
+    finally:
+        pipe.close()
+
+
+def stream_process(
+    cmd_list: List[str],
+    on_stdout: Optional[LineCallback] = None,
+    on_stderr: Optional[LineCallback] = None,
+    timeout: Optional[float] = None,
+    cwd: Optional[str] = None,
+    env: Optional[dict] = None,
+    tail_lines: int = DEFAULT_TAIL_LINES,
+) -> StreamResult:
+    """
+    run_process() that hands output over line by line as it comes
+    
+    A reader thread per stream passes each line, without its newline,
+    to ``on_stdout``/``on_stderr`` in the context of the caller (so
+    print() and logging go to the job's log) and keeps its tail in an
+    OutputBuffer. The callbacks are never called at the same time, so
+    both streams can share one. Timeouts and cancellation work as in run_process();
+    the TimeoutExpired raised carries the output tails.
+    """
+    token = current_cancel_token()
+    if token:
+        token.check()
+    
+    process = subprocess.Popen(
+        cmd_list,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors='replace',
+        cwd=cwd,
+        env=env,
+        start_new_session=True,
+    )
+    stdout = OutputBuffer(tail_lines)
+    stderr = OutputBuffer(tail_lines)
+    callback_lock = threading.Lock()
+    readers = [
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(_read_lines, pipe, buffer, callback, callback_lock),
+            name=f"shell-{name}-{process.pid}",
+            daemon=True,
+        )
+        for name, pipe, buffer, callback in (
+            ('stdout', process.stdout, stdout, on_stdout),
+            ('stderr', process.stderr, stderr, on_stderr),
+        )
+    ]
+    for reader in readers:
+        reader.start()
+    
+    deadline = time.monotonic() + timeout if timeout else None
+    try:
+        # Until the command has exited and all of its output is read
+        while True:
+            for reader in readers:
+                reader.join(CANCEL_POLL_INTERVAL / len(readers))
+            if process.poll() is not None and not any(reader.is_alive() for reader in readers):
+                break
+            
+            if token and token.cancelled:
+                kill_process_group(process)
+                token.check()
+            if deadline and time.monotonic() > deadline:
+                kill_process_group(process)
+                for reader in readers:
+                    reader.join(KILL_GRACE_SECONDS)
+                raise subprocess.TimeoutExpired(cmd_list, timeout, stdout.tail(), stderr.tail())
+    except BaseException:
+        if process.poll() is None:
+            kill_process_group(process, grace=0)
+        for reader in readers:
+            reader.join(KILL_GRACE_SECONDS)
+        stdout.close()
+        stderr.close()
+        raise
+    
+    return StreamResult(process.returncode, stdout, stderr)
+
 
 class ShellRunner:
     """Safe shell command runner with timeouts"""
@@ -56,17 +302,58 @@ class ShellRunner:
             
             logger.info(f"Executing: {' '.join(cmd_list)}")
             
-            result = subprocess.run(
+            result = run_process(
                 cmd_list,
-                capture_output=True,
-                text=True,
                 timeout=timeout,
                 cwd=cwd,
                 env=env,
             )
             
             return result.returncode, result.stdout, result.stderr
+        
+        except subprocess.TimeoutExpired:
+            logger.error(f"Command timed out after {timeout}s: {command}")
+            return -1, "", f"Command timed out after {timeout} seconds"
+        except Exception as e:
+            logger.error(f"Error executing command: {e}")
+            return -1, "", str(e)
+    
+    def stream(
+        self,
+        command: str,
+        on_line: Optional[LineCallback] = None,
+        timeout: Optional[int] = None,
+        cwd: Optional[str] = None,
+        env: Optional[dict] = None,
+        allowlist: Optional[List[str]] = None,
+    ) -> Tuple[int, str, str]:
+        """
+        Run a shell command safely, passing each output line to on_line
+        
+        For long commands with a lot of output (builds): stdout and stderr
+        lines go to ``on_line`` as they come, and only the last
+        DEFAULT_TAIL_LINES lines of each are kept in memory (see
+        stream_process()).
+        
+        Returns:
+            (returncode, stdout tail, stderr tail)
+        """
+        if not self._is_safe(command, allowlist):
+            raise ValueError(f"Dangerous command blocked: {command}")
+        
+        timeout = timeout or self.timeout
+        cwd = cwd or self.cwd
+        
+        try:
+            cmd_list = shlex.split(command) if isinstance(command, str) else command
+            logger.info(f"Executing (streaming): {' '.join(cmd_list)}")
             
+            result = stream_process(cmd_list, on_stdout=on_line, on_stderr=on_line, timeout=timeout, cwd=cwd, env=env)
+            try:
+                return result.returncode, result.stdout.tail(), result.stderr.tail()
+            finally:
+                result.close()
+        
         except subprocess.TimeoutExpired:
             logger.error(f"Command timed out after {timeout}s: {command}")
             return -1, "", f"Command timed out after {timeout} seconds"
@@ -74,6 +361,25 @@ class ShellRunner:
             logger.error(f"Error executing command: {e}")
             return -1, "", str(e)
     
+    def stream_safe(
+        self,
+        command: str,
+        on_line: Optional[LineCallback] = None,
+        timeout: Optional[int] = None,
+        cwd: Optional[str] = None,
+        env: Optional[dict] = None,
+    ) -> Tuple[bool, str]:
+        """
+        Stream a command and return (success, output tail)
+        
+        On failure the tail of stderr, or of stdout if the command wrote
+        its errors there.
+        """
+        returncode, stdout, stderr = self.stream(command, on_line, timeout, cwd, env)
+        success = returncode == 0
+        output = stdout if success else (stderr or stdout)
+        return success, output
+    
     def _is_safe(self, command: str, allowlist: Optional[List[str]] = None) -> bool:
         """Check if command is safe to execute"""
         command_lower = command.lower()
@@ -100,11 +406,12 @@ class ShellRunner:
         command: str,
         timeout: Optional[int] = None,
         cwd: Optional[str] = None,
+        env: Optional[dict] = None,
     ) -> Tuple[bool, str]:
         """
         Run command and return (success, output)
         """
-        returncode, stdout, stderr = self.run(command, timeout, cwd)
+        returncode, stdout, stderr = self.run(command, timeout, cwd, env)
         success = returncode == 0
         output = stdout if success else stderr
         return success, output
@@ -0,0 +1,47 @@
+"""Timestamp helpers for stored records"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+# Fixed-width UTC ISO-8601, so stored timestamps sort lexicographically
+DB_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def utc_now() -> str:
+    """Current time as a database timestamp"""
+    return to_db_timestamp(datetime.now(timezone.utc))
+
+
+def to_db_timestamp(value: datetime) -> str:
+    """Format a datetime as a database timestamp (naive values are local time)"""
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc).strftime(DB_TIMESTAMP_FORMAT)
+
+
+def from_db_timestamp(value: str) -> datetime:
+    """Parse a database timestamp into an aware UTC datetime"""
+    return datetime.strptime(value, DB_TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def normalize_timestamp(value: Optional[str]) -> Optional[str]:
+    """
+    Convert a legacy timestamp string to the database format
+
+    Legacy rows mix ``CURRENT_TIMESTAMP`` values (``YYYY-MM-DD HH:MM:SS``,
+    UTC) and ``datetime.now().isoformat()`` values (``T`` separator, local
+    time). Values already in the database format are returned unchanged.
+    """
+    if not value:
+        return value
+    
+    try:
+        from_db_timestamp(value)
+        return value
+    except ValueError:
+        pass
+    
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None and 'T' not in value:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return to_db_timestamp(parsed)